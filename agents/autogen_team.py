@@ -0,0 +1,164 @@
+'''
+Author: wenjinwang 314984354@qq.com
+Date: 2026-10-19 09:33:15
+LastEditors: wenjinwang 314984354@qq.com
+LastEditTime: 2026-10-19 09:33:15
+FilePath: /hello-agents/agents/autogen_team.py
+Description: AutoGen 团队的运行控制：按token与时间预算终止、按发言者裁剪每个智能体的上下文、并发运行多个任务
+
+'''
+import asyncio
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from autogen_agentchat.base import TaskResult, TerminationCondition
+from autogen_agentchat.conditions import TimeoutTermination, TokenUsageTermination
+from autogen_agentchat.messages import BaseChatMessage
+from autogen_core.model_context import ChatCompletionContext
+from autogen_core.models import LLMMessage
+
+from telemetry.event_sink import emit
+from telemetry.tracing import span
+
+
+def budget_termination(max_tokens: Optional[int] = None, max_seconds: Optional[float] = None, condition: Optional[TerminationCondition] = None) -> TerminationCondition:
+    """
+    累计token数（各智能体 models_usage 之和）达到 max_tokens，或运行时间达到 max_seconds 时终止，
+    与 condition（例如 TextMentionTermination("TERMINATE")）任意一个满足即终止。
+    计时从创建时开始，团队每次运行结束后重置，因此应在运行前创建团队与终止条件。
+    """
+    conditions = [c for c in (
+        condition,
+        TokenUsageTermination(max_total_token=max_tokens) if max_tokens else None,
+        TimeoutTermination(max_seconds) if max_seconds else None,
+    ) if c is not None]
+    if not conditions:
+        raise ValueError("至少需要指定 max_tokens、max_seconds 或 condition 中的一个。")
+    combined = conditions[0]
+    for c in conditions[1:]:
+        combined = combined | c
+    return combined
+
+
+class SourceWindowContext(ChatCompletionContext):
+    """
+    按发言者裁剪的上下文：只保留任务（第一条消息），以及 keep 中列出的每个发言者最近的 n 条消息，
+    其余发言者的消息不发给模型。智能体自己的发言以自己的名字为发言者。保留的消息维持原有顺序。
+    例如工程师只需要看到产品经理的需求与最近一次审查意见:
+        SourceWindowContext({"ProductManager": 1, "CodeReviewer": 1, "Engineer": 1})
+    没有发言者的消息（工具的执行结果）总是保留。
+    """
+
+    def __init__(self, keep: Dict[str, int], keep_task: bool = True, initial_messages: Optional[List[LLMMessage]] = None):
+        super().__init__(initial_messages)
+        self.keep = dict(keep)
+        self.keep_task = keep_task
+
+    async def get_messages(self) -> List[LLMMessage]:
+        remaining = dict(self.keep)
+        selected = []
+        # 从最新的消息往前选，每个发言者用完配额后不再保留
+        for index in range(len(self._messages) - 1, -1, -1):
+            message = self._messages[index]
+            source = getattr(message, "source", None)
+            if index == 0 and self.keep_task:
+                selected.append(message)
+            elif source is None:
+                selected.append(message)
+            elif remaining.get(source, 0) > 0:
+                remaining[source] -= 1
+                selected.append(message)
+        selected.reverse()
+        return selected
+
+
+@dataclass
+class TurnUsage:
+    """一轮发言的发言者、token用量（估算）与该轮结束时距运行开始的秒数。"""
+    turn: int
+    source: str
+    prompt_tokens: int
+    completion_tokens: int
+    elapsed_seconds: float
+
+
+@dataclass
+class TeamRunReport:
+    """一个任务的运行结果与逐轮的token用量。"""
+    task: str
+    turns: List[TurnUsage] = field(default_factory=list)
+    stop_reason: Optional[str] = None
+    seconds: float = 0.0
+    error: Optional[str] = None
+    result: Optional[TaskResult] = None
+
+    @property
+    def prompt_tokens(self) -> int:
+        return sum(turn.prompt_tokens for turn in self.turns)
+
+    @property
+    def completion_tokens(self) -> int:
+        return sum(turn.completion_tokens for turn in self.turns)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "task": self.task,
+            "turns": [asdict(turn) for turn in self.turns],
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "stop_reason": self.stop_reason,
+            "seconds": round(self.seconds, 3),
+            "error": self.error,
+        }
+
+
+async def run_team(team, task: str, label: str = "", on_message: Optional[Callable[[Any], None]] = None) -> TeamRunReport:
+    """
+    运行一个团队，逐轮记录token用量（发出 autogen.turn 事件），返回 TeamRunReport。
+    on_message 收到 run_stream 产出的每一条消息与事件（例如用于打印对话），运行出错时记录在 error 中。
+    """
+    report = TeamRunReport(task)
+    started = time.perf_counter()
+    with span("autogen.team", task=label or task[:40]) as team_span:
+        try:
+            async for message in team.run_stream(task=task):
+                if on_message is not None:
+                    on_message(message)
+                if isinstance(message, TaskResult):
+                    report.result = message
+                    report.stop_reason = message.stop_reason
+                elif isinstance(message, BaseChatMessage) and message.models_usage is not None:
+                    turn = TurnUsage(
+                        len(report.turns) + 1, message.source,
+                        message.models_usage.prompt_tokens, message.models_usage.completion_tokens,
+                        round(time.perf_counter() - started, 3),
+                    )
+                    report.turns.append(turn)
+                    emit(
+                        "autogen.turn",
+                        f"🔁 {label}第{turn.turn}轮 {turn.source}: 提示词 {turn.prompt_tokens} tokens，输出 {turn.completion_tokens} tokens",
+                        task=label, **asdict(turn),
+                    )
+        except Exception as e:
+            report.error = str(e)
+            team_span.set(error=str(e))
+            emit("autogen.error", f"❌ {label}团队运行出错: {e}", task=label, error=str(e))
+        report.seconds = time.perf_counter() - started
+        team_span.set(turns=len(report.turns), prompt_tokens=report.prompt_tokens, completion_tokens=report.completion_tokens)
+    return report
+
+
+async def run_teams(make_team: Callable[[str], Any], tasks: Sequence[str], max_concurrency: int = 4) -> List[TeamRunReport]:
+    """
+    在同一个事件循环中并发运行多个任务，结果与 tasks 一一对应。
+    团队在运行期间有自己的状态，不能被并发使用，因此 make_team(task) 为每个任务创建新的团队；
+    各团队可以共享同一个模型客户端，从而共享连接、缓存与指标。
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run_one(index: int, task: str) -> TeamRunReport:
+        async with semaphore:
+            return await run_team(make_team(task), task, label=f"[任务{index + 1}] ")
+
+    return list(await asyncio.gather(*(run_one(i, task) for i, task in enumerate(tasks))))
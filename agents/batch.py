@@ -0,0 +1,186 @@
+'''
+Author: wenjinwang 314984354@qq.com
+Date: 2026-10-19 09:03:51
+LastEditors: wenjinwang 314984354@qq.com
+LastEditTime: 2026-10-19 09:05:09
+FilePath: /hello-agents/agents/batch.py
+Description: 批量运行：并发执行、结果流式写入JSONL、断点续跑与汇总统计
+
+'''
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence
+
+from agents.events import FINAL_ANSWER, ERROR
+from agents.run_context import RunContext
+from models.usage import TokenUsage, track_usage
+from telemetry.event_sink import emit
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """最近秩法计算百分位数，q 取值 0~100。"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+@dataclass
+class BatchReport:
+    """
+    一次批量运行的结果与汇总统计。results 按问题顺序排列（包括续跑时从文件中读回的结果）。
+    延迟与token用量只统计本次实际运行的问题。
+    """
+    results: List[Dict[str, Any]] = field(default_factory=list)
+    completed: int = 0
+    skipped: int = 0
+    failed: int = 0
+    elapsed: float = 0.0
+    latencies: List[float] = field(default_factory=list)
+    usage: TokenUsage = field(default_factory=TokenUsage)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "completed": self.completed,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "elapsed": round(self.elapsed, 3),
+            "throughput": round(self.completed / self.elapsed, 3) if self.elapsed else 0.0,
+            "latency_p50": round(percentile(self.latencies, 50), 3),
+            "latency_p95": round(percentile(self.latencies, 95), 3),
+            "latency_p99": round(percentile(self.latencies, 99), 3),
+            **self.usage.to_dict(),
+        }
+
+
+def _load_finished(output_path: str) -> Dict[int, Dict[str, Any]]:
+    """
+    读取已有的输出文件，返回成功完成的问题 {问题序号: 结果}；失败的问题不在其中，续跑时会重新运行。
+    中断时写了一半的最后一行会被丢弃，并重写文件，使后续追加的内容保持逐行合法；
+    失败的记录仍保留在文件中，重新运行的结果追加在后面。
+    """
+    records: List[Dict[str, Any]] = []
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    finished = {record["index"]: record for record in records if not record.get("error")}
+
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    os.replace(tmp_path, output_path)
+    return finished
+
+
+class BatchRunMixin:
+    """
+    为智能体提供 run_many()。智能体需要实现 run_events(question, context)，且最后一个事件为 final_answer。
+    所有并发运行共享智能体的LLM客户端与工具执行器，因此共享工具缓存；
+    需要限流时，用 models.rate_limiter.RateLimitedLLM 包装传给智能体的客户端。
+    """
+
+    def run_many(
+        self,
+        questions: Sequence[str],
+        concurrency: int = 8,
+        output_path: Optional[str] = None,
+        resume: bool = True,
+    ) -> BatchReport:
+        """
+        并发运行一批问题。
+        - concurrency: 同时运行的问题数。
+        - output_path: 每个问题完成后立即以一行JSON追加写入该文件。
+        - resume: 输出文件已存在时，跳过其中已成功完成的问题（按问题序号与问题文本匹配），只运行剩余的问题。
+        """
+        report = BatchReport()
+        finished: Dict[int, Dict[str, Any]] = {}
+        if output_path and os.path.exists(output_path):
+            if resume:
+                finished = {
+                    index: record for index, record in _load_finished(output_path).items()
+                    if index < len(questions) and record.get("question") == questions[index]
+                }
+            else:
+                os.remove(output_path)
+        report.skipped = len(finished)
+        pending = [index for index in range(len(questions)) if index not in finished]
+        emit("batch.start", f"📦 批量运行 {len(pending)} 个问题（跳过已完成的 {report.skipped} 个），并发数 {concurrency}", pending=len(pending), skipped=report.skipped, concurrency=concurrency)
+
+        write_lock = threading.Lock()
+        output_file = open(output_path, "a", encoding="utf-8") if output_path else None
+        results: Dict[int, Dict[str, Any]] = dict(finished)
+        started = time.monotonic()
+        try:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                futures = [pool.submit(self._run_one, index, questions[index], report.usage) for index in pending]
+                for future in as_completed(futures):
+                    record = future.result()
+                    results[record["index"]] = record
+                    report.latencies.append(record["elapsed"])
+                    if record["error"]:
+                        report.failed += 1
+                    else:
+                        report.completed += 1
+                    if output_file:
+                        with write_lock:
+                            output_file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+                            output_file.flush()
+        finally:
+            if output_file:
+                output_file.close()
+
+        report.elapsed = time.monotonic() - started
+        report.results = [results[index] for index in sorted(results)]
+        emit("batch.done", f"📊 批量运行完成: {json.dumps(report.summary(), ensure_ascii=False)}", **report.summary())
+        return report
+
+    def _run_one(self, index: int, question: str, total_usage: TokenUsage) -> Dict[str, Any]:
+        """运行单个问题并返回一条结果记录，异常会被记录而不是抛出。"""
+        context = RunContext(question)
+        final_event = None
+        error = None
+        started = time.monotonic()
+        with track_usage() as usage:
+            try:
+                for event in self.run_events(question, context):
+                    if event.type == FINAL_ANSWER:
+                        final_event = event
+                    elif event.type == ERROR and error is None:
+                        error = event.content
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+        total_usage.merge(usage)
+
+        # 运行过程中的错误事件只有在没有得到最终答案时才算作失败；
+        # 未完成的最终答案（例如 ReAct 出错后给出的“达到最大迭代次数”，data["finished"] 为 False）同样算作失败
+        succeeded = (
+            final_event is not None
+            and final_event.content is not None
+            and not final_event.data.get("error")
+            and final_event.data.get("finished") is not False
+        )
+        if succeeded:
+            error = None
+        elif error is None:
+            error = final_event.data.get("error") if final_event is not None else None
+            error = error or (final_event.content if final_event is not None and final_event.content else "运行未得到最终答案")
+        return {
+            "index": index,
+            "question": question,
+            "run_id": context.run_id,
+            "output": final_event.content if final_event else None,
+            "data": final_event.data if final_event else {},
+            "error": error,
+            "elapsed": round(time.monotonic() - started, 3),
+            "usage": usage.to_dict(),
+        }
@@ -0,0 +1,288 @@
+'''
+Author: wenjinwang 314984354@qq.com
+Date: 2026-10-19 08:53:45
+LastEditors: wenjinwang 314984354@qq.com
+LastEditTime: 2026-10-19 09:45:34
+FilePath: /hello-agents/agents/code_benchmark.py
+Description: 在隔离的子进程中实测候选代码的运行时间，并拟合经验复杂度
+'''
+import ast
+import json
+import math
+import pickle
+import re
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# 放在子进程脚本最前面的资源限制：CPU时间与内存上限（Windows 下没有 resource 模块，只保留超时限制）。
+# 在子进程自身中设置，而不是通过 preexec_fn，因为 run_many 在多个线程中启动子进程，preexec_fn 在多线程下可能死锁
+_LIMITS_PRELUDE = r'''
+try:
+    import resource
+except ImportError:
+    resource = None
+if resource is not None:
+    resource.setrlimit(resource.RLIMIT_CPU, ({cpu_seconds}, {cpu_seconds} + 1))
+    resource.setrlimit(resource.RLIMIT_AS, ({memory_bytes}, {memory_bytes}))
+'''
+
+# 子进程中执行的脚本：从标准输入读取 (代码, 函数名, 参数, 重复次数)，输出最短耗时
+_RUNNER_SCRIPT = r'''
+import json, pickle, sys, time
+code, func_name, args, repeat = pickle.load(sys.stdin.buffer)
+namespace = {"__name__": "__candidate__"}
+exec(compile(code, "<candidate>", "exec"), namespace)
+func = namespace[func_name]
+best = float("inf")
+for _ in range(repeat):
+    start = time.perf_counter()
+    func(*args)
+    best = min(best, time.perf_counter() - start)
+sys.stdout.write("\n" + json.dumps({"seconds": best}))
+'''
+
+# 子进程中执行的测试脚本：从标准输入读取 (代码, 函数名, 测试用例)，输出通过的用例数
+_TESTS_RUNNER_SCRIPT = r'''
+import json, pickle, sys
+code, func_name, test_cases = pickle.load(sys.stdin.buffer)
+namespace = {"__name__": "__candidate__"}
+exec(compile(code, "<candidate>", "exec"), namespace)
+func = namespace[func_name]
+passed = 0
+for args, expected in test_cases:
+    try:
+        passed += func(*args) == expected
+    except Exception:
+        pass
+sys.stdout.write("\n" + json.dumps({"passed": passed}))
+'''
+
+# 候选复杂度模型: 名称 -> f(n)
+COMPLEXITY_MODELS: Dict[str, Callable[[float], float]] = {
+    "O(1)": lambda n: 1.0,
+    "O(log n)": lambda n: math.log2(n),
+    "O(n)": lambda n: n,
+    "O(n log n)": lambda n: n * math.log2(n),
+    "O(n^2)": lambda n: n ** 2,
+    "O(n^3)": lambda n: n ** 3,
+}
+
+
+def extract_code(text: str) -> str:
+    """去掉LLM输出中的 ```python ... ``` 围栏，只保留代码本身。"""
+    match = re.search(r"```(?:python)?\s*\n(.*?)```", text or "", re.DOTALL)
+    return match.group(1).strip() if match else (text or "").strip()
+
+
+def find_function_name(code: str) -> Optional[str]:
+    """返回代码中第一个公开的顶层函数名（优先不以下划线开头的函数）。"""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+    names = [node.name for node in tree.body if isinstance(node, ast.FunctionDef)]
+    public_names = [name for name in names if not name.startswith("_")]
+    return (public_names or names or [None])[0]
+
+
+def fit_complexity(sizes: Sequence[int], times: Sequence[float]) -> Tuple[Optional[str], Optional[float]]:
+    """
+    用最小二乘为每个复杂度模型拟合 t ≈ c·f(n)，选出相对残差最小的模型，
+    同时返回 log-log 斜率作为经验指数。少于两个数据点时无法拟合。
+    """
+    points = [(n, t) for n, t in zip(sizes, times) if n > 1 and t > 0]
+    if len(points) < 2:
+        return None, None
+
+    best_label, best_error = None, float("inf")
+    for label, f in COMPLEXITY_MODELS.items():
+        fs = [f(n) for n, _ in points]
+        c = sum(t * fx for (_, t), fx in zip(points, fs)) / sum(fx * fx for fx in fs)
+        error = sum(((t - c * fx) / t) ** 2 for (_, t), fx in zip(points, fs))
+        if error < best_error:
+            best_label, best_error = label, error
+
+    xs = [math.log(n) for n, _ in points]
+    ys = [math.log(t) for _, t in points]
+    x_mean, y_mean = sum(xs) / len(xs), sum(ys) / len(ys)
+    denominator = sum((x - x_mean) ** 2 for x in xs)
+    exponent = sum((x - x_mean) * (y - y_mean) for x, y in zip(xs, ys)) / denominator if denominator else None
+    return best_label, exponent
+
+
+class BenchmarkReport:
+    """
+    一份候选代码的实测报告：每个输入规模的耗时、拟合的复杂度，以及可能的错误信息。
+    """
+
+    def __init__(self, code: str, rows: List[Dict[str, Any]], error: Optional[str] = None):
+        self.code = code
+        self.rows = rows
+        self.error = error
+        self.complexity, self.exponent = fit_complexity(
+            [row["size"] for row in rows], [row["seconds"] for row in rows]
+        )
+
+    @property
+    def ok(self) -> bool:
+        return bool(self.rows)
+
+    def time_at(self, size: int) -> Optional[float]:
+        for row in self.rows:
+            if row["size"] == size:
+                return row["seconds"]
+        return None
+
+    def is_faster_than(self, other: Optional["BenchmarkReport"], min_improvement: float = 0.05) -> bool:
+        """
+        与另一份报告比较：能跑完更大规模的输入即视为更快；
+        否则比较两者都跑完的最大规模上的耗时，需快于 min_improvement 的比例。
+        """
+        if other is None or not other.ok:
+            return self.ok
+        if not self.ok:
+            return False
+        own_max, other_max = self.rows[-1]["size"], other.rows[-1]["size"]
+        if own_max != other_max:
+            return own_max > other_max
+        return self.rows[-1]["seconds"] < other.rows[-1]["seconds"] * (1 - min_improvement)
+
+    def sort_key(self) -> Tuple[int, float]:
+        """用于排序的键，越大越好：先比较跑完的规模数，再比较最大规模上的耗时。"""
+        if not self.ok:
+            return 0, float("-inf")
+        return len(self.rows), -self.rows[-1]["seconds"]
+
+    def to_prompt(self) -> str:
+        """格式化为可以直接放入提示词的计时表。"""
+        lines = ["| 输入规模 n | 最短耗时 (秒) |", "| --- | --- |"]
+        lines += [f"| {row['size']} | {row['seconds']:.6f} |" for row in self.rows]
+        if self.complexity:
+            slope = f"（log-log 斜率 {self.exponent:.2f}）" if self.exponent is not None else ""
+            lines.append(f"\n经验复杂度拟合: {self.complexity}{slope}")
+        if self.error:
+            lines.append(f"\n运行中止: {self.error}")
+        return "\n".join(lines)
+
+
+class CodeBenchmark:
+    """
+    在受限的子进程池中运行候选代码：
+    - 每个输入规模都在一个新的隔离解释器 (python -I) 中执行；
+    - 通过 resource 限制CPU时间与内存，通过超时限制墙钟时间；
+    - 输入规模从小到大递增，某一规模失败或超时后不再尝试更大的规模。
+    """
+
+    def __init__(
+        self,
+        input_generator: Callable[[int], tuple] = None,
+        sizes: Sequence[int] = (100, 1000, 10000, 100000),
+        repeat: int = 3,
+        time_limit: float = 10.0,
+        memory_limit_mb: int = 512,
+        max_workers: int = 2,
+    ):
+        """
+        参数:
+        - input_generator: 输入规模 n -> 函数位置参数元组，默认为 (n,)。
+        - sizes: 依次尝试的输入规模。
+        - repeat: 每个规模重复运行的次数，取最短耗时。
+        - time_limit: 每个规模的墙钟时间上限（秒），CPU时间上限与之相同。
+        - memory_limit_mb: 子进程的地址空间上限。
+        - max_workers: 同时评测的候选代码数量。
+        """
+        self.input_generator = input_generator or (lambda n: (n,))
+        self.sizes = list(sizes)
+        self.repeat = repeat
+        self.time_limit = time_limit
+        self.memory_limit_mb = memory_limit_mb
+        self.max_workers = max_workers
+
+    def run(self, code: str, func_name: Optional[str] = None) -> BenchmarkReport:
+        """实测一份候选代码（可以带有 ```python 围栏）。"""
+        code = extract_code(code)
+        func_name = func_name or find_function_name(code)
+        if not func_name:
+            return BenchmarkReport(code, [], error="代码中没有找到可调用的顶层函数。")
+
+        rows = []
+        for size in self.sizes:
+            seconds, error = self._run_once(code, func_name, self.input_generator(size))
+            if error:
+                return BenchmarkReport(code, rows, error=f"n={size} 时{error}")
+            rows.append({"size": size, "seconds": seconds})
+        return BenchmarkReport(code, rows)
+
+    def run_many(self, codes: Sequence[str]) -> List[BenchmarkReport]:
+        """并发实测多份候选代码，结果顺序与输入一致。"""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            return list(pool.map(self.run, codes))
+
+    def run_tests(self, code: str, test_cases: Sequence[Tuple[tuple, Any]], func_name: Optional[str] = None) -> float:
+        """在沙箱中运行测试用例 [(参数元组, 期望结果), ...]，返回通过率。"""
+        code = extract_code(code)
+        func_name = func_name or find_function_name(code)
+        if not func_name or not test_cases:
+            return 0.0
+        payload = pickle.dumps((code, func_name, [(tuple(args), expected) for args, expected in test_cases]))
+        output, error = self._run_script(_TESTS_RUNNER_SCRIPT, payload)
+        return output["passed"] / len(test_cases) if not error else 0.0
+
+    def _run_once(self, code: str, func_name: str, args: tuple) -> Tuple[Optional[float], Optional[str]]:
+        payload = pickle.dumps((code, func_name, tuple(args), self.repeat))
+        output, error = self._run_script(_RUNNER_SCRIPT, payload)
+        return (None, error) if error else (output["seconds"], None)
+
+    def _run_script(self, script: str, payload: bytes) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """在隔离的子进程中执行脚本，返回其最后一行输出的JSON或错误信息。"""
+        with tempfile.TemporaryDirectory() as workdir:
+            try:
+                completed = subprocess.run(
+                    [sys.executable, "-I", "-c", self._limits_prelude() + script],
+                    input=payload,
+                    capture_output=True,
+                    cwd=workdir,
+                    timeout=self.time_limit,
+                )
+            except subprocess.TimeoutExpired:
+                return None, f"超过时间限制 {self.time_limit} 秒"
+
+        if completed.returncode != 0:
+            stderr = completed.stderr.decode("utf-8", errors="replace").strip().splitlines()
+            return None, f"运行出错: {stderr[-1] if stderr else f'退出码 {completed.returncode}'}"
+        try:
+            return json.loads(completed.stdout.decode("utf-8").splitlines()[-1]), None
+        except (ValueError, IndexError):
+            return None, "无法解析子进程的输出"
+
+    def _limits_prelude(self) -> str:
+        """子进程脚本开头设置CPU时间与内存上限的代码（仅POSIX 生效）。"""
+        return _LIMITS_PRELUDE.format(
+            cpu_seconds=max(1, math.ceil(self.time_limit)),
+            memory_bytes=self.memory_limit_mb * 1024 * 1024,
+        )
+
+
+def runtime_scorer(benchmark: CodeBenchmark) -> Callable[[str], Tuple[int, float]]:
+    """
+    按实测运行时间为候选代码打分的评分器（越大越好）。
+    评分器的 reports 保存每份代码的实测报告，调用方可以取出复用，而不必再实测一次。
+    """
+    reports: Dict[str, BenchmarkReport] = {}
+
+    def score(code: str) -> Tuple[int, float]:
+        report = reports[code] = benchmark.run(code)
+        return report.sort_key()
+
+    score.benchmark = benchmark
+    score.reports = reports
+    return score
+
+
+def tests_scorer(test_cases: Sequence[Tuple[tuple, Any]], benchmark: Optional[CodeBenchmark] = None) -> Callable[[str], float]:
+    """按测试用例通过率为候选代码打分的评分器（越大越好）。"""
+    benchmark = benchmark or CodeBenchmark()
+    return lambda code: benchmark.run_tests(code, test_cases)
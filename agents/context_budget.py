@@ -0,0 +1,128 @@
+'''
+Author: wenjinwang 314984354@qq.com
+Date: 2026-10-19 09:16:59
+LastEditors: wenjinwang 314984354@qq.com
+LastEditTime: 2026-10-19 09:47:37
+FilePath: /hello-agents/agents/context_budget.py
+Description: ReAct 提示词的token预算：保留最近K步原文，更早的步骤折叠为摘要
+
+'''
+from typing import Any, Dict, List, Optional, Tuple
+
+from models.usage import estimate_tokens, truncate_to_tokens
+from telemetry.event_sink import emit
+
+
+class ContextBudget:
+    """
+    控制每一步提示词的token数不超过 max_tokens（按 models.usage.estimate_tokens 估算）。
+
+    问题、工具列表与模板本身总是完整保留。历史记录能整体放下时原样使用；放不下时依次：
+    1. 最近 keep_last_steps 步保留原文，更早的步骤折叠为每步不超过 summary_tokens 的摘要；
+    2. 仍然超出时，从最早的摘要开始省略，只留下一行“已省略 n 步”的说明；
+    3. 仍然超出时，从最早的一步开始截断最近几步的观察结果。
+    这样历史越长，提示词的长度越接近 max_tokens 而不再线性增长。
+    """
+
+    def __init__(self, max_tokens: int = 4000, keep_last_steps: int = 2, summary_tokens: int = 48):
+        self.max_tokens = max_tokens
+        self.keep_last_steps = keep_last_steps
+        self.summary_tokens = summary_tokens
+
+    @staticmethod
+    def _steps(history: List[str]) -> List[Tuple[str, str]]:
+        # ReAct 的历史记录按 "Action: ..."、"Observation: ..." 成对追加
+        return list(zip(history[0::2], history[1::2]))
+
+    def _summarize(self, index: int, action: str, observation: str) -> str:
+        # 摘要保留 Action 与观察结果的开头，并把换行压平为一行，格式上仍与原始历史一致
+        brief = " ".join(observation[:self.summary_tokens * 4].split())
+        return truncate_to_tokens(f"[第{index + 1}步] {action} | {brief}", self.summary_tokens)
+
+    def build_history(self, history: List[str], available: int, cache: Optional[Dict[str, Any]] = None) -> str:
+        """
+        把历史记录压缩到不超过 available 个token。
+        cache 用于在同一次运行的各步之间缓存每行历史的token数与已生成的摘要；
+        历史记录只会追加，因此每一步只需要估算新增的行。
+        """
+        if available <= 0:
+            return ""
+        cache = cache if cache is not None else {}
+        # 每一行都按“自身 + 换行”估算；分段估算之和不小于整体的估算值，因此结果不会超出预算
+        line_costs: List[int] = cache.setdefault("line_costs", [])
+        for line in history[len(line_costs):]:
+            line_costs.append(_cost(line))
+        total = sum(line_costs)
+        if total <= available:
+            return "\n".join(history)
+
+        summaries: Dict[int, Tuple[str, int]] = cache.setdefault("summaries", {})
+        steps = self._steps(history)
+        split = max(0, len(steps) - self.keep_last_steps)
+        for index in range(split):
+            if index not in summaries:
+                summary = self._summarize(index, *steps[index])
+                summaries[index] = (summary, _cost(summary))
+        older = [summaries[index][0] for index in range(split)]
+        older_costs = [summaries[index][1] for index in range(split)]
+        recent = list(history[2 * split:])
+        recent_costs = line_costs[2 * split:]
+        total = sum(older_costs) + sum(recent_costs)
+
+        omitted, notice = 0, []
+        while total > available and omitted < len(older):
+            total -= older_costs[omitted] + (_cost(notice[0]) if notice else 0)
+            omitted += 1
+            notice = [f"（更早的 {omitted} 步已省略）"]
+            total += _cost(notice[0])
+
+        # 截断最近几步的观察结果（奇数位置），从最早的一步开始
+        for i in range(1, len(recent), 2):
+            if total <= available:
+                break
+            truncated = _truncate_observation(recent[i], max(recent_costs[i] - 1 - (total - available), 0))
+            total += _cost(truncated) - recent_costs[i]
+            recent[i], recent_costs[i] = truncated, _cost(truncated)
+
+        if total > available:
+            # 连最近几步的行动本身都放不下，只能完全舍弃历史
+            return ""
+        return "\n".join(notice + older[omitted:] + recent)
+
+    def render(self, template: str, history: List[str], cache: Optional[Dict[str, Any]] = None, **fields) -> str:
+        """
+        用 template 渲染提示词，history 之外的字段原样填入。
+        模板与其他字段本身已超出预算时，历史记录为空，提示词仍会超出 max_tokens。
+        """
+        full = "\n".join(history)
+        prompt = template.format(history=full, **fields)
+        # 每个字符至多估算为一个token，足够短的提示词无需逐字估算
+        if len(prompt) <= self.max_tokens:
+            return prompt
+        fixed_tokens = estimate_tokens(template.format(history="", **fields))
+        history_str = self.build_history(history, self.max_tokens - fixed_tokens, cache)
+        if history_str == full:
+            return prompt
+        emit(
+            "react.context_trimmed", f"✂️ 历史记录超出token预算（{self.max_tokens}），已折叠较早的步骤。",
+            max_tokens=self.max_tokens, fixed_tokens=fixed_tokens, history_tokens=estimate_tokens(history_str),
+        )
+        return template.format(history=history_str, **fields)
+
+
+def _cost(line: str) -> int:
+    return estimate_tokens(line + "\n")
+
+
+_OBSERVATION_PREFIX = "Observation: "
+_TRUNCATED_SUFFIX = "…（已截断）"
+
+
+def _truncate_observation(line: str, max_tokens: int) -> str:
+    # 只截断观察结果的正文，保留 "Observation: " 前缀，使历史记录仍符合 ReAct 的格式
+    prefix = _OBSERVATION_PREFIX if line.startswith(_OBSERVATION_PREFIX) else ""
+    body = line[len(prefix):]
+    truncated = truncate_to_tokens(body, max_tokens - estimate_tokens(prefix), suffix=_TRUNCATED_SUFFIX)
+    if truncated is body:
+        return line
+    return prefix + (truncated or _TRUNCATED_SUFFIX)
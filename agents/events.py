@@ -0,0 +1,152 @@
+'''
+Author: wenjinwang 314984354@qq.com
+Date: 2026-10-19 08:57:41
+LastEditors: wenjinwang 314984354@qq.com
+LastEditTime: 2026-10-19 09:14:49
+FilePath: /hello-agents/agents/events.py
+Description: 智能体运行过程中产生的事件流
+
+'''
+import threading
+import time
+from dataclasses import dataclass, field, asdict
+from typing import Any, AsyncIterator, Callable, Dict, Generator, Iterator, List, Optional
+
+from models.usage import record_usage
+from telemetry.event_sink import LLM_END, LLM_TOKEN, emit
+from telemetry.metrics import observe_llm_call
+from telemetry.tracing import span
+
+
+# 事件类型
+TOKEN = "token"                 # LLM 流式输出的增量文本
+THOUGHT = "thought"             # ReAct 的思考 / 反思智能体评审员的反馈
+ACTION = "action"               # ReAct 的行动 / 计划中正在执行的步骤 / 反思智能体生成的代码
+OBSERVATION = "observation"     # 工具返回的观察 / 步骤的执行结果 / 代码的实测结果
+PLAN = "plan"                   # Plan-and-Solve 生成的计划
+FINAL_ANSWER = "final_answer"   # 最终答案，事件流的最后一个事件
+ERROR = "error"                 # 运行中的错误或警告
+
+
+@dataclass
+class AgentEvent:
+    """
+    智能体事件。
+    - type: 事件类型，见本模块中的常量。
+    - content: 事件的主要内容（文本、计划列表等）。
+    - step: 事件所属的步骤或迭代序号，从1开始；0表示不属于任何步骤。
+    - data: 附加的结构化信息。
+    """
+    type: str
+    content: Any = ""
+    step: int = 0
+    data: Dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def stream_llm(llm_client, messages: List[Dict[str, str]], temperature: float = 0, step: int = 0, cancel_event: Optional[threading.Event] = None) -> Generator[AgentEvent, None, Optional[str]]:
+    """
+    调用LLM，并把流式输出逐块作为 TOKEN 事件产出；生成器的返回值是完整响应，出错或被取消时为 None。
+    用法: response_text = yield from stream_llm(...)
+    cancel_event 被设置后，会关闭底层的流式响应，从而中止正在进行的LLM调用。
+    不支持 stream_think 的客户端会退化为一次 think 调用，整段响应作为一个 TOKEN 事件。
+    """
+    if cancel_event is not None and cancel_event.is_set():
+        return None
+
+    model = getattr(llm_client, "model", None)
+    started = time.perf_counter()
+    stream_think = getattr(llm_client, "stream_think", None)
+    if stream_think is None:
+        with span("llm.call", model=model, streaming=False):
+            response_text = llm_client.think(messages=messages, temperature=temperature)
+        prompt_tokens, completion_tokens = record_usage(messages, response_text)
+        observe_llm_call(model, time.perf_counter() - started, None, prompt_tokens, completion_tokens, "ok" if response_text is not None else "error")
+        if response_text:
+            yield AgentEvent(TOKEN, response_text, step)
+        return response_text
+
+    emit("llm.start", f"🧠 正在调用 {llm_client.model} 模型...", model=llm_client.model, step=step)
+    collected_content = []
+    ttft = None
+    with span("llm.call", model=model, streaming=True) as call_span:
+        stream = stream_think(messages, temperature=temperature)
+        try:
+            for content in stream:
+                if ttft is None:
+                    ttft = time.perf_counter() - started
+                    call_span.mark("ttft")
+                if cancel_event is not None and cancel_event.is_set():
+                    emit("llm.cancelled", "\n⏹️ 运行已被取消，中止LLM调用。", model=llm_client.model, step=step)
+                    call_span.set(cancelled=True)
+                    observe_llm_call(model, time.perf_counter() - started, status="cancelled")
+                    return None
+                emit(LLM_TOKEN, content)
+                collected_content.append(content)
+                yield AgentEvent(TOKEN, content, step)
+            response_text = "".join(collected_content)
+            emit(LLM_END, model=llm_client.model, step=step, response=response_text)  # 在流式输出结束后换行
+            call_span.set(chunks=len(collected_content), chars=len(response_text))
+            prompt_tokens, completion_tokens = record_usage(messages, response_text)
+            observe_llm_call(model, time.perf_counter() - started, ttft, prompt_tokens, completion_tokens)
+            return response_text
+        except Exception as e:
+            emit("llm.error", f"❌ 调用LLM API时发生错误: {e}", model=llm_client.model, step=step, error=str(e))
+            call_span.set(error=str(e))
+            observe_llm_call(model, time.perf_counter() - started, status="error")
+            return None
+        finally:
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+
+
+def drain(events: Generator[AgentEvent, None, Any]) -> Any:
+    """消费完一个事件生成器，并返回它的返回值。"""
+    while True:
+        try:
+            next(events)
+        except StopIteration as stop:
+            return stop.value
+
+
+async def aiter_events(make_events: Callable[[], Iterator[AgentEvent]]) -> AsyncIterator[AgentEvent]:
+    """
+    将同步的事件生成器放到线程池中运行，并以异步迭代器的形式产出事件。
+    异步迭代器提前关闭时，会在下一个事件边界关闭同步生成器。
+    """
+    import asyncio  # 只有异步调用方才需要，且此时事件循环已经导入了它
+
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+    done = object()
+
+    def produce():
+        events = make_events()
+        try:
+            for event in events:
+                if stop.is_set():
+                    events.close()
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+        except BaseException as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, done)
+
+    producer = loop.run_in_executor(None, produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        if producer.done():
+            await producer
@@ -7,106 +7,364 @@ FilePath: /hello-agents/agents/plan_solve_agent.py
 Description: 
 '''
 import ast
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
 
+from agents.batch import BatchRunMixin
+from agents.events import AgentEvent, ACTION, OBSERVATION, PLAN, FINAL_ANSWER, ERROR, stream_llm, drain, aiter_events
+from agents.run_context import RunContext
+from telemetry.event_sink import emit
+from telemetry.metrics import track_run
+from telemetry.profiling import profile_run
+from telemetry.tracing import span
 from models.hello_agents_llm import HelloAgentsLLM
-from prompts.plan_solve_prompt import PLANNER_PROMPT_TEMPLATE, EXECUTOR_PROMPT_TEMPLATE
+from models.cascade import with_validator
+from models.router import EXECUTOR, PLANNER, for_role
+from prompts.plan_solve_prompt import PLANNER_PROMPT_TEMPLATE, EXECUTOR_PROMPT_TEMPLATE, REPLANNER_PROMPT_TEMPLATE
+
+
+class PlanMemo:
+    """
+    计划与步骤结果的记忆化存储，可在多次运行之间复用。
+    - 计划以规范化后的问题为键；
+    - 步骤结果以 (问题, 完整计划, 步骤文本, 此前所有步骤的结果) 为键，
+      因为执行器的提示词同时依赖于原始问题、完整计划和历史结果。
+    计划与步骤结果各自超过 max_entries 时淘汰最久未使用的条目。
+    如果提供了 path，则会从该JSON文件加载，并在 save() 时写回。
+    """
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = 4096):
+        self.path = path
+        self.max_entries = max_entries
+        self.plans: "OrderedDict[str, List[str]]" = OrderedDict()
+        self.step_results: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.plans.update(data.get("plans", {}))
+            self.step_results.update(data.get("step_results", {}))
+            self._evict(self.plans)
+            self._evict(self.step_results)
+
+    @staticmethod
+    def normalize_question(question: str) -> str:
+        """统一全角/半角、大小写与空白，并去掉结尾的标点。"""
+        text = unicodedata.normalize("NFKC", question).lower()
+        text = re.sub(r"\s+", " ", text).strip()
+        return text.rstrip("?？。.!！ ")
+
+    @staticmethod
+    def _hash(*parts: Any) -> str:
+        payload = json.dumps(parts, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _evict(self, entries: OrderedDict):
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def _get(self, entries: OrderedDict, key: str) -> Any:
+        with self._lock:
+            value = entries.get(key)
+            if value is not None:
+                entries.move_to_end(key)
+            return value
+
+    def _put(self, entries: OrderedDict, key: str, value: Any):
+        with self._lock:
+            entries[key] = value
+            entries.move_to_end(key)
+            self._evict(entries)
+
+    def get_plan(self, question: str) -> Optional[List[str]]:
+        return self._get(self.plans, self.normalize_question(question))
+
+    def put_plan(self, question: str, plan: List[str]):
+        self._put(self.plans, self.normalize_question(question), list(plan))
+
+    def step_key(self, question: str, plan: List[str], step: str, dependency_results: List[str]) -> str:
+        return self._hash(self.normalize_question(question), list(plan), step, dependency_results)
+
+    def get_step(self, key: str) -> Optional[str]:
+        return self._get(self.step_results, key)
+
+    def put_step(self, key: str, result: str):
+        self._put(self.step_results, key, result)
+
+    def save(self):
+        """将记忆写回磁盘（未设置 path 时不做任何事）。"""
+        if not self.path:
+            return
+        with self._lock:
+            data = {"plans": self.plans, "step_results": self.step_results}
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
 
 
 class Planner:
     def __init__(self, llm_client: HelloAgentsLLM):
-        self.llm_client = llm_client
+        # 级联客户端的小模型输出无法解析为计划时，升级到大模型
+        self.llm_client = with_validator(llm_client, self.is_valid_plan)
 
     def plan(self, question: str) -> list[str]:
         """
         根据用户问题生成一个行动计划。
         """
+        return drain(self.plan_events(question))
+
+    def plan_events(self, question: str, context: Optional[RunContext] = None):
+        """plan 的事件流版本，产出LLM的 token 事件，返回值为计划列表。"""
         prompt = PLANNER_PROMPT_TEMPLATE.format(question=question)
-        
+
         # 为了生成计划，我们构建一个简单的消息列表
         messages = [{"role": "user", "content": prompt}]
-        
-        print("--- 正在生成计划 ---")
+
+        emit("plan.start", "--- 正在生成计划 ---")
         # 使用流式输出来获取完整的计划
-        response_text = self.llm_client.think(messages=messages) or ""
-        
-        print(f"✅ 计划已生成:\n{response_text}")
-        
-        # 解析LLM输出的列表字符串
+        cancel_event = context.cancel_event if context else None
+        with span("plan.plan"):
+            response_text = (yield from stream_llm(self.llm_client, messages, cancel_event=cancel_event)) or ""
+
+        emit("plan.done", f"✅ 计划已生成:\n{response_text}", response=response_text)
+        return self._parse_plan(response_text)
+
+    def replan(self, question: str, history: str, failed_step: str) -> list[str]:
+        """
+        保留已完成的步骤，只为失败步骤及其之后的部分重新生成计划。
+        """
+        return drain(self.replan_events(question, history, failed_step))
+
+    def replan_events(self, question: str, history: str, failed_step: str, context: Optional[RunContext] = None):
+        """replan 的事件流版本，返回值为剩余的计划列表。"""
+        prompt = REPLANNER_PROMPT_TEMPLATE.format(
+            question=question,
+            history=history if history else "无",
+            failed_step=failed_step
+        )
+        messages = [{"role": "user", "content": prompt}]
+
+        emit("plan.replan_start", "--- 正在重新规划剩余步骤 ---", failed_step=failed_step)
+        cancel_event = context.cancel_event if context else None
+        with span("plan.replan", failed_step=failed_step):
+            response_text = (yield from stream_llm(self.llm_client, messages, cancel_event=cancel_event)) or ""
+
+        emit("plan.replan_done", f"✅ 剩余计划已生成:\n{response_text}", response=response_text)
+        return self._parse_plan(response_text)
+
+    def _parse_plan(self, response_text: str) -> list[str]:
+        """解析LLM输出的列表字符串"""
+        with span("plan.parse"):
+            return self._parse_plan_text(response_text)
+
+    @staticmethod
+    def _extract_plan(response_text: str):
+        # 找到```python和```之间的内容
+        plan_str = response_text.split("```python")[1].split("```")[0].strip()
+        # 使用ast.literal_eval来安全地执行字符串，将其转换为Python列表
+        return ast.literal_eval(plan_str)
+
+    @classmethod
+    def is_valid_plan(cls, response_text: str) -> bool:
+        """响应能否被解析为非空的计划列表（不产生解析错误的事件）。"""
         try:
-            # 找到```python和```之间的内容
-            plan_str = response_text.split("```python")[1].split("```")[0].strip()
-            # 使用ast.literal_eval来安全地执行字符串，将其转换为Python列表
-            plan = ast.literal_eval(plan_str)
+            plan = cls._extract_plan(response_text)
+        except Exception:
+            return False
+        return isinstance(plan, list) and bool(plan)
+
+    def _parse_plan_text(self, response_text: str) -> list[str]:
+        try:
+            plan = self._extract_plan(response_text)
             return plan if isinstance(plan, list) else []
         except (ValueError, SyntaxError, IndexError) as e:
-            print(f"❌ 解析计划时出错: {e}")
-            print(f"原始响应: {response_text}")
+            emit("plan.parse_error", f"❌ 解析计划时出错: {e}\n原始响应: {response_text}", error=str(e), response=response_text)
             return []
         except Exception as e:
-            print(f"❌ 解析计划时发生未知错误: {e}")
+            emit("plan.parse_error", f"❌ 解析计划时发生未知错误: {e}", error=str(e), response=response_text)
             return []
 
 
 class Executor:
-    def __init__(self, llm_client: HelloAgentsLLM):
+    def __init__(self, llm_client: HelloAgentsLLM, memo: Optional[PlanMemo] = None):
         self.llm_client = llm_client
+        self.memo = memo
 
     def execute(self, question: str, plan: list[str]) -> str:
         """
         根据计划，逐步执行并解决问题。
         """
-        history = "" # 用于存储历史步骤和结果的字符串
-        
-        print("\n--- 正在执行计划 ---")
-        
-        for i, step in enumerate(plan):
-            print(f"\n-> 正在执行步骤 {i+1}/{len(plan)}: {step}")
-            
-            prompt = EXECUTOR_PROMPT_TEMPLATE.format(
-                question=question,
-                plan=plan,
-                history=history if history else "无", # 如果是第一步，则历史为空
-                current_step=step
-            )
-            
-            messages = [{"role": "user", "content": prompt}]
-            
-            response_text = self.llm_client.think(messages=messages) or ""
-            
-            # 更新历史记录，为下一步做准备
-            history += f"步骤 {i+1}: {step}\n结果: {response_text}\n\n"
-            
-            print(f"✅ 步骤 {i+1} 已完成，结果: {response_text}")
+        emit("plan.execute", "\n--- 正在执行计划 ---")
+        records = self.execute_steps(question, plan)
 
         # 循环结束后，最后一步的响应就是最终答案
-        final_answer = response_text
+        final_answer = records[-1]["result"] if records else ""
         return final_answer
 
+    def execute_steps(self, question: str, plan: list[str], completed: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+        """
+        从 completed 之后的步骤开始逐步执行计划，返回每一步的记录:
+        {"step": 步骤文本, "result": 结果, "cached": 是否命中缓存}。
+        某一步LLM未返回结果时，会在该步停止，记录中不包含失败的步骤。
+        """
+        return drain(self.execute_steps_events(question, plan, completed))
 
-class PlanAndSolveAgent:
-    def __init__(self, llm_client: HelloAgentsLLM):
+    def execute_steps_events(self, question: str, plan: list[str], completed: Optional[List[Dict[str, Any]]] = None, context: Optional[RunContext] = None):
+        """
+        execute_steps 的事件流版本：每一步依次产出 action（步骤文本）、token 与 observation（步骤结果）事件，
+        返回值为步骤记录列表。context 被取消时在下一步之前停止。
+        """
+        records = list(completed or [])
+
+        for i in range(len(records), len(plan)):
+            if context and context.cancelled:
+                emit("plan.cancelled", "运行已被取消，停止执行计划。", run_id=context.run_id, step=i + 1)
+                break
+            with span("plan.step", step=i + 1):
+                step = plan[i]
+                emit("plan.step", f"\n-> 正在执行步骤 {i+1}/{len(plan)}: {step}", step=i + 1, total=len(plan), text=step)
+                yield AgentEvent(ACTION, step, i + 1)
+
+                dependency_results = [record["result"] for record in records]
+                key = self.memo.step_key(question, plan, step, dependency_results) if self.memo else None
+                cached_result = self.memo.get_step(key) if self.memo else None
+                if cached_result is not None:
+                    records.append({"step": step, "result": cached_result, "cached": True})
+                    emit("plan.step_cached", f"♻️ 步骤 {i+1} 命中缓存，结果: {cached_result}", step=i + 1)
+                    yield AgentEvent(OBSERVATION, cached_result, i + 1, {"cached": True})
+                    continue
+
+                prompt = EXECUTOR_PROMPT_TEMPLATE.format(
+                    question=question,
+                    plan=plan,
+                    history=self._format_history(records) or "无", # 如果是第一步，则历史为空
+                    current_step=step
+                )
+
+                messages = [{"role": "user", "content": prompt}]
+
+                cancel_event = context.cancel_event if context else None
+                response_text = yield from stream_llm(self.llm_client, messages, step=i + 1, cancel_event=cancel_event)
+                if not response_text:
+                    emit("plan.step_failed", f"❌ 步骤 {i+1} 执行失败。", step=i + 1)
+                    yield AgentEvent(ERROR, f"步骤 {i+1} 执行失败。", i + 1)
+                    break
+
+                if self.memo:
+                    self.memo.put_step(key, response_text)
+                # 更新历史记录，为下一步做准备
+                records.append({"step": step, "result": response_text, "cached": False})
+
+                emit("plan.step_done", f"✅ 步骤 {i+1} 已完成，结果: {response_text}", step=i + 1)
+                yield AgentEvent(OBSERVATION, response_text, i + 1, {"cached": False})
+
+        return records
+
+    @staticmethod
+    def _format_history(records: List[Dict[str, Any]]) -> str:
+        """将已完成的步骤格式化为历史步骤与结果字符串"""
+        return "".join(
+            f"步骤 {i+1}: {record['step']}\n结果: {record['result']}\n\n"
+            for i, record in enumerate(records)
+        )
+
+
+class PlanAndSolveAgent(BatchRunMixin):
+    def __init__(self, llm_client: HelloAgentsLLM, memo: Optional[PlanMemo] = None, max_replans: int = 1):
         """
         初始化智能体，同时创建规划器和执行器实例。
+        传入 memo 后，计划与步骤结果会在多次运行之间复用；
+        max_replans 为某一步失败后允许增量重新规划的次数。
+        llm_client 为 ModelRouter 时，规划器与执行器分别使用 planner 与 executor 角色的模型。
         """
         self.llm_client = llm_client
-        self.planner = Planner(self.llm_client)
-        self.executor = Executor(self.llm_client)
+        self.memo = memo
+        self.max_replans = max_replans
+        self.planner = Planner(for_role(self.llm_client, PLANNER, "plan_solve"))
+        self.executor = Executor(for_role(self.llm_client, EXECUTOR, "plan_solve"), memo=self.memo)
 
-    def run(self, question: str):
+    def run(self, question: str, context: Optional[RunContext] = None, profile: Optional[bool] = None):
         """
         运行智能体的完整流程:先规划，后执行。
+        返回 (最终答案, 步骤记录列表)，步骤记录中的 cached 字段标记了命中缓存的步骤。
+        profile=True 时剖析本次运行，见 telemetry/profiling.py。
         """
-        print(f"\n--- 开始处理问题 ---\n问题: {question}")
-        
-        # 1. 调用规划器生成计划
-        plan = self.planner.plan(question)
-        
-        # 检查计划是否成功生成
-        if not plan:
-            print("\n--- 任务终止 --- \n无法生成有效的行动计划。")
-            return
+        if profile is not None:
+            context = context or RunContext(question, profile=profile)
+            context.profile = profile
+        final_answer, records = None, []
+        for event in self.run_events(question, context):
+            if event.type == FINAL_ANSWER:
+                final_answer, records = event.content, event.data["steps"]
+        return final_answer, records
+
+    def arun_events(self, question: str, context: Optional[RunContext] = None):
+        """run_events 的异步迭代器版本。"""
+        return aiter_events(lambda: self.run_events(question, context))
+
+    def run_events(self, question: str, context: Optional[RunContext] = None):
+        """
+        以事件流的方式运行智能体，依次产出 plan、各步骤的 action / token / observation 事件，
+        最后一个事件总是 final_answer（失败时内容为 None），其 data["steps"] 为步骤记录列表。
+        运行状态都是局部的，同一个智能体实例可以被并发调用；共享的 memo 自带锁。
+        """
+        context = context or RunContext(question)
+        with span("plan.run", trace_id=context.run_id, question=question), track_run("plan_solve"), profile_run("plan_solve", context.run_id, context.profile):
+            emit("plan.run_start", f"\n--- 开始处理问题 ---\n问题: {question}", run_id=context.run_id, question=question)
+
+            # 1. 调用规划器生成计划，优先复用已记忆的计划
+            plan = self.memo.get_plan(question) if self.memo else None
+            if plan:
+                emit("plan.cached", f"♻️ 计划命中缓存:\n{plan}", run_id=context.run_id, plan=plan)
+            else:
+                plan = yield from self.planner.plan_events(question, context=context)
+
+            # 检查计划是否成功生成
+            if not plan:
+                emit("plan.run_failed", "\n--- 任务终止 --- \n无法生成有效的行动计划。", run_id=context.run_id)
+                yield AgentEvent(ERROR, "无法生成有效的行动计划。")
+                yield AgentEvent(FINAL_ANSWER, None, data={"steps": []})
+                return
+            yield AgentEvent(PLAN, plan)
+
+            # 2. 调用执行器执行计划，某一步失败时保留已完成的步骤并重新规划剩余部分
+            emit("plan.execute", "\n--- 正在执行计划 ---", run_id=context.run_id, plan=plan)
+            records = yield from self.executor.execute_steps_events(question, plan, context=context)
+            replans = 0
+            while len(records) < len(plan) and replans < self.max_replans and not context.cancelled:
+                replans += 1
+                remaining = yield from self.planner.replan_events(
+                    question,
+                    history=Executor._format_history(records),
+                    failed_step=plan[len(records)],
+                    context=context
+                )
+                if not remaining:
+                    break
+                plan = plan[:len(records)] + remaining
+                yield AgentEvent(PLAN, plan, data={"replanned": True})
+                records = yield from self.executor.execute_steps_events(question, plan, completed=records, context=context)
+
+            if len(records) < len(plan):
+                emit("plan.run_failed", "\n--- 任务终止 --- \n计划中的步骤未能全部执行成功。", run_id=context.run_id)
+                yield AgentEvent(ERROR, "计划中的步骤未能全部执行成功。")
+                yield AgentEvent(FINAL_ANSWER, None, data={"steps": records})
+                return
+
+            if self.memo:
+                self.memo.put_plan(question, plan)
+                self.memo.save()
 
-        # 2. 调用执行器执行计划
-        final_answer = self.executor.execute(question, plan)
-        
-        print(f"\n--- 任务完成 ---\n最终答案: {final_answer}")
+            final_answer = records[-1]["result"]
+            cached_steps = [i + 1 for i, record in enumerate(records) if record["cached"]]
+            if cached_steps:
+                emit("plan.cached_steps", f"\n♻️ 以下步骤的结果来自缓存: {cached_steps}", run_id=context.run_id, steps=cached_steps)
+            emit("plan.final_answer", f"\n--- 任务完成 ---\n最终答案: {final_answer}", run_id=context.run_id, answer=final_answer)
+            yield AgentEvent(FINAL_ANSWER, final_answer, len(records), {"steps": records})
@@ -9,93 +9,168 @@ Description: ReAct Agent
 Copyright (c) 2025 by Tencent, All Rights Reserved. 
 '''
 import re
-
+from typing import Optional
+
+from agents.batch import BatchRunMixin
+from agents.context_budget import ContextBudget
+from agents.events import AgentEvent, THOUGHT, ACTION, OBSERVATION, FINAL_ANSWER, ERROR, stream_llm, aiter_events
+from agents.rule_engine import RuleEngine
+from agents.run_context import RunContext
+from telemetry.event_sink import emit
+from telemetry.metrics import track_run
+from telemetry.profiling import profile_run
+from telemetry.tracing import span
 from models.hello_agents_llm import HelloAgentsLLM
+from models.cascade import with_validator
+from models.router import STEP, for_role
 from tools.tool_exector import ToolExecutor
 from prompts.react_prompt import REACT_PROMPT_TEMPLATE
 
 
-class ReActAgent:
-    def __init__(self, llm_client: HelloAgentsLLM, tool_executor: ToolExecutor, max_steps: int = 5):
+class ReActAgent(BatchRunMixin):
+    def __init__(
+        self,
+        llm_client: HelloAgentsLLM,
+        tool_executor: ToolExecutor,
+        max_steps: int = 5,
+        context_budget: Optional[ContextBudget] = None,
+        rule_engine: Optional[RuleEngine] = None,
+    ):
+        """
+        context_budget 控制每一步提示词的token上限，历史过长时较早的步骤会被折叠为摘要，
+        默认使用 ContextBudget() 的设置。
+        rule_engine 放在LLM之前：问题命中其中的规则时，直接按规则回答（需要时调用工具），不调用LLM。
+        llm_client 为 ModelRouter 时，每一步使用 react.step 角色的模型；
+        为级联客户端时，小模型的输出中没有可执行的 Action 才升级到大模型。
+        """
         self.llm_client = llm_client
+        self.step_llm = with_validator(for_role(llm_client, STEP, "react"), self._is_valid_step)
         self.tool_executor = tool_executor
         self.max_steps = max_steps
-        self.history = []
+        self.context_budget = context_budget or ContextBudget()
+        self.rule_engine = rule_engine
 
-    def run(self, question: str):
+    def run(self, question: str, context: Optional[RunContext] = None, profile: Optional[bool] = None):
         """
         运行ReAct智能体来回答一个问题。
+        返回 (最终答案, 思考过程列表)。profile=True 时剖析本次运行，见 telemetry/profiling.py。
         """
-        self.history = [] # 每次运行时重置历史记录
-        current_step = 0
-
+        if profile is not None:
+            context = context or RunContext(question, profile=profile)
+            context.profile = profile
+        final_answer = None
         thinking_process = []
-        while current_step < self.max_steps:
-            current_step += 1
-            print(f"--- 第 {current_step} 步 ---")
-
-            # 1. 格式化提示词
-            tools_desc = self.tool_executor.getAvailableTools()
-            history_str = "\n".join(self.history)
-            prompt = REACT_PROMPT_TEMPLATE.format(
-                tools=tools_desc,
-                question=question,
-                history=history_str
-            )
-
-            # 2. 调用LLM进行思考
-            messages = [{"role": "user", "content": prompt}]
-            response_text = self.llm_client.think(messages=messages)
-            
-            if not response_text:
-                print("错误:LLM未能返回有效响应。")
-                break
-
-            # 3. 解析LLM的输出
-            thought, action = self._parse_output(response_text)
-            
-            if thought:
-                print(f"思考: {thought}")
-
-            if not action:
-                print("警告:未能解析出有效的Action，流程终止。")
-                break
-
-            # 4. 执行Action
-            if action.startswith("Finish"):
-                # 如果是Finish指令，提取最终答案并结束
-                final_answer = re.match(r"Finish\((.*)\)", action).group(1)
-                print(f"🎉 最终答案: {final_answer}")
-                return final_answer, thinking_process
-            
-            tool_name, tool_input_dict = self._parse_action(action)
-            if not tool_name or not tool_input_dict:
-                # ... 处理无效Action格式 ...
-                continue
-
-            print(f"🎬 行动: {tool_name}[{tool_input_dict}]")
-            
-            tool_function = self.tool_executor.getTool(tool_name)
-            if not tool_function:
-                observation = f"错误:未找到名为 '{tool_name}' 的工具。"
-            else:
-                observation = tool_function(**tool_input_dict) # 调用真实工具
-            print(f"👀 观察: {observation}")
-
-            # 将本轮的Action和Observation添加到历史记录中
-            self.history.append(f"Action: {action}")
-            self.history.append(f"Observation: {observation}")
-
-            thinking_process.append({
-                "iteration": current_step,
-                "thought": thought,
-                "action": action,
-                "observation": observation
-            })
-
-        # 循环结束
-        print("已达到最大步数，流程终止。")
-        return "达到最大迭代次数，任务未完成。", thinking_process
+        for event in self.run_events(question, context):
+            if event.type == OBSERVATION:
+                thinking_process.append({
+                    "iteration": event.step,
+                    "thought": event.data["thought"],
+                    "action": event.data["action"],
+                    "observation": event.content
+                })
+            elif event.type == FINAL_ANSWER:
+                final_answer = event.content
+        return final_answer, thinking_process
+
+    def arun_events(self, question: str, context: Optional[RunContext] = None):
+        """run_events 的异步迭代器版本。"""
+        return aiter_events(lambda: self.run_events(question, context))
+
+    def run_events(self, question: str, context: Optional[RunContext] = None):
+        """
+        以事件流的方式运行ReAct智能体，依次产出 token / thought / action / observation 事件，
+        最后一个事件总是 final_answer。
+        每次运行的历史记录与步数都保存在 context 中，因此同一个智能体实例可以被并发调用。
+        """
+        context = context or RunContext(question) # 每次运行使用独立的上下文
+
+        with span("react.run", trace_id=context.run_id, question=question), track_run("react"), profile_run("react", context.run_id, context.profile):
+            if self.rule_engine is not None and not context.step:
+                hit = self.rule_engine.respond(question)
+                if hit is not None:
+                    yield from self._rule_events(hit, context)
+                    return
+
+            while context.step < self.max_steps:
+                if context.cancelled:
+                    emit("react.cancelled", "运行已被取消，流程终止。", run_id=context.run_id, step=context.step)
+                    yield AgentEvent(FINAL_ANSWER, "运行已被取消。", context.step, {"finished": False, "cancelled": True})
+                    return
+                context.step += 1
+                current_step = context.step
+                with span("react.step", step=current_step):
+                    emit("react.step", f"--- 第 {current_step} 步 ---", run_id=context.run_id, step=current_step)
+
+                    # 1. 格式化提示词（历史记录按token预算压缩，估算结果与摘要缓存在本次运行的上下文中）
+                    # 工具较多时只列出与问题及上一步行动/观察相关的工具
+                    tool_query = "\n".join([question] + [line[:200] for line in context.history[-2:]])
+                    tools_desc = self.tool_executor.getAvailableTools(query=tool_query)
+                    prompt = self.context_budget.render(
+                        REACT_PROMPT_TEMPLATE,
+                        context.history,
+                        cache=context.state.setdefault("react_context", {}),
+                        tools=tools_desc,
+                        question=question,
+                    )
+
+                    # 2. 调用LLM进行思考
+                    messages = [{"role": "user", "content": prompt}]
+                    response_text = yield from stream_llm(self.step_llm, messages, step=current_step, cancel_event=context.cancel_event)
+
+                    if not response_text and context.cancelled:
+                        continue # 由循环开头的取消检查结束本次运行
+                    if not response_text:
+                        emit("react.error", "错误:LLM未能返回有效响应。", run_id=context.run_id, step=current_step)
+                        yield AgentEvent(ERROR, "LLM未能返回有效响应。", current_step)
+                        break
+
+                    # 3. 解析LLM的输出
+                    with span("react.parse", target="output"):
+                        thought, action = self._parse_output(response_text)
+
+                    if thought:
+                        emit("react.thought", f"思考: {thought}", run_id=context.run_id, step=current_step, thought=thought)
+                        yield AgentEvent(THOUGHT, thought, current_step)
+
+                    if not action:
+                        emit("react.error", "警告:未能解析出有效的Action，流程终止。", run_id=context.run_id, step=current_step)
+                        yield AgentEvent(ERROR, "未能解析出有效的Action，流程终止。", current_step)
+                        break
+
+                    yield AgentEvent(ACTION, action, current_step)
+
+                    # 4. 执行Action
+                    if action.startswith("Finish"):
+                        # 如果是Finish指令，提取最终答案并结束
+                        final_answer = re.match(r"Finish\((.*)\)", action).group(1)
+                        emit("react.final_answer", f"🎉 最终答案: {final_answer}", run_id=context.run_id, step=current_step, answer=final_answer)
+                        yield AgentEvent(FINAL_ANSWER, final_answer, current_step, {"finished": True})
+                        return
+
+                    with span("react.parse", target="action"):
+                        tool_name, tool_input_dict = self._parse_action(action)
+                    if not tool_name or not tool_input_dict:
+                        # ... 处理无效Action格式 ...
+                        continue
+
+                    emit("react.action", f"🎬 行动: {tool_name}[{tool_input_dict}]", run_id=context.run_id, step=current_step, tool=tool_name, args=tool_input_dict)
+
+                    tool_function = self.tool_executor.getTool(tool_name, query=question)
+                    if not tool_function:
+                        observation = f"错误:未找到名为 '{tool_name}' 的工具。"
+                    else:
+                        observation = tool_function(**tool_input_dict) # 调用真实工具
+                    emit("react.observation", f"👀 观察: {observation}", run_id=context.run_id, step=current_step, tool=tool_name)
+
+                    # 将本轮的Action和Observation添加到历史记录中
+                    context.history.append(f"Action: {action}")
+                    context.history.append(f"Observation: {observation}")
+
+                    yield AgentEvent(OBSERVATION, observation, current_step, {"thought": thought, "action": action})
+
+            # 循环结束
+            emit("react.max_steps", "已达到最大步数，流程终止。", run_id=context.run_id, step=context.step)
+            yield AgentEvent(FINAL_ANSWER, "达到最大迭代次数，任务未完成。", context.step, {"finished": False})
 
     def _parse_output(self, text: str):
         """解析LLM的输出，提取Thought和Action。"""
@@ -105,6 +180,26 @@ class ReActAgent:
         action = action_match.group(1).strip() if action_match else None
         return thought, action
 
+    def _rule_events(self, hit, context: RunContext):
+        """把规则的回答转换为与LLM路径相同形式的事件：调用了工具时先产出 action / observation。"""
+        context.step = 1
+        emit("react.rule_hit", f"⚡ 命中规则 {hit.rule}，跳过LLM。", run_id=context.run_id, rule=hit.rule, tool=hit.tool)
+        if hit.tool:
+            args = ", ".join(f'{key}="{value}"' for key, value in hit.tool_args.items())
+            action = f"{hit.tool}[{args}]"
+            thought = f"问题命中规则 {hit.rule}，直接调用工具。"
+            yield AgentEvent(ACTION, action, 1, {"rule": hit.rule})
+            context.history.append(f"Action: {action}")
+            context.history.append(f"Observation: {hit.observation}")
+            yield AgentEvent(OBSERVATION, hit.observation, 1, {"thought": thought, "action": action, "rule": hit.rule})
+        emit("react.final_answer", f"🎉 最终答案: {hit.text}", run_id=context.run_id, step=1, answer=hit.text)
+        yield AgentEvent(FINAL_ANSWER, hit.text, 1, {"finished": True, "rule": hit.rule})
+
+    def _is_valid_step(self, text: str) -> bool:
+        """输出中是否有可执行的 Action：Finish(...) 或 工具名[参数]。"""
+        _, action = self._parse_output(text)
+        return bool(action) and bool(re.match(r"Finish\(.*\)|\w+\[.*\]", action))
+
     def _parse_action(self, action_text: str):
         """解析Action字符串，提取工具名称和输入字典。"""
         tool_name = re.search(r"(\w+)\[", action_text).group(1)
@@ -7,22 +7,76 @@ FilePath: /hello-agents/agents/reflection_agent.py
 Description: 
 
 '''
-from typing import List, Dict, Any, Optional
+import ast
+import builtins
+import contextvars
+import difflib
+import hashlib
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Callable, Tuple
 
+from agents.code_benchmark import BenchmarkReport, CodeBenchmark, extract_code, find_function_name
+from agents.batch import BatchRunMixin
+from agents.events import AgentEvent, THOUGHT, ACTION, OBSERVATION, FINAL_ANSWER, stream_llm, aiter_events
+from agents.run_context import RunContext
 from models.hello_agents_llm import HelloAgentsLLM
+from models.cascade import non_empty, with_validator
+from models.router import CRITIC, REFINER, for_role
+from models.usage import record_usage
+from telemetry.event_sink import emit
+from telemetry.metrics import observe_llm_call, track_run
+from telemetry.profiling import profile_run
+from telemetry.tracing import span
 from prompts.reflection_prompt import INITIAL_PROMPT_TEMPLATE, REFLECT_PROMPT_TEMPLATE, REFINE_PROMPT_TEMPLATE
 
 
+# 各类记录在轨迹文本中的标题
+TRAJECTORY_HEADERS = {
+    "execution": "--- 上一轮尝试 (代码) ---",
+    "reflection": "--- 评审员反馈 ---",
+}
+
+
+class MemoryRecord:
+    """
+    一条记忆记录。使用 __slots__ 以减少大量记录时的内存占用，
+    同时保留 record['type'] 形式的下标访问。
+    """
+    __slots__ = ("type", "content")
+
+    def __init__(self, record_type: str, content: str):
+        self.type = record_type
+        self.content = content
+
+    def __getitem__(self, key: str):
+        return getattr(self, key)
+
+
 class Memory:
     """
     一个简单的短期记忆模块，用于存储智能体的行动与反思轨迹。
+    记录数量有上限，超出后丢弃最早的记录；每种类型的最新记录与轨迹文本都是增量维护的。
     """
 
-    def __init__(self):
+    def __init__(self, max_records: int = 64):
         """
-        初始化一个空列表来存储所有记录。
+        初始化一个有界队列来存储记录。
+
+        参数:
+        - max_records (int): 最多保留的记录条数。
         """
-        self.records: List[Dict[str, Any]] = []
+        self.max_records = max_records
+        self._records: deque = deque()
+        self._last_by_type: Dict[str, MemoryRecord] = {}
+        self._trajectory = ""
+        # 每条记录在轨迹文本中所占的长度（不计分隔符），用于淘汰时截掉开头
+        self._part_lengths: deque = deque()
+
+    @property
+    def records(self) -> List[MemoryRecord]:
+        return list(self._records)
 
     def add_record(self, record_type: str, content: str):
         """
@@ -32,82 +86,317 @@ class Memory:
         - record_type (str): 记录的类型 ('execution' 或 'reflection')。
         - content (str): 记录的具体内容 (例如，生成的代码或反思的反馈)。
         """
-        record = {"type": record_type, "content": content}
-        self.records.append(record)
-        print(f"📝 记忆已更新，新增一条 '{record_type}' 记录。")
+        if len(self._records) >= self.max_records:
+            self._evict_oldest()
+
+        record = MemoryRecord(record_type, content)
+        self._records.append(record)
+        self._last_by_type[record_type] = record
+
+        header = TRAJECTORY_HEADERS.get(record_type)
+        part = f"{header}\n{content}" if header else ""
+        if part:
+            self._trajectory = f"{self._trajectory}\n\n{part}" if self._trajectory else part
+        self._part_lengths.append(len(part))
+        emit("memory.add", f"📝 记忆已更新，新增一条 '{record_type}' 记录。", record_type=record_type, records=len(self._records))
+
+    def _evict_oldest(self):
+        record = self._records.popleft()
+        part_length = self._part_lengths.popleft()
+        if part_length:
+            # 如果后面还有其他部分，一并去掉紧随其后的分隔符
+            cut = part_length + 2 if len(self._trajectory) > part_length else part_length
+            self._trajectory = self._trajectory[cut:]
+        if self._last_by_type.get(record.type) is record:
+            del self._last_by_type[record.type]
 
     def get_trajectory(self) -> str:
         """
         将所有记忆记录格式化为一个连贯的字符串文本，用于构建提示词。
         """
-        trajectory_parts = []
-        for record in self.records:
-            if record['type'] == 'execution':
-                trajectory_parts.append(f"--- 上一轮尝试 (代码) ---\n{record['content']}")
-            elif record['type'] == 'reflection':
-                trajectory_parts.append(f"--- 评审员反馈 ---\n{record['content']}")
-        
-        return "\n\n".join(trajectory_parts)
+        return self._trajectory
 
     def get_last_execution(self) -> Optional[str]:
         """
         获取最近一次的执行结果 (例如，最新生成的代码)。
         如果不存在，则返回 None。
         """
-        for record in reversed(self.records):
-            if record['type'] == 'execution':
-                return record['content']
-        return None
+        record = self._last_by_type.get("execution")
+        return record.content if record else None
+
+
+class _CodeNormalizer(ast.NodeTransformer):
+    """去掉文档字符串，并把局部变量名与参数名按出现顺序统一改写为 v0, v1, ..."""
+
+    def __init__(self):
+        self.names: Dict[str, str] = {}
+
+    def _rename(self, name: str) -> str:
+        if hasattr(builtins, name):
+            return name
+        return self.names.setdefault(name, f"v{len(self.names)}")
+
+    def _strip_docstring(self, node):
+        body = getattr(node, "body", None)
+        if body and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant) and isinstance(body[0].value.value, str):
+            node.body = body[1:] or [ast.Pass()]
+        return node
+
+    def visit_Module(self, node):
+        return self.generic_visit(self._strip_docstring(node))
+
+    def visit_FunctionDef(self, node):
+        return self.generic_visit(self._strip_docstring(node))
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_ClassDef(self, node):
+        return self.generic_visit(self._strip_docstring(node))
+
+    def visit_Name(self, node):
+        node.id = self._rename(node.id)
+        return node
+
+    def visit_arg(self, node):
+        node.arg = self._rename(node.arg)
+        node.annotation = None
+        return node
+
+
+def normalize_code(code: str) -> str:
+    """
+    将代码规范化为与格式、注释、文档字符串及局部变量命名无关的文本。
+    代码无法解析时，退化为去掉多余空白后的原文。
+    """
+    code = extract_code(code)
+    try:
+        tree = _CodeNormalizer().visit(ast.parse(code))
+    except SyntaxError:
+        return " ".join(code.split())
+    return ast.unparse(ast.fix_missing_locations(tree))
+
+
+def code_fingerprint(code: str) -> str:
+    """规范化代码的哈希值，用于判断两次尝试是否实质相同。"""
+    return hashlib.sha1(normalize_code(code).encode("utf-8")).hexdigest()
+
+
+def is_valid_code(text: str) -> bool:
+    """生成的代码能否被解析，且至少定义了一个函数。"""
+    return find_function_name(extract_code(text)) is not None
+
+
+def ast_similarity(code_a: str, code_b: str) -> float:
+    """按行比较两份规范化代码，返回 0~1 之间的相似度。"""
+    lines_a = normalize_code(code_a).splitlines()
+    lines_b = normalize_code(code_b).splitlines()
+    return difflib.SequenceMatcher(None, lines_a, lines_b, autojunk=False).ratio()
+
+
+class ReflectionAgent(BatchRunMixin):
+    def __init__(
+        self,
+        llm_client: HelloAgentsLLM,
+        max_iterations: int = 3,
+        benchmark: Optional[CodeBenchmark] = None,
+        min_improvement: float = 0.05,
+        num_candidates: int = 1,
+        scorer: Optional[Callable[[str], Any]] = None,
+        candidate_temperature: float = 0.7,
+        convergence_threshold: float = 1.0,
+    ):
+        """
+        传入 benchmark 后，每份候选代码都会在沙箱中实测，计时表与拟合复杂度会提供给评审员；
+        当优化后的代码在实测中没有快于 min_improvement 的比例时，迭代提前结束，并返回实测最快的代码。
 
+        num_candidates > 1 时，初始尝试和每轮优化都会以 candidate_temperature 并发生成多份候选，
+        由 scorer（代码 -> 分数，越大越好，例如 code_benchmark.runtime_scorer / tests_scorer）
+        排序后只保留最好的一份；未提供 scorer 时按 benchmark 的实测运行时间排序。
 
+        优化后的代码与之前任意一版的规范化指纹相同时，视为空操作，迭代提前收敛。
+        AST相似度检查需要显式开启：convergence_threshold 小于默认的 1.0 时（例如 0.95），
+        与上一版的AST相似度不低于该值的优化同样视为空操作。
 
-class ReflectionAgent:
-    def __init__(self, llm_client: HelloAgentsLLM, max_iterations: int = 3):
+        llm_client 为 ModelRouter 时，评审使用 critic 角色的模型，初始生成与优化使用 refiner 角色的模型；
+        为级联客户端时，生成的代码无法解析或没有函数定义、评审的反馈为空时升级到大模型。
+        """
         self.llm_client = llm_client
-        self.memory = Memory()
+        self.critic_llm = with_validator(for_role(llm_client, CRITIC, "reflection"), non_empty)
+        self.refiner_llm = with_validator(for_role(llm_client, REFINER, "reflection"), is_valid_code)
         self.max_iterations = max_iterations
+        self.benchmark = benchmark
+        self.min_improvement = min_improvement
+        self.num_candidates = num_candidates
+        self.scorer = scorer
+        self.candidate_temperature = candidate_temperature
+        self.convergence_threshold = convergence_threshold
 
-    def run(self, task: str) -> str:
-        print(f"\n--- 开始处理任务 ---\n任务: {task}")
-
-        # --- 1. 初始执行 ---
-        print("\n--- 正在进行初始尝试 ---")
-        initial_prompt = INITIAL_PROMPT_TEMPLATE.format(task=task)
-        initial_code = self._get_llm_response(initial_prompt)
-        self.memory.add_record("execution", initial_code)
-
-        # --- 2. 迭代循环:反思与优化 ---
-        for i in range(self.max_iterations):
-            print(f"\n--- 第 {i+1}/{self.max_iterations} 轮迭代 ---")
-
-            # a. 反思
-            print("\n-> 正在进行反思...")
-            last_code = self.memory.get_last_execution()
-            reflect_prompt = REFLECT_PROMPT_TEMPLATE.format(task=task, code=last_code)
-            feedback = self._get_llm_response(reflect_prompt)
-            self.memory.add_record("reflection", feedback)
-
-            # b. 检查是否需要停止
-            if "无需改进" in feedback:
-                print("\n✅ 反思认为代码已无需改进，任务完成。")
-                break
-
-            # c. 优化
-            print("\n-> 正在进行优化...")
-            refine_prompt = REFINE_PROMPT_TEMPLATE.format(
-                task=task,
-                last_code_attempt=last_code,
-                feedback=feedback
-            )
-            refined_code = self._get_llm_response(refine_prompt)
-            self.memory.add_record("execution", refined_code)
-        
-        final_code = self.memory.get_last_execution()
-        print(f"\n--- 任务完成 ---\n最终生成的代码:\n```python\n{final_code}\n```")
+    def run(self, task: str, context: Optional[RunContext] = None, profile: Optional[bool] = None) -> str:
+        if profile is not None:
+            context = context or RunContext(task, profile=profile)
+            context.profile = profile
+        final_code = None
+        for event in self.run_events(task, context):
+            if event.type == FINAL_ANSWER:
+                final_code = event.content
         return final_code
 
-    def _get_llm_response(self, prompt: str) -> str:
+    def arun_events(self, task: str, context: Optional[RunContext] = None):
+        """run_events 的异步迭代器版本。"""
+        return aiter_events(lambda: self.run_events(task, context))
+
+    def run_events(self, task: str, context: Optional[RunContext] = None):
+        """
+        以事件流的方式运行反思智能体：生成的代码为 action 事件，评审员的反馈为 thought 事件，
+        实测结果为 observation 事件，最后一个事件总是 final_answer（最终代码）。
+        每次运行的 Memory 保存在 context.state["memory"] 中，同一个智能体实例可以被并发调用。
+        """
+        context = context or RunContext(task)
+        memory = context.state.setdefault("memory", Memory())
+        with span("reflection.run", trace_id=context.run_id, task=task), track_run("reflection"), profile_run("reflection", context.run_id, context.profile):
+            emit("reflection.run_start", f"\n--- 开始处理任务 ---\n任务: {task}", run_id=context.run_id, task=task)
+
+            # --- 1. 初始执行 ---
+            emit("reflection.initial", "\n--- 正在进行初始尝试 ---", run_id=context.run_id)
+            initial_prompt = INITIAL_PROMPT_TEMPLATE.format(task=task)
+            initial_code, best_report = yield from self._generate_best_events(initial_prompt, step=0, context=context)
+            memory.add_record("execution", initial_code)
+            best_code = initial_code
+            last_report = best_report
+            seen_fingerprints = {code_fingerprint(initial_code)}
+
+            # --- 2. 迭代循环:反思与优化 ---
+            for i in range(self.max_iterations):
+                if context.cancelled:
+                    emit("reflection.cancelled", "\n运行已被取消，停止迭代。", run_id=context.run_id, step=context.step)
+                    break
+                with span("reflection.iteration", step=i + 1):
+                    context.step = i + 1
+                    emit("reflection.iteration", f"\n--- 第 {i+1}/{self.max_iterations} 轮迭代 ---", run_id=context.run_id, step=i + 1)
+
+                    # a. 反思
+                    emit("reflection.reflect", "\n-> 正在进行反思...", run_id=context.run_id, step=i + 1)
+                    last_code = memory.get_last_execution()
+                    reflect_prompt = REFLECT_PROMPT_TEMPLATE.format(
+                        task=task,
+                        code=last_code,
+                        measurements=last_report.to_prompt() if last_report else "未提供实测数据，请仅根据代码进行分析。"
+                    )
+                    messages = [{"role": "user", "content": reflect_prompt}]
+                    feedback = (yield from stream_llm(self.critic_llm, messages, step=i + 1, cancel_event=context.cancel_event)) or ""
+                    memory.add_record("reflection", feedback)
+                    yield AgentEvent(THOUGHT, feedback, i + 1)
+
+                    # b. 检查是否需要停止
+                    if "无需改进" in feedback:
+                        emit("reflection.no_improvement", "\n✅ 反思认为代码已无需改进，任务完成。", run_id=context.run_id, step=i + 1)
+                        break
+
+                    # c. 优化
+                    emit("reflection.refine", "\n-> 正在进行优化...", run_id=context.run_id, step=i + 1)
+                    refine_prompt = REFINE_PROMPT_TEMPLATE.format(
+                        task=task,
+                        last_code_attempt=last_code,
+                        feedback=feedback
+                    )
+                    refined_code, last_report = yield from self._generate_best_events(refine_prompt, step=i + 1, context=context)
+
+                    # d. 优化是空操作（与之前的版本实质相同）时收敛
+                    fingerprint = code_fingerprint(refined_code)
+                    if fingerprint in seen_fingerprints or (
+                        self.convergence_threshold < 1.0
+                        and ast_similarity(last_code, refined_code) >= self.convergence_threshold
+                    ):
+                        emit("reflection.converged", "\n✅ 优化后的代码与之前的版本没有实质差异，迭代收敛。", run_id=context.run_id, step=i + 1)
+                        break
+                    seen_fingerprints.add(fingerprint)
+                    memory.add_record("execution", refined_code)
+
+                    # e. 比较优化后代码的实测结果，运行时间不再改善时停止
+                    if self.benchmark:
+                        if not last_report.is_faster_than(best_report, self.min_improvement):
+                            emit("reflection.not_faster", "\n⏹️ 优化后的代码在实测中没有变得更快，停止迭代。", run_id=context.run_id, step=i + 1)
+                            break
+                        best_code, best_report = refined_code, last_report
+                    else:
+                        best_code = refined_code
+
+            final_code = best_code
+            emit("reflection.final_answer", f"\n--- 任务完成 ---\n最终生成的代码:\n```python\n{final_code}\n```", run_id=context.run_id, code=final_code)
+            yield AgentEvent(FINAL_ANSWER, final_code)
+
+    def _generate_best_events(self, prompt: str, step: int, context: Optional[RunContext] = None):
+        """
+        生成代码并产出 action（代码）与 observation（实测结果）事件，返回值为 (代码, 实测报告)。
+        num_candidates > 1 时并发生成多份候选并只保留最好的一份，此时不产出 token 事件。
+        """
+        if self.num_candidates <= 1:
+            messages = [{"role": "user", "content": prompt}]
+            cancel_event = context.cancel_event if context else None
+            code = (yield from stream_llm(self.refiner_llm, messages, step=step, cancel_event=cancel_event)) or ""
+            report = self._measure(code)
+        else:
+            code, report = self._generate_best(prompt)
+
+        yield AgentEvent(ACTION, code, step)
+        if report:
+            yield AgentEvent(OBSERVATION, report.to_prompt(), step, {"complexity": report.complexity, "rows": report.rows})
+        return code, report
+
+    def _generate_best(self, prompt: str) -> Tuple[str, Optional[BenchmarkReport]]:
+        """
+        并发生成 num_candidates 份候选代码，返回最好的一份及其实测报告 (代码, 实测报告)。
+        只有一份候选时由 _generate_best_events 直接流式生成，不会调用本方法。
+        """
+        emit("reflection.candidates", f"\n-> 正在并发生成 {self.num_candidates} 份候选代码...", num_candidates=self.num_candidates)
+        with span("reflection.candidates", num_candidates=self.num_candidates), ThreadPoolExecutor(max_workers=self.num_candidates) as pool:
+            # 复制当前上下文，使候选线程中的LLM调用也计入本次运行的用量统计
+            futures = [
+                pool.submit(contextvars.copy_context().run, self._get_llm_response, prompt, self.candidate_temperature)
+                for _ in range(self.num_candidates)
+            ]
+            candidates = [future.result() for future in futures]
+        # 去掉空响应与完全相同的候选
+        candidates = list(dict.fromkeys(code for code in candidates if code)) or [""]
+
+        if self.scorer:
+            with ThreadPoolExecutor(max_workers=len(candidates)) as pool:
+                scores = list(pool.map(self.scorer, candidates))
+            best_index = max(range(len(candidates)), key=lambda i: scores[i])
+            emit("reflection.candidate_selected", f"🏆 候选得分: {scores}，选择第 {best_index + 1} 份。", scores=scores, selected=best_index)
+            # 评分器已用同一个 benchmark 实测过候选代码时（runtime_scorer），复用其报告
+            scored_reports = getattr(self.scorer, "reports", None) if getattr(self.scorer, "benchmark", None) is self.benchmark else None
+            report = None
+            if scored_reports is not None:
+                report = scored_reports.get(candidates[best_index])
+                for code in candidates:
+                    scored_reports.pop(code, None)
+            return candidates[best_index], report or self._measure(candidates[best_index])
+
+        if self.benchmark:
+            emit("reflection.benchmark_candidates", "\n-> 正在实测候选代码性能...", candidates=len(candidates))
+            reports = self.benchmark.run_many(candidates)
+            best_index = max(range(len(candidates)), key=lambda i: reports[i].sort_key())
+            emit("reflection.candidate_selected", f"🏆 选择第 {best_index + 1} 份候选，实测结果:\n{reports[best_index].to_prompt()}", selected=best_index)
+            return candidates[best_index], reports[best_index]
+
+        return candidates[0], None
+
+    def _measure(self, code: str):
+        """在沙箱中实测代码，未配置 benchmark 时返回 None。"""
+        if not self.benchmark:
+            return None
+        emit("reflection.benchmark", "\n-> 正在实测代码性能...")
+        with span("reflection.benchmark"):
+            report = self.benchmark.run(code)
+        emit("reflection.benchmark_done", f"📊 实测结果:\n{report.to_prompt()}", complexity=report.complexity, error=report.error)
+        return report
+
+    def _get_llm_response(self, prompt: str, temperature: float = 0) -> str:
         """一个辅助方法，用于调用LLM并获取完整的流式响应。"""
         messages = [{"role": "user", "content": prompt}]
-        response_text = self.llm_client.think(messages=messages) or ""
-        return response_text
+        started = time.perf_counter()
+        response_text = self.refiner_llm.think(messages=messages, temperature=temperature)
+        prompt_tokens, completion_tokens = record_usage(messages, response_text)
+        observe_llm_call(getattr(self.refiner_llm, "model", None), time.perf_counter() - started, None, prompt_tokens, completion_tokens, "ok" if response_text is not None else "error")
+        return response_text or ""
@@ -0,0 +1,202 @@
+'''
+Author: wenjinwang 314984354@qq.com
+Date: 2026-10-19 09:29:22
+LastEditors: wenjinwang 314984354@qq.com
+LastEditTime: 2026-10-19 09:29:22
+FilePath: /hello-agents/agents/rule_engine.py
+Description: 规则引擎：所有规则编译为一个正则，命中的规则直接按模板回答或调用工具，不经过LLM
+
+'''
+import contextvars
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from telemetry.event_sink import emit
+from telemetry.tracing import span
+
+_NAMED_GROUP_PATTERN = re.compile(r"\(\?P<(\w+)>")
+_NAMED_BACKREF_PATTERN = re.compile(r"\(\?P=(\w+)\)")
+_NUMBERED_BACKREF_PATTERN = re.compile(r"(?<!\\)(?:\\\\)*\\[1-9]")
+
+
+@dataclass
+class Rule:
+    """
+    一条规则。
+    - pattern: 正则表达式，可以使用编号分组与命名分组，但不能使用编号反向引用（\\1）。
+    - responses: 回答模板，按 str.format 填入分组：{0}、{1} 为编号分组，{city} 为命名分组；
+      调用工具的规则还可以使用 {observation}（工具的结果）。
+    - tool / tool_args: 命中时调用的工具与参数模板，例如 tool="get_weather", tool_args={"city": "{city}"}。
+    - accept: 检查工具的结果是否可以作为回答，返回 False 时视为没有命中（例如工具报错时交给LLM处理）。
+    - flags: 只作用于本条规则的正则标志（re.IGNORECASE / re.DOTALL 等）。
+    """
+    pattern: str
+    responses: Sequence[str] = ()
+    tool: Optional[str] = None
+    tool_args: Dict[str, str] = field(default_factory=dict)
+    name: Optional[str] = None
+    accept: Optional[Callable[[Any], bool]] = None
+    flags: int = 0
+
+    def __post_init__(self):
+        if not self.responses:
+            self.responses = ("{observation}",) if self.tool else ()
+        if not self.responses:
+            raise ValueError(f"规则 {self.pattern!r} 既没有回答模板，也没有要调用的工具。")
+        if _NUMBERED_BACKREF_PATTERN.search(self.pattern):
+            raise ValueError(f"规则 {self.pattern!r} 使用了编号反向引用，请改用命名分组与 (?P=name)。")
+
+
+@dataclass
+class RuleMatch:
+    """一次命中：规则、编号分组（经 transform 处理）与命名分组。"""
+    rule: Rule
+    groups: Tuple[str, ...]
+    named: Dict[str, str]
+
+
+@dataclass
+class RuleResponse:
+    """规则给出的回答；调用了工具时还包括工具名、参数与工具的原始结果。"""
+    text: str
+    rule: str
+    tool: Optional[str] = None
+    tool_args: Dict[str, str] = field(default_factory=dict)
+    observation: Any = None
+
+
+class RuleEngine:
+    """
+    把所有规则编译为一个正则：每条规则是一个分支，分支末尾放一个空的命名分组 _r{序号} 作为标记。
+    标记总是分支中最后闭合的分组，命中的规则由 match.lastindex 直接定位，再按偏移取出该规则自己的分组。
+    标记放在末尾而不是包裹整个分支，re 才能把各分支相同的字面前缀合并，不必在每个位置逐条尝试。
+
+    结果与按规则顺序逐条 re.search 相同（第一条能在输入中任意位置匹配的规则胜出）：
+    合并后的正则找到的是最靠左的匹配；若它不是第一条规则，再用只含更靠前规则的正则从下一个位置继续查找，
+    每次查找都会让候选规则的序号变小，通常一到两次查找就能确定结果。
+
+    transform 用于处理编号分组（例如 ELIZA 的人称代词转换），chooser 从多个回答模板中选择一个，
+    默认总是使用第一个，使回答可以复现。调用工具的规则需要提供 tool_executor。
+    """
+
+    def __init__(
+        self,
+        rules: Sequence[Rule],
+        flags: int = re.IGNORECASE,
+        tool_executor=None,
+        transform: Optional[Callable[[str], str]] = None,
+        chooser: Optional[Callable[[Sequence[str]], str]] = None,
+    ):
+        self.rules = list(rules)
+        self.tool_executor = tool_executor
+        self.transform = transform
+        self.chooser = chooser or (lambda responses: responses[0])
+        # 标记分组的编号 -> (规则序号, 规则自身的分组数量, {原分组名: 改写后的分组名})
+        self._dispatch: Dict[int, Tuple[int, int, Dict[str, str]]] = {}
+        self._flags = flags
+        self._branches: List[str] = []
+        # 只含前 k 条规则的正则，按需编译；各规则的分组编号与完整的正则一致
+        self._regexes: Dict[int, "re.Pattern"] = {}
+        self._lock = threading.Lock()
+        group_index = 0
+        for i, rule in enumerate(self.rules):
+            if rule.tool and tool_executor is None:
+                raise ValueError(f"规则 {rule.pattern!r} 需要调用工具 '{rule.tool}'，但没有提供 tool_executor。")
+            compiled = re.compile(rule.pattern, flags | rule.flags)
+            names = {name: f"_r{i}_{name}" for name in compiled.groupindex}
+            pattern = _NAMED_GROUP_PATTERN.sub(lambda m: f"(?P<{names[m.group(1)]}>", rule.pattern)
+            pattern = _NAMED_BACKREF_PATTERN.sub(lambda m: f"(?P={names[m.group(1)]})", pattern)
+            if rule.flags:
+                pattern = f"(?{_inline_flags(rule.flags)}:{pattern})"
+            self._branches.append(f"(?:{pattern}(?P<_r{i}>))")
+            group_index += compiled.groups + 1
+            self._dispatch[group_index] = (i, compiled.groups, names)
+        if self._branches:
+            self._regex_for(len(self._branches))
+
+    def _regex_for(self, count: int) -> "re.Pattern":
+        regex = self._regexes.get(count)
+        if regex is None:
+            with self._lock:
+                regex = self._regexes.get(count)
+                if regex is None:
+                    regex = self._regexes[count] = re.compile("|".join(self._branches[:count]), self._flags)
+        return regex
+
+    def match(self, text: str) -> Optional[RuleMatch]:
+        """返回第一条命中的规则，没有命中时返回 None。"""
+        if not self._branches:
+            return None
+        found = self._regex_for(len(self._branches)).search(text)
+        if found is None:
+            return None
+        index = self._dispatch[found.lastindex][0]
+        while index:
+            # 更靠前的规则不可能在同一位置匹配（否则分支顺序会让它胜出），只需从下一个位置查找
+            earlier = self._regex_for(index).search(text, found.start() + 1)
+            if earlier is None:
+                break
+            found = earlier
+            index = self._dispatch[found.lastindex][0]
+        index, group_count, names = self._dispatch[found.lastindex]
+        groups = found.groups()[found.lastindex - 1 - group_count:found.lastindex - 1]
+        groups = tuple(self.transform(group) if self.transform and group is not None else (group or "") for group in groups)
+        named = {name: found.group(renamed) or "" for name, renamed in names.items()}
+        return RuleMatch(self.rules[index], groups, named)
+
+    def respond(self, text: str) -> Optional[RuleResponse]:
+        """按命中的规则生成回答（需要时调用工具）；没有命中时返回 None，调用方应交给LLM处理。"""
+        found = self.match(text)
+        if found is None:
+            return None
+        return self._respond(found)
+
+    def _respond(self, found: RuleMatch) -> Optional[RuleResponse]:
+        rule = found.rule
+        name = rule.name or rule.pattern
+        fields = dict(found.named)
+        tool_args: Dict[str, str] = {}
+        observation = None
+        with span("rules.respond", rule=name, tool=rule.tool):
+            if rule.tool:
+                tool_args = {key: value.format(*found.groups, **found.named) for key, value in rule.tool_args.items()}
+                observation = self.tool_executor.execute(rule.tool, **tool_args)
+                if rule.accept is not None and not rule.accept(observation):
+                    emit("rules.rejected", f"规则 {name} 的工具结果不可用，交给LLM处理。", rule=name, tool=rule.tool)
+                    return None
+                fields["observation"] = observation
+            text = self.chooser(rule.responses).format(*found.groups, **fields)
+        return RuleResponse(text, name, rule.tool, tool_args, observation)
+
+    def respond_many(self, texts: Sequence[str], max_workers: int = 8) -> List[Optional[RuleResponse]]:
+        """
+        批量回答，结果与 texts 一一对应。相同的输入只处理一次；
+        只按模板回答的规则直接在当前线程完成，需要调用工具的规则并发执行。
+        """
+        unique = list(dict.fromkeys(texts))
+        matches = {text: self.match(text) for text in unique}
+        responses: Dict[str, Optional[RuleResponse]] = {}
+        tool_texts = []
+        for text, found in matches.items():
+            if found is None:
+                responses[text] = None
+            elif found.rule.tool:
+                tool_texts.append(text)
+            else:
+                responses[text] = self._respond(found)
+        if tool_texts:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(tool_texts))) as pool:
+                # 复制当前上下文，使工具调用的追踪与用量统计归属于调用方
+                futures = [pool.submit(contextvars.copy_context().run, self._respond, matches[text]) for text in tool_texts]
+                for text, future in zip(tool_texts, futures):
+                    responses[text] = future.result()
+        return [responses[text] for text in texts]
+
+
+def _inline_flags(flags: int) -> str:
+    """把 re 标志转换为内联写法，例如 re.IGNORECASE | re.DOTALL -> "is"。"""
+    letters = {re.IGNORECASE: "i", re.MULTILINE: "m", re.DOTALL: "s", re.VERBOSE: "x", re.ASCII: "a"}
+    return "".join(letter for flag, letter in letters.items() if flags & flag)
@@ -0,0 +1,40 @@
+'''
+Author: wenjinwang 314984354@qq.com
+Date: 2026-10-19 08:58:48
+LastEditors: wenjinwang 314984354@qq.com
+LastEditTime: 2026-10-19 09:11:24
+FilePath: /hello-agents/agents/run_context.py
+Description: 单次智能体运行的上下文
+
+'''
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+
+class RunContext:
+    """
+    保存一次运行的全部可变状态（历史记录、当前步骤、取消标志等）。
+    智能体实例本身只保存配置与共享的客户端，因此同一个实例可以被多个线程/会话同时调用。
+    """
+
+    def __init__(self, question: str, run_id: Optional[str] = None, cancel_event: Optional[threading.Event] = None, profile: Optional[bool] = None):
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.question = question
+        self.history: List[str] = []
+        self.step = 0
+        self.cancel_event = cancel_event or threading.Event()
+        self.started_at = time.time()
+        # 是否剖析本次运行；None 表示按 HELLO_AGENTS_PROFILE_* 环境变量采样
+        self.profile = profile
+        # 各智能体专属的运行状态，例如反思智能体的 Memory
+        self.state: Dict[str, Any] = {}
+
+    def cancel(self):
+        """请求取消本次运行，智能体会在下一个步骤边界停止。"""
+        self.cancel_event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
@@ -0,0 +1,93 @@
+'''
+Author: wenjinwang 314984354@qq.com
+Date: 2026-10-19 09:13:20
+LastEditors: wenjinwang 314984354@qq.com
+LastEditTime: 2026-10-19 09:13:20
+FilePath: /hello-agents/benchmarks/end_to_end.py
+Description: 三种智能体在本地假LLM与假工具上的端到端基准：步数/秒、每次运行的框架开销与峰值内存
+
+'''
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Iterator, List
+
+from benchmarks import fixtures
+from models.fake_llm import FakeLLM
+
+
+class CountingLLM(FakeLLM):
+    """统计调用次数的 FakeLLM，每次调用记为智能体的一步。"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.calls = 0
+
+    def stream_think(self, messages: List[Dict[str, str]], temperature: float = 0) -> Iterator[str]:
+        self.calls += 1
+        return super().stream_think(messages, temperature=temperature)
+
+
+def _react(llm: CountingLLM) -> Callable[[int], Any]:
+    from agents.react_agent import ReActAgent
+    agent = ReActAgent(llm, fixtures.fake_tool_executor(), max_steps=8)
+    return lambda i: agent.run(f"问题{i}：北京今天适合去哪里玩？")
+
+
+def _plan_solve(llm: CountingLLM) -> Callable[[int], Any]:
+    from agents.plan_solve_agent import PlanAndSolveAgent
+    agent = PlanAndSolveAgent(llm)
+    return lambda i: agent.run(f"问题{i}：一个水果店三天共卖出多少个苹果？")
+
+
+def _reflection(llm: CountingLLM) -> Callable[[int], Any]:
+    from agents.reflection_agent import ReflectionAgent
+    agent = ReflectionAgent(llm, max_iterations=2)
+    return lambda i: agent.run(f"任务{i}：编写一个Python函数，找出1到n之间所有的素数。")
+
+
+# 名称 -> (构建智能体的工厂, FakeLLM 参数, 默认运行次数)
+END_TO_END_BENCHMARKS: Dict[str, tuple] = {
+    "e2e.react": (_react, {"tool_calls": 3}, 200),
+    "e2e.plan_solve": (_plan_solve, {"plan_steps": 3}, 200),
+    "e2e.reflection": (_reflection, {}, 200),
+}
+
+
+def run_end_to_end(name: str, runs: int = None, memory_runs: int = 20) -> Dict[str, Any]:
+    """
+    顺序执行 runs 次完整运行。LLM与工具都在本地即时返回，因此测得的耗时就是框架自身的开销。
+    峰值内存在单独的 memory_runs 次运行中用 tracemalloc 测量，避免其开销影响计时。
+    """
+    factory, llm_kwargs, default_runs = END_TO_END_BENCHMARKS[name]
+    runs = runs or default_runs
+    llm = CountingLLM(**llm_kwargs)
+    run_once = factory(llm)
+    run_once(-1)  # 预热：首次运行会触发模块内的懒加载与正则编译
+
+    llm.calls = 0
+    started = time.perf_counter()
+    for i in range(runs):
+        run_once(i)
+    elapsed = time.perf_counter() - started
+    steps = llm.calls
+
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline_memory = tracemalloc.get_traced_memory()[0]
+    for i in range(memory_runs):
+        run_once(i)
+    peak = tracemalloc.get_traced_memory()[1] - baseline_memory
+    if not was_tracing:
+        tracemalloc.stop()
+
+    return {
+        "runs": runs,
+        "steps": steps,
+        "steps_per_run": steps / runs,
+        "runs_per_sec": runs / elapsed,
+        "steps_per_sec": steps / elapsed,
+        "overhead_ms_per_run": elapsed / runs * 1e3,
+        "peak_memory_kib": peak / 1024,
+    }
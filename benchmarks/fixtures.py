@@ -0,0 +1,82 @@
+'''
+Author: wenjinwang 314984354@qq.com
+Date: 2026-10-19 09:13:20
+LastEditors: wenjinwang 314984354@qq.com
+LastEditTime: 2026-10-19 09:18:34
+FilePath: /hello-agents/benchmarks/fixtures.py
+Description: 基准测试使用的固定输入：样例响应、历史记录与本地的假工具
+
+'''
+from typing import Any, Dict, List
+
+from tools.tool_exector import ToolExecutor
+
+
+REACT_RESPONSE = (
+    "Thought: 用户想知道北京今天的天气，然后根据天气推荐景点。我需要先调用天气工具。\n"
+    'Action: get_weather[city="北京"]'
+)
+REACT_ACTION = 'get_attraction[city="北京", weather="晴朗"]'
+PLAN_RESPONSE = "```python\n" + repr([f"第{i + 1}步：查询并整理与问题相关的第{i + 1}项信息" for i in range(10)]) + "\n```"
+SAMPLE_CODE = '''def find_primes(n):
+    """返回 2..n 之间的所有素数。"""
+    sieve = [True] * (n + 1)
+    sieve[0:2] = [False, False]
+    for i in range(2, int(n ** 0.5) + 1):
+        if sieve[i]:
+            sieve[i * i::i] = [False] * len(sieve[i * i::i])
+    return [i for i, is_prime in enumerate(sieve) if is_prime]
+'''
+ATTRACTION_OBSERVATION = "根据搜索，为您找到以下信息：\n" + "\n".join(
+    f"- 景点{i}: 景点{i}位于北京第{i}区，是著名的历史文化景观。晴天适合游览，建议提前预约，门票{10 + i}元。雨天部分区域关闭。"
+    for i in range(30)
+)
+SAMPLE_FEEDBACK = "当前实现的时间复杂度为 O(n log log n)，已经是筛法的最优复杂度，但列表切片赋值会产生额外的内存分配。" * 3
+
+
+def react_history(steps: int = 10) -> List[str]:
+    """模拟 steps 步之后的 ReAct 历史记录。"""
+    history = []
+    for i in range(steps):
+        history.append(f'Action: google_search[query="第{i}个问题的相关资料"]')
+        history.append(f"Observation: 第{i}次搜索结果：" + "这是一段较长的网页摘要文本。" * 20)
+    return history
+
+
+def thinking_process(steps: int = 200) -> List[Dict[str, Any]]:
+    """模拟 steps 步的思考过程，用于格式化展示的基准。"""
+    return [
+        {
+            "iteration": i + 1,
+            "thought": f"第{i + 1}步的思考：" + "分析当前已知信息并决定下一步行动。" * 5,
+            "action": f'google_search[query="问题{i}"]',
+            "observation": "搜索结果摘要。" * 30,
+        }
+        for i in range(steps)
+    ]
+
+
+def _fake_weather(city: str) -> str:
+    return f"{city}当前天气：晴朗，气温 25 摄氏度"
+
+
+def _fake_attraction(city: str, weather: str) -> str:
+    return f"{city}在{weather}天气下推荐游览：公园、博物馆与老街。"
+
+
+def _fake_search(query: str) -> str:
+    return f"关于“{query}”的搜索结果：" + "一段固定的网页摘要。" * 10
+
+
+def fake_tool_executor(cache_ttl=None) -> ToolExecutor:
+    """注册与默认工具同名、但不访问网络的假工具。默认不缓存，以便每次都走完整的工具调用路径。"""
+    tool_executor = ToolExecutor()
+    tool_executor.registerTool("get_weather", "查询指定城市的实时天气。参数说明：\ncity: str，城市名称。", _fake_weather, cache_ttl=cache_ttl)
+    tool_executor.registerTool(
+        "get_attraction",
+        "根据城市和天气搜索推荐的旅游景点。参数说明：\ncity: str，城市名称。weather: str，天气状况。",
+        _fake_attraction,
+        cache_ttl=cache_ttl,
+    )
+    tool_executor.registerTool("google_search", "一个网页搜索引擎。参数说明：\nquery: str，搜索关键词。", _fake_search, cache_ttl=cache_ttl)
+    return tool_executor
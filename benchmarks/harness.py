@@ -0,0 +1,144 @@
+'''
+Author: wenjinwang 314984354@qq.com
+Date: 2026-10-19 09:13:20
+LastEditors: wenjinwang 314984354@qq.com
+LastEditTime: 2026-10-19 09:14:49
+FilePath: /hello-agents/benchmarks/harness.py
+Description: 基准测试的计时、结果保存与基线对比
+
+'''
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+
+# 各指标的优劣方向: True 表示越大越好，False 表示越小越好
+HIGHER_IS_BETTER = {
+    "ops_per_sec": True,
+    "steps_per_sec": True,
+    "runs_per_sec": True,
+    "median_us": False,
+    "overhead_ms_per_run": False,
+    "peak_memory_kib": False,
+    "import_ms": False,
+}
+# 参与回归判定的指标；其余指标只记录不比较
+GATED_METRICS = ("median_us", "steps_per_sec", "overhead_ms_per_run", "peak_memory_kib", "import_ms")
+
+
+def time_callable(func: Callable[[], Any], repeat: int = 5, min_time: float = 0.2) -> Dict[str, float]:
+    """
+    对一个无参函数计时。先自动确定每轮的调用次数，使一轮的耗时不少于 min_time / repeat，
+    然后重复 repeat 轮，返回每次调用耗时（微秒）的中位数与最小值。
+    """
+    number = 1
+    target = min_time / repeat
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= target or number >= 1 << 20:
+            break
+        number *= 10 if elapsed < target / 10 else 2
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - started) / number)
+    median = statistics.median(timings)
+    return {
+        "median_us": median * 1e6,
+        "min_us": min(timings) * 1e6,
+        "ops_per_sec": 1 / median if median else float("inf"),
+        "number": number,
+        "repeat": repeat,
+    }
+
+
+def environment_info() -> Dict[str, Any]:
+    """记录运行环境，便于判断两次结果是否可比。"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "commit": commit,
+        "timestamp": time.time(),
+    }
+
+
+def save_results(path: str, results: Dict[str, Dict[str, Any]]):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"environment": environment_info(), "results": results}, f, ensure_ascii=False, indent=2)
+
+
+def load_results(path: str) -> Dict[str, Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["results"]
+
+
+def compare(
+    current: Dict[str, Dict[str, Any]],
+    baseline: Dict[str, Dict[str, Any]],
+    threshold: float = 0.15,
+) -> List[Dict[str, Any]]:
+    """
+    逐项对比当前结果与基线。变化按“变差为正”计算，超过 threshold（例如 0.15 即 15%）记为回归。
+    返回每个可比指标的对比记录，regression 字段标记是否回归。
+    """
+    rows = []
+    for name, metrics in current.items():
+        base_metrics = baseline.get(name)
+        if not base_metrics:
+            continue
+        for metric in GATED_METRICS:
+            if metric not in metrics or not base_metrics.get(metric):
+                continue
+            value, base = metrics[metric], base_metrics[metric]
+            change = (value - base) / base
+            worse = -change if HIGHER_IS_BETTER[metric] else change
+            rows.append({
+                "benchmark": name,
+                "metric": metric,
+                "baseline": base,
+                "current": value,
+                "change": change,
+                "regression": worse > threshold,
+            })
+    return rows
+
+
+def format_comparison(rows: List[Dict[str, Any]], threshold: float) -> str:
+    lines = [f"{'基准':<40} {'指标':<22} {'基线':>12} {'当前':>12} {'变化':>9}"]
+    for row in rows:
+        flag = "  ❌ 回归" if row["regression"] else ""
+        lines.append(
+            f"{row['benchmark']:<40} {row['metric']:<22} {row['baseline']:>12.2f} {row['current']:>12.2f} {row['change']:>+8.1%}{flag}"
+        )
+    regressions = sum(row["regression"] for row in rows)
+    lines.append(f"\n共比较 {len(rows)} 项指标，{regressions} 项超过 {threshold:.0%} 的回归阈值。")
+    return "\n".join(lines)
+
+
+def format_results(results: Dict[str, Dict[str, Any]], keys: Optional[List[str]] = None) -> str:
+    lines = []
+    for name, metrics in results.items():
+        shown = {key: metrics[key] for key in (keys or metrics) if key in metrics}
+        values = "  ".join(f"{key}={value:.2f}" if isinstance(value, float) else f"{key}={value}" for key, value in shown.items())
+        lines.append(f"{name:<40} {values}")
+    return "\n".join(lines)
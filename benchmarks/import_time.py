@@ -0,0 +1,42 @@
+'''
+Author: wenjinwang 314984354@qq.com
+Date: 2026-10-19 09:14:49
+LastEditors: wenjinwang 314984354@qq.com
+LastEditTime: 2026-10-19 09:14:49
+FilePath: /hello-agents/benchmarks/import_time.py
+Description: 导入耗时基准：在全新的解释器中导入各个入口模块，扣除解释器自身的启动时间
+
+'''
+import os
+import subprocess
+import sys
+import time
+from typing import Any, Dict
+
+# 名称 -> 被导入的模块，覆盖工作进程、命令行与HTTP服务的启动路径
+IMPORT_BENCHMARKS: Dict[str, str] = {
+    "import.tools": "tools.tool_exector",
+    "import.hello_agents_llm": "models.hello_agents_llm",
+    "import.react_agent": "agents.react_agent",
+    "import.agent_factory": "server.agent_factory",
+    "import.worker_pool": "server.worker_pool",
+}
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _interpreter_seconds(code: str) -> float:
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], cwd=_PROJECT_ROOT, check=True)
+    return time.perf_counter() - started
+
+
+def measure_import(module: str, repeat: int = 5) -> Dict[str, Any]:
+    """取 repeat 次中最快的一次，减去空解释器最快的一次启动时间。"""
+    startup = min(_interpreter_seconds("pass") for _ in range(repeat))
+    total = min(_interpreter_seconds(f"import {module}") for _ in range(repeat))
+    return {
+        "module": module,
+        "import_ms": max(total - startup, 0.0) * 1e3,
+        "startup_ms": startup * 1e3,
+    }
@@ -0,0 +1,167 @@
+'''
+Author: wenjinwang 314984354@qq.com
+Date: 2026-10-19 09:13:20
+LastEditors: wenjinwang 314984354@qq.com
+LastEditTime: 2026-10-19 09:29:22
+FilePath: /hello-agents/benchmarks/micro.py
+Description: 热点路径的微基准：输出解析、提示词渲染、计划解析、观察结果压缩、反思记忆与思考过程格式化
+
+'''
+from typing import Any, Callable, Dict
+
+from benchmarks import fixtures
+
+
+def _react_parse_output() -> Callable[[], Any]:
+    from agents.react_agent import ReActAgent
+    agent = ReActAgent(None, fixtures.fake_tool_executor())
+    return lambda: agent._parse_output(fixtures.REACT_RESPONSE)
+
+
+def _react_parse_action() -> Callable[[], Any]:
+    from agents.react_agent import ReActAgent
+    agent = ReActAgent(None, fixtures.fake_tool_executor())
+    return lambda: agent._parse_action(fixtures.REACT_ACTION)
+
+
+def _react_render_prompt() -> Callable[[], Any]:
+    from prompts.react_prompt import REACT_PROMPT_TEMPLATE
+    tool_executor = fixtures.fake_tool_executor()
+    history = fixtures.react_history(10)
+
+    def render():
+        # 与 ReActAgent.run_events 中每一步的做法一致
+        return REACT_PROMPT_TEMPLATE.format(
+            tools=tool_executor.getAvailableTools(),
+            question="北京今天适合去哪里玩？",
+            history="\n".join(history),
+        )
+    return render
+
+
+def _react_render_prompt_budgeted() -> Callable[[], Any]:
+    from agents.context_budget import ContextBudget
+    from prompts.react_prompt import REACT_PROMPT_TEMPLATE
+    tool_executor = fixtures.fake_tool_executor()
+    budget = ContextBudget(max_tokens=2000)
+    history = fixtures.react_history(30)
+    cache = {}
+
+    def render():
+        # 历史远超预算时的渲染，摘要与 ReActAgent 一样在各步之间缓存
+        return budget.render(
+            REACT_PROMPT_TEMPLATE, history, cache=cache,
+            tools=tool_executor.getAvailableTools(), question="北京今天适合去哪里玩？",
+        )
+    return render
+
+
+def _plan_render_prompts() -> Callable[[], Any]:
+    from agents.plan_solve_agent import Executor
+    from prompts.plan_solve_prompt import EXECUTOR_PROMPT_TEMPLATE, PLANNER_PROMPT_TEMPLATE
+    plan = [f"步骤{i + 1}" for i in range(10)]
+    records = [{"step": step, "result": "步骤结果。" * 20} for step in plan[:5]]
+
+    def render():
+        PLANNER_PROMPT_TEMPLATE.format(question="一个水果店周一卖出15个苹果，周二卖出的是周一的两倍，三天共卖出多少？")
+        return EXECUTOR_PROMPT_TEMPLATE.format(
+            question="一个水果店周一卖出15个苹果，周二卖出的是周一的两倍，三天共卖出多少？",
+            plan=plan,
+            history=Executor._format_history(records),
+            current_step=plan[5],
+        )
+    return render
+
+
+def _reflection_render_prompts() -> Callable[[], Any]:
+    from prompts.reflection_prompt import INITIAL_PROMPT_TEMPLATE, REFINE_PROMPT_TEMPLATE, REFLECT_PROMPT_TEMPLATE
+    task = "编写一个Python函数，找出1到n之间所有的素数 (prime numbers)。"
+
+    def render():
+        INITIAL_PROMPT_TEMPLATE.format(task=task)
+        REFLECT_PROMPT_TEMPLATE.format(task=task, code=fixtures.SAMPLE_CODE, measurements="未提供实测数据，请仅根据代码进行分析。")
+        return REFINE_PROMPT_TEMPLATE.format(task=task, last_code_attempt=fixtures.SAMPLE_CODE, feedback=fixtures.SAMPLE_FEEDBACK)
+    return render
+
+
+def _plan_parse() -> Callable[[], Any]:
+    from agents.plan_solve_agent import Planner
+    planner = Planner(None)
+    return lambda: planner._parse_plan_text(fixtures.PLAN_RESPONSE)
+
+
+def _compress_observation() -> Callable[[], Any]:
+    from tools.compression import ObservationCompressor
+    compressor = ObservationCompressor(max_tokens=300)
+    return lambda: compressor.compress(fixtures.ATTRACTION_OBSERVATION, "北京晴天适合去哪些景点？门票多少钱？")
+
+
+def _select_tools() -> Callable[[], Any]:
+    from tools.retrieval import ToolRetriever
+    tool_executor = fixtures.fake_tool_executor()
+    tool_executor.retriever = ToolRetriever(top_k=5)
+    for name, info in tool_executor.tools.items():
+        tool_executor.retriever.add(name, info["description"])
+    for i in range(60):
+        tool_executor.registerTool(f"internal_tool_{i}", f"查询或更新内部第{i}号业务系统中的记录。参数说明：\nid: str，记录编号。", lambda **kwargs: "ok")
+    query = '北京今天适合去哪里玩？\nAction: get_weather[city="北京"]\nObservation: 北京当前天气：晴朗，气温 25 摄氏度'
+    return lambda: tool_executor.getAvailableTools(query=query)
+
+
+def _rules_match() -> Callable[[], Any]:
+    from agents.rule_engine import Rule, RuleEngine
+    # 200 条意图规则（动作 × 对象），输入命中靠后的一条
+    verbs = ["查询", "取消", "修改", "打印", "导出", "删除", "创建", "关闭", "打开", "预订"]
+    nouns = ["订单", "航班", "酒店", "发票", "账户", "密码", "地址", "快递", "会员", "优惠券",
+             "天气", "汇率", "股票", "日程", "会议", "邮件", "报表", "合同", "工单", "退款"]
+    engine = RuleEngine([
+        Rule(rf"{verb}(?P<target>\w{{1,12}}?)的?{noun}", [f"{verb}{{target}}的{noun}"])
+        for verb in verbs for noun in nouns
+    ])
+    return lambda: engine.match("麻烦帮我预订一下北京的酒店")
+
+
+def _memory_add_record() -> Callable[[], Any]:
+    from agents.reflection_agent import Memory
+    memory = Memory(max_records=64)
+    for i in range(64):
+        memory.add_record("execution" if i % 2 == 0 else "reflection", fixtures.SAMPLE_CODE)
+
+    # 记忆已满，每次添加都会淘汰最早的记录
+    return lambda: memory.add_record("execution", fixtures.SAMPLE_CODE)
+
+
+def _memory_read() -> Callable[[], Any]:
+    from agents.reflection_agent import Memory
+    memory = Memory(max_records=64)
+    for i in range(64):
+        memory.add_record("execution" if i % 2 == 0 else "reflection", fixtures.SAMPLE_CODE)
+
+    def read():
+        memory.get_last_execution()
+        return memory.get_trajectory()
+    return read
+
+
+def _format_thinking_process() -> Callable[[], Any]:
+    from webui.react_agent_webui import format_thinking_process
+    steps = fixtures.thinking_process(200)
+    return lambda: format_thinking_process(steps)
+
+
+# 名称 -> 构建被测函数的工厂；工厂只执行一次，返回的无参函数会被反复计时
+MICRO_BENCHMARKS: Dict[str, Callable[[], Callable[[], Any]]] = {
+    "micro.react.parse_output": _react_parse_output,
+    "micro.react.parse_action": _react_parse_action,
+    "micro.react.render_prompt": _react_render_prompt,
+    "micro.react.render_prompt_budgeted_30": _react_render_prompt_budgeted,
+    "micro.plan.render_prompts": _plan_render_prompts,
+    "micro.reflection.render_prompts": _reflection_render_prompts,
+    "micro.plan.parse_plan": _plan_parse,
+    "micro.tools.compress_observation": _compress_observation,
+    "micro.tools.select_from_63": _select_tools,
+    "micro.rules.match_200": _rules_match,
+    "micro.memory.add_record": _memory_add_record,
+    "micro.memory.read": _memory_read,
+    "micro.webui.format_thinking_process_200": _format_thinking_process,
+}
@@ -0,0 +1,88 @@
+'''
+Author: wenjinwang 314984354@qq.com
+Date: 2026-10-19 09:13:20
+LastEditors: wenjinwang 314984354@qq.com
+LastEditTime: 2026-10-19 09:14:49
+FilePath: /hello-agents/benchmarks/run.py
+Description: 运行基准测试，保存结果并与基线对比
+
+用法:
+    python -m benchmarks.run                                      # 运行全部基准，结果写入 benchmarks/results/latest.json
+    python -m benchmarks.run --save-baseline                      # 同时把结果保存为基线
+    python -m benchmarks.run --baseline benchmarks/results/baseline.json --threshold 0.1
+    python -m benchmarks.run --suite micro --filter react
+    python -m benchmarks.run --suite import                       # 只测各入口模块的导入耗时
+与基线相比有指标变差超过阈值时，进程以退出码 1 结束，可直接用作CI中的回归门禁。
+'''
+import argparse
+import shutil
+import sys
+
+from benchmarks.end_to_end import END_TO_END_BENCHMARKS, run_end_to_end
+from benchmarks.harness import compare, format_comparison, format_results, load_results, save_results, time_callable
+from benchmarks.import_time import IMPORT_BENCHMARKS, measure_import
+from benchmarks.micro import MICRO_BENCHMARKS
+from telemetry.event_sink import NullSink, set_sink
+
+
+DEFAULT_OUTPUT = "benchmarks/results/latest.json"
+DEFAULT_BASELINE = "benchmarks/results/baseline.json"
+
+
+def run_benchmarks(suite: str = "all", name_filter: str = "", repeat: int = 5, min_time: float = 0.2, runs: int = None):
+    results = {}
+    if suite in ("all", "micro"):
+        for name, factory in MICRO_BENCHMARKS.items():
+            if name_filter in name:
+                results[name] = time_callable(factory(), repeat=repeat, min_time=min_time)
+                print(format_results({name: results[name]}, ["median_us", "ops_per_sec"]), flush=True)
+    if suite in ("all", "e2e"):
+        for name in END_TO_END_BENCHMARKS:
+            if name_filter in name:
+                results[name] = run_end_to_end(name, runs=runs)
+                print(format_results({name: results[name]}, ["steps_per_sec", "overhead_ms_per_run", "peak_memory_kib"]), flush=True)
+    if suite in ("all", "import"):
+        for name, module in IMPORT_BENCHMARKS.items():
+            if name_filter in name:
+                results[name] = measure_import(module, repeat=repeat)
+                print(format_results({name: results[name]}, ["import_ms"]), flush=True)
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="运行 hello-agents 的基准测试")
+    parser.add_argument("--suite", choices=("all", "micro", "e2e", "import"), default="all")
+    parser.add_argument("--filter", default="", help="只运行名称包含该字符串的基准")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="结果JSON的保存路径")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="用于对比的基线JSON，不存在时跳过对比")
+    parser.add_argument("--threshold", type=float, default=0.15, help="回归阈值，0.15 表示变差超过15%%")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果保存为基线")
+    parser.add_argument("--repeat", type=int, default=5, help="微基准的重复轮数")
+    parser.add_argument("--min-time", type=float, default=0.2, help="每个微基准的最短计时（秒）")
+    parser.add_argument("--runs", type=int, default=None, help="端到端基准的运行次数")
+    args = parser.parse_args(argv)
+
+    # 运行日志的输出会淹没被测代码本身的开销
+    set_sink(NullSink())
+    results = run_benchmarks(args.suite, args.filter, args.repeat, args.min_time, args.runs)
+    save_results(args.output, results)
+    print(f"\n结果已保存到 {args.output}")
+
+    if args.save_baseline:
+        if args.output != args.baseline:
+            shutil.copyfile(args.output, args.baseline)
+        print(f"基线已更新: {args.baseline}")
+        return 0
+
+    try:
+        baseline = load_results(args.baseline)
+    except FileNotFoundError:
+        print(f"未找到基线 {args.baseline}，跳过对比（可使用 --save-baseline 生成）。")
+        return 0
+    rows = compare(results, baseline, args.threshold)
+    print("\n" + format_comparison(rows, args.threshold))
+    return 1 if any(row["regression"] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
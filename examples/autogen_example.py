@@ -8,24 +8,43 @@ Description:
 
 '''
 import asyncio
+import json
 import os
+import sys
 from autogen_agentchat.agents import AssistantAgent, UserProxyAgent
 from autogen_agentchat.conditions import TextMentionTermination
 from autogen_agentchat.teams import RoundRobinGroupChat
 from autogen_agentchat.ui import Console
-from autogen_ext.models.openai import OpenAIChatCompletionClient
-from dotenv import load_dotenv
 
-load_dotenv()
+from agents.autogen_team import SourceWindowContext, budget_termination, run_teams
+from models.autogen_client import HelloAgentsChatCompletionClient
+from models.env import load_env
+from models.response_cache import CachedLLM, ResponseCache
+from server.agent_factory import create_llm_client
 
+load_env()
+
+# 团队对话的响应缓存，重复运行同一个任务时大部分调用直接命中缓存
+AUTOGEN_CACHE_PATH = os.getenv("AUTOGEN_CACHE_PATH", ".autogen_cache.json")
+# 单个任务的预算：累计token数或运行时间超出后终止，避免长对话越来越慢、越来越贵
+AUTOGEN_MAX_TOKENS = int(os.getenv("AUTOGEN_MAX_TOKENS", 60000))
+AUTOGEN_MAX_SECONDS = float(os.getenv("AUTOGEN_MAX_SECONDS", 600))
+
+# 每个智能体只看到任务本身与下列发言者最近的 n 条消息，而不是整个不断增长的对话
+CONTEXT_POLICY = {
+    "ProductManager": {"ProductManager": 1, "CodeReviewer": 1, "UserProxy": 1},
+    "Engineer": {"ProductManager": 1, "CodeReviewer": 1, "Engineer": 1},
+    "CodeReviewer": {"ProductManager": 1, "Engineer": 1},
+}
 
-def create_openai_model_client():
-    """创建并配置 OpenAI 模型客户端"""
-    return OpenAIChatCompletionClient(
-        model=os.getenv("LLM_MODEL_ID", "gpt-4o"),
-        api_key=os.getenv("LLM_API_KEY"),
-        base_url=os.getenv("LLM_BASE_URL", "https://api.openai.com/v1")
-    )
+
+def create_model_client():
+    """
+    创建 AutoGen 使用的模型客户端：底层是与其他智能体相同的LLM客户端
+    （负载均衡、按角色路由、级联等配置同样生效），外面加一层可持久化的响应缓存。
+    """
+    llm_client = CachedLLM(create_llm_client(), ResponseCache(AUTOGEN_CACHE_PATH))
+    return HelloAgentsChatCompletionClient(llm_client)
 
 
 def create_product_manager(model_client):
@@ -51,6 +70,8 @@ def create_product_manager(model_client):
         name="ProductManager",
         model_client=model_client,
         system_message=system_message,
+        model_client_stream=True,
+        model_context=SourceWindowContext(CONTEXT_POLICY["ProductManager"]),
     )
 
 
@@ -77,6 +98,8 @@ def create_engineer(model_client):
         name="Engineer",
         model_client=model_client,
         system_message=system_message,
+        model_client_stream=True,
+        model_context=SourceWindowContext(CONTEXT_POLICY["Engineer"]),
     )
 
 
@@ -103,6 +126,8 @@ def create_code_reviewer(model_client):
         name="CodeReviewer",
         model_client=model_client,
         system_message=system_message,
+        model_client_stream=True,
+        model_context=SourceWindowContext(CONTEXT_POLICY["CodeReviewer"]),
     )
 
 
@@ -120,12 +145,28 @@ def create_user_proxy():
     )
 
 
-# 主函数
-async def run_software_development_team():
-    # ... 初始化客户端和智能体 ...
-    
-    # 定义任务描述
-    task = """我们需要开发一个比特币价格显示应用，具体要求如下：
+def create_team(model_client, with_user_proxy: bool = True):
+    """创建开发团队；并发运行多个任务时没有用户可以交互，不加入用户代理。"""
+    participants = [
+        create_product_manager(model_client),
+        create_engineer(model_client),
+        create_code_reviewer(model_client),
+    ]
+    if with_user_proxy:
+        participants.append(create_user_proxy())
+
+    # 定义团队聊天和协作规则：提到 TERMINATE、超出token或时间预算时结束
+    return RoundRobinGroupChat(
+        participants=participants,
+        termination_condition=budget_termination(
+            AUTOGEN_MAX_TOKENS, AUTOGEN_MAX_SECONDS, TextMentionTermination("TERMINATE"),
+        ),
+        max_turns=20,
+    )
+
+
+# 定义任务描述
+TASK = """我们需要开发一个比特币价格显示应用，具体要求如下：
             核心功能：
             - 实时显示比特币当前价格（USD）
             - 显示24小时价格变化趋势（涨跌幅和涨跌额）
@@ -138,34 +179,38 @@ async def run_software_development_team():
 
             请团队协作完成这个任务，从需求分析到最终实现。"""
 
-    model_client = create_openai_model_client()
-    product_manager = create_product_manager(model_client)
-    engineer = create_engineer(model_client)
-    code_reviewer = create_code_reviewer(model_client)
-    user_proxy = create_user_proxy()
-
-    # 定义团队聊天和协作规则
-    team_chat = RoundRobinGroupChat(
-        participants=[
-            product_manager,
-            engineer,
-            code_reviewer,
-            user_proxy
-        ],
-        termination_condition=TextMentionTermination("TERMINATE"),
-        max_turns=20,
-    )
 
-    
+# 主函数
+async def run_software_development_team(task: str = TASK):
+    model_client = create_model_client()
+    team_chat = create_team(model_client)
+
     # 异步执行团队协作，并流式输出对话过程
-    result = await Console(team_chat.run_stream(task=task))
+    try:
+        result = await Console(team_chat.run_stream(task=task))
+    finally:
+        # 把本次运行新增的响应写回缓存文件
+        await model_client.close()
     return result
 
-# 主程序入口
-if __name__ == "__main__":
-    result = asyncio.run(run_software_development_team())
-
-
-
 
+async def run_concurrent_tasks(tasks):
+    """在同一个事件循环中并发运行多个任务，各团队共享同一个模型客户端，逐轮打印token用量。"""
+    model_client = create_model_client()
+    try:
+        reports = await run_teams(lambda task: create_team(model_client, with_user_proxy=False), tasks)
+    finally:
+        await model_client.close()
+    for report in reports:
+        print(json.dumps(report.to_dict(), ensure_ascii=False, indent=2))
+    return reports
 
+# 主程序入口
+# python examples/autogen_example.py                    运行一个任务，可与用户代理交互
+# python examples/autogen_example.py --concurrent 任务1 任务2   并发运行多个任务
+if __name__ == "__main__":
+    if "--concurrent" in sys.argv:
+        tasks = [arg for arg in sys.argv[1:] if arg != "--concurrent"] or [TASK]
+        asyncio.run(run_concurrent_tasks(tasks))
+    else:
+        result = asyncio.run(run_software_development_team())
@@ -1,9 +1,12 @@
+from agents.code_benchmark import CodeBenchmark
 from agents.reflection_agent import ReflectionAgent
 from models.hello_agents_llm import HelloAgentsLLM
 
 
 if __name__ == "__main__":
     llm_client = HelloAgentsLLM()
-    reflection_agent = ReflectionAgent(llm_client=llm_client, max_iterations=3)
+    # 每份候选代码都会以 n = 1000, 10000, 100000 作为输入在沙箱中实测
+    benchmark = CodeBenchmark(sizes=(1000, 10000, 100000))
+    reflection_agent = ReflectionAgent(llm_client=llm_client, max_iterations=3, benchmark=benchmark)
     task = "编写一个Python函数，找出1到n之间所有的素数 (prime numbers)。"
-    reflection_agent.run(task=task)
\ No newline at end of file
+    reflection_agent.run(task=task)
@@ -8,9 +8,10 @@ Description:
 
 Copyright (c) 2025 by Tencent, All Rights Reserved. 
 '''
-import re
 import random
 
+from agents.rule_engine import Rule, RuleEngine
+
 # 定义规则库：模式(正则表达式) -> 响应模板列表
 rules = {
     r'I need (.*)': [
@@ -66,22 +67,20 @@ def swap_pronouns(phrase):
     swapped_words = [pronoun_swap.get(word, word) for word in words]
     return " ".join(swapped_words)
 
+# 所有规则编译为一个正则（见 agents/rule_engine.py），捕获的部分先做代词转换，再随机选择一个模板
+engine = RuleEngine(
+    [Rule(pattern, responses) for pattern, responses in rules.items()],
+    transform=swap_pronouns,
+    chooser=random.choice,
+)
+
 def respond(user_input):
     """
     根据规则库生成响应
     """
-    for pattern, responses in rules.items():
-        match = re.search(pattern, user_input, re.IGNORECASE)
-        if match:
-            # 捕获匹配到的部分
-            captured_group = match.group(1) if match.groups() else ''
-            # 进行代词转换
-            swapped_group = swap_pronouns(captured_group)
-            # 从模板中随机选择一个并格式化
-            response = random.choice(responses).format(swapped_group)
-            return response
-    # 如果没有匹配任何特定规则，使用最后的通配符规则
-    return random.choice(rules[r'.*'])
+    response = engine.respond(user_input)
+    # 最后的通配符规则总能匹配，这里只是兜底
+    return response.text if response else random.choice(rules[r'.*'])
 
 # 主聊天循环
 if __name__ == '__main__':
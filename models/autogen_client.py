@@ -0,0 +1,231 @@
+'''
+Author: wenjinwang 314984354@qq.com
+Date: 2026-10-19 09:31:57
+LastEditors: wenjinwang 314984354@qq.com
+LastEditTime: 2026-10-19 09:31:57
+FilePath: /hello-agents/models/autogen_client.py
+Description: AutoGen 的 ChatCompletionClient 适配器，让 AutoGen 的智能体使用本项目的LLM客户端
+
+'''
+import asyncio
+import contextvars
+import threading
+import time
+from typing import Any, AsyncGenerator, Dict, List, Mapping, Optional, Sequence, Union
+
+from autogen_core import CancellationToken
+from autogen_core.models import (
+    AssistantMessage,
+    ChatCompletionClient,
+    CreateResult,
+    FunctionExecutionResultMessage,
+    LLMMessage,
+    ModelFamily,
+    ModelInfo,
+    RequestUsage,
+    SystemMessage,
+    UserMessage,
+)
+
+from models.usage import estimate_tokens, record_usage
+from telemetry.event_sink import emit
+from telemetry.metrics import observe_llm_call
+from telemetry.tracing import span
+
+
+class HelloAgentsChatCompletionClient(ChatCompletionClient):
+    """
+    把任何与 HelloAgentsLLM 接口一致的客户端（HelloAgentsLLM、LoadBalancedLLM、ModelRouter、CachedLLM 等）
+    包装为 AutoGen 的 ChatCompletionClient，AutoGen 的团队因此与其他智能体共享连接、缓存、限流与指标。
+    同步的 stream_think 在线程池中运行，流式输出逐块交给事件循环，不会阻塞其他智能体。
+    底层客户端不支持函数调用与 JSON 模式，只能用于不带工具的 AssistantAgent。
+    用法:
+        llm = CachedLLM(create_llm_client(), ResponseCache(".autogen_cache.json"))
+        model_client = HelloAgentsChatCompletionClient(llm)
+        AssistantAgent(name="Engineer", model_client=model_client, model_client_stream=True)
+    """
+
+    def __init__(self, llm_client, temperature: float = 0, max_context_tokens: int = 128000, model_info: Optional[ModelInfo] = None):
+        self.llm_client = llm_client
+        self.model = getattr(llm_client, "model", None)
+        self.temperature = temperature
+        self.max_context_tokens = max_context_tokens
+        self._model_info: ModelInfo = model_info or ModelInfo(
+            vision=False, function_calling=False, json_output=False, structured_output=False,
+            family=ModelFamily.UNKNOWN, multiple_system_messages=True,
+        )
+        self._actual_usage = RequestUsage(prompt_tokens=0, completion_tokens=0)
+        self._total_usage = RequestUsage(prompt_tokens=0, completion_tokens=0)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def to_messages(messages: Sequence[LLMMessage]) -> List[Dict[str, str]]:
+        """把 AutoGen 的消息转换为 OpenAI 格式的消息列表；用户消息带上发言者的名字，使模型能区分团队成员。"""
+        converted = []
+        for message in messages:
+            if isinstance(message, SystemMessage):
+                converted.append({"role": "system", "content": message.content})
+            elif isinstance(message, UserMessage):
+                content = message.content if isinstance(message.content, str) else "\n".join(
+                    part if isinstance(part, str) else "[图片]" for part in message.content
+                )
+                converted.append({"role": "user", "content": f"{message.source}: {content}" if message.source else content})
+            elif isinstance(message, AssistantMessage):
+                content = message.content if isinstance(message.content, str) else "\n".join(
+                    f"{call.name}({call.arguments})" for call in message.content
+                )
+                converted.append({"role": "assistant", "content": content})
+            elif isinstance(message, FunctionExecutionResultMessage):
+                converted.append({"role": "user", "content": "\n".join(result.content for result in message.content)})
+            else:
+                raise ValueError(f"不支持的消息类型: {type(message).__name__}")
+        return converted
+
+    def _check_args(self, tools, json_output):
+        if tools:
+            raise ValueError("HelloAgentsChatCompletionClient 不支持函数调用，请不要为智能体注册工具。")
+        if json_output:
+            raise ValueError("HelloAgentsChatCompletionClient 不支持 JSON 模式与结构化输出。")
+
+    def _result(self, messages: List[Dict[str, str]], response_text: str, cached: bool) -> CreateResult:
+        prompt_tokens = sum(estimate_tokens(message.get("content")) for message in messages)
+        usage = RequestUsage(prompt_tokens=prompt_tokens, completion_tokens=estimate_tokens(response_text))
+        with self._lock:
+            self._total_usage = RequestUsage(
+                prompt_tokens=self._total_usage.prompt_tokens + usage.prompt_tokens,
+                completion_tokens=self._total_usage.completion_tokens + usage.completion_tokens,
+            )
+            if not cached:
+                self._actual_usage = RequestUsage(
+                    prompt_tokens=self._actual_usage.prompt_tokens + usage.prompt_tokens,
+                    completion_tokens=self._actual_usage.completion_tokens + usage.completion_tokens,
+                )
+        return CreateResult(finish_reason="stop", content=response_text, usage=usage, cached=cached)
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Any] = [],
+        tool_choice: Any = "auto",
+        json_output: Optional[Any] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        result = None
+        async for item in self.create_stream(
+            messages, tools=tools, tool_choice=tool_choice, json_output=json_output,
+            extra_create_args=extra_create_args, cancellation_token=cancellation_token,
+        ):
+            if isinstance(item, CreateResult):
+                result = item
+        return result
+
+    async def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Any] = [],
+        tool_choice: Any = "auto",
+        json_output: Optional[Any] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        """
+        逐块产出响应文本，最后产出 CreateResult。底层客户端提供 lookup（例如 CachedLLM）且命中缓存时，
+        直接返回 cached=True 的结果，不占用线程。cancellation_token 被取消后，在下一个块的边界关闭底层的流式响应。
+        """
+        self._check_args(tools, json_output)
+        converted = self.to_messages(messages)
+        temperature = extra_create_args.get("temperature", self.temperature)
+
+        lookup = getattr(self.llm_client, "lookup", None)
+        cached_text = lookup(converted, temperature) if lookup is not None else None
+        if cached_text is not None:
+            emit("llm.cache_hit", "♻️ LLM响应命中缓存。", model=self.model)
+            yield cached_text
+            yield self._result(converted, cached_text, cached=True)
+            return
+
+        # 已经查询过缓存，未命中时跳过第二次查询
+        stream_think = getattr(self.llm_client, "stream_uncached", None) if lookup is not None else None
+        stream_think = stream_think or self.llm_client.stream_think
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+        done = object()
+        if cancellation_token is not None:
+            cancellation_token.add_callback(stop.set)
+
+        def produce():
+            started = time.perf_counter()
+            ttft = None
+            collected = []
+            with span("llm.autogen", model=self.model) as call_span:
+                stream = stream_think(converted, temperature=temperature)
+                try:
+                    for chunk in stream:
+                        if stop.is_set():
+                            call_span.set(cancelled=True)
+                            observe_llm_call(self.model, time.perf_counter() - started, status="cancelled")
+                            return
+                        if ttft is None:
+                            ttft = time.perf_counter() - started
+                            call_span.mark("ttft")
+                        collected.append(chunk)
+                        loop.call_soon_threadsafe(queue.put_nowait, chunk)
+                    prompt_tokens, completion_tokens = record_usage(converted, "".join(collected))
+                    observe_llm_call(self.model, time.perf_counter() - started, ttft, prompt_tokens, completion_tokens)
+                except BaseException as e:
+                    call_span.set(error=str(e))
+                    observe_llm_call(self.model, time.perf_counter() - started, status="error")
+                    loop.call_soon_threadsafe(queue.put_nowait, e)
+                finally:
+                    stream.close()
+                    loop.call_soon_threadsafe(queue.put_nowait, done)
+
+        # run_in_executor 不会传递 contextvars，显式复制，使追踪与 track_usage 归属于调用方
+        producer = loop.run_in_executor(None, contextvars.copy_context().run, produce)
+        collected = []
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                collected.append(item)
+                yield item
+        finally:
+            stop.set()
+            await producer
+        if cancellation_token is not None and cancellation_token.is_cancelled():
+            raise asyncio.CancelledError()
+        yield self._result(converted, "".join(collected), cached=False)
+
+    async def close(self) -> None:
+        """底层客户端带有可持久化的缓存（CachedLLM）时，把缓存写回磁盘。"""
+        save = getattr(self.llm_client, "save", None)
+        if save is not None:
+            save()
+
+    def actual_usage(self) -> RequestUsage:
+        """实际发给模型的调用的token用量（估算，不含命中缓存的调用）。"""
+        return self._actual_usage
+
+    def total_usage(self) -> RequestUsage:
+        return self._total_usage
+
+    def count_tokens(self, messages: Sequence[LLMMessage], *, tools: Sequence[Any] = []) -> int:
+        return sum(estimate_tokens(message["content"]) for message in self.to_messages(messages))
+
+    def remaining_tokens(self, messages: Sequence[LLMMessage], *, tools: Sequence[Any] = []) -> int:
+        return self.max_context_tokens - self.count_tokens(messages, tools=tools)
+
+    @property
+    def capabilities(self) -> ModelInfo:
+        return self._model_info
+
+    @property
+    def model_info(self) -> ModelInfo:
+        return self._model_info
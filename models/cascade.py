@@ -0,0 +1,169 @@
+'''
+Author: wenjinwang 314984354@qq.com
+Date: 2026-10-19 09:25:04
+LastEditors: wenjinwang 314984354@qq.com
+LastEditTime: 2026-10-19 09:25:04
+FilePath: /hello-agents/models/cascade.py
+Description: 级联调用：先用快而便宜的小模型，输出未通过校验时才升级到大模型
+
+'''
+import copy
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+from telemetry.event_sink import LLM_END, LLM_TOKEN, emit
+from telemetry.metrics import LLM_CASCADE
+from telemetry.tracing import span
+
+Validator = Callable[[str], bool]
+
+
+def non_empty(text: str) -> bool:
+    """默认的校验：输出不为空。"""
+    return bool(text and text.strip())
+
+
+def with_validator(llm_client, validator: Validator):
+    """llm_client 支持级联（或包装了级联客户端）时，返回使用 validator 校验输出的客户端，否则原样返回。"""
+    bind = getattr(llm_client, "with_validator", None)
+    return bind(validator) if bind is not None else llm_client
+
+
+class TierStats:
+    """一层模型的调用次数、通过/未通过校验/出错次数，以及通过校验的调用的总耗时。"""
+
+    def __init__(self, model: Optional[str]):
+        self.model = model
+        self.calls = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.errors = 0
+        self.accepted_seconds = 0.0
+        self.wasted_seconds = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "calls": self.calls,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "avg_latency_ms": round(self.accepted_seconds / self.accepted * 1000, 1) if self.accepted else None,
+        }
+
+
+class CascadeLLM:
+    """
+    接口与 HelloAgentsLLM 一致。tiers 按从小到大排列，每次调用依次尝试：
+    前面各层的输出先完整收集，通过 validator 校验后再一次性产出，未通过校验或调用出错时升级到下一层；
+    最后一层直接流式产出，不再校验。因此小模型的输出不会流式展示，但小模型本身足够快。
+
+    validator 由调用方按用途指定（见 with_validator），例如 ReAct 要求输出中有可解析的 Action，
+    规划器要求输出能被解析为计划列表。未指定时只要求输出不为空。
+    stats() 给出各层的通过率、升级率，以及按大模型的平均耗时估算节省的时间。
+    """
+
+    def __init__(self, tiers: Sequence[Any], validator: Optional[Validator] = None):
+        if not tiers:
+            raise ValueError("至少需要一层模型。")
+        self.tiers = list(tiers)
+        self.validator = validator or non_empty
+        self.model = getattr(self.tiers[-1], "model", None)
+        self._stats = [TierStats(getattr(tier, "model", None)) for tier in self.tiers]
+        self._lock = threading.Lock()
+
+    def with_validator(self, validator: Validator) -> "CascadeLLM":
+        """返回使用另一个校验函数的视图，与原对象共享模型与统计。"""
+        view = copy.copy(self)
+        view.validator = validator
+        return view
+
+    def _record(self, index: int, result: str, seconds: float):
+        stats = self._stats[index]
+        with self._lock:
+            stats.calls += 1
+            if result == "accepted":
+                stats.accepted += 1
+                stats.accepted_seconds += seconds
+            else:
+                setattr(stats, result, getattr(stats, result) + 1)
+                stats.wasted_seconds += seconds
+        LLM_CASCADE.inc(model=stats.model or "unknown", result=result)
+
+    def stream_think(self, messages: List[Dict[str, str]], temperature: float = 0) -> Iterator[str]:
+        last = len(self.tiers) - 1
+        for index, tier in enumerate(self.tiers[:last]):
+            started = time.perf_counter()
+            with span("llm.cascade", tier=index, model=self._stats[index].model) as tier_span:
+                try:
+                    text = "".join(tier.stream_think(messages, temperature=temperature))
+                except Exception as e:
+                    self._record(index, "errors", time.perf_counter() - started)
+                    tier_span.set(result="error", error=str(e))
+                    emit("llm.cascade_escalated", f"⤴️ {self._stats[index].model} 调用失败，升级到更大的模型: {e}", model=self._stats[index].model, reason="error")
+                    continue
+                if self.validator(text):
+                    self._record(index, "accepted", time.perf_counter() - started)
+                    tier_span.set(result="accepted")
+                    accepted = True
+                else:
+                    self._record(index, "rejected", time.perf_counter() - started)
+                    tier_span.set(result="rejected")
+                    emit("llm.cascade_escalated", f"⤴️ {self._stats[index].model} 的输出未通过校验，升级到更大的模型。", model=self._stats[index].model, reason="rejected")
+                    accepted = False
+            if accepted:
+                yield text
+                return
+
+        started = time.perf_counter()
+        with span("llm.cascade", tier=last, model=self._stats[last].model):
+            try:
+                yield from self.tiers[last].stream_think(messages, temperature=temperature)
+            except Exception:
+                self._record(last, "errors", time.perf_counter() - started)
+                raise
+        self._record(last, "accepted", time.perf_counter() - started)
+
+    def think(self, messages: List[Dict[str, str]], temperature: float = 0) -> Optional[str]:
+        """与 HelloAgentsLLM.think 一致：流式输出到事件通道，出错时返回 None。"""
+        emit("llm.start", f"🧠 正在调用 {self.model} 模型...", model=self.model)
+        with span("llm.think", model=self.model):
+            try:
+                collected_content = []
+                for content in self.stream_think(messages, temperature=temperature):
+                    emit(LLM_TOKEN, content)
+                    collected_content.append(content)
+                response_text = "".join(collected_content)
+                emit(LLM_END, model=self.model, response=response_text)
+                return response_text
+            except Exception as e:
+                emit("llm.error", f"❌ 调用LLM API时发生错误: {e}", model=self.model, error=str(e))
+                return None
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        requests 为总调用次数，escalation_rate 为没有被第一层接住的比例。
+        saved_seconds 估算节省的时间：由前面各层接住的调用，按最后一层的平均耗时计算本应花费的时间，
+        减去它们实际花费的时间，再减去未通过校验的尝试浪费的时间。
+        """
+        with self._lock:
+            tiers = [stats.to_dict() for stats in self._stats]
+            # 每次调用都从第一层开始
+            requests = self._stats[0].calls
+            escalations = requests - self._stats[0].accepted if len(self._stats) > 1 else 0
+            final = self._stats[-1]
+            saved = None
+            if final.accepted:
+                final_average = final.accepted_seconds / final.accepted
+                saved = sum(
+                    stats.accepted * final_average - stats.accepted_seconds - stats.wasted_seconds
+                    for stats in self._stats[:-1]
+                )
+        return {
+            "requests": requests,
+            "escalations": escalations,
+            "escalation_rate": round(escalations / requests, 4) if requests else 0.0,
+            "saved_seconds": round(saved, 4) if saved is not None else None,
+            "tiers": tiers,
+        }
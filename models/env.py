@@ -0,0 +1,32 @@
+'''
+Author: wenjinwang 314984354@qq.com
+Date: 2026-10-19 09:14:49
+LastEditors: wenjinwang 314984354@qq.com
+LastEditTime: 2026-10-19 09:47:23
+FilePath: /hello-agents/models/env.py
+Description: 加载 .env 中的环境变量，每个进程只加载一次
+
+'''
+import threading
+
+_loaded = False
+_lock = threading.Lock()
+
+
+def load_env():
+    """
+    加载 .env 文件中的环境变量（不覆盖已存在的环境变量）。
+    读取环境变量的模块在导入时调用；重复调用不会再次读取文件。未安装 python-dotenv 时只使用已有的环境变量。
+    """
+    global _loaded
+    if _loaded:
+        return
+    with _lock:
+        if not _loaded:
+            try:
+                from dotenv import load_dotenv
+            except ImportError:
+                load_dotenv = None
+            if load_dotenv is not None:
+                load_dotenv()
+            _loaded = True
@@ -0,0 +1,80 @@
+'''
+Author: wenjinwang 314984354@qq.com
+Date: 2026-10-19 09:01:50
+LastEditors: wenjinwang 314984354@qq.com
+LastEditTime: 2026-10-19 09:01:50
+FilePath: /hello-agents/models/fake_llm.py
+Description: 本地的LLM替身，用于压测、基准测试与离线调试
+
+'''
+import re
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+
+class FakeLLM:
+    """
+    与 HelloAgentsLLM 接口一致的本地LLM替身，不发起任何网络请求。
+    它识别本项目各个提示词模板，返回格式正确的响应，使三种智能体都能完整跑通：
+    - ReAct: 先调用 tool_calls 次 tool_call 指定的工具，然后 Finish；
+    - 规划器: 返回包含 plan_steps 个步骤的计划；执行器: 返回步骤结果；
+    - 反思: 初始/优化时返回代码，评审时返回“无需改进”。
+    latency 模拟首个token之前的等待，cpu_seconds 模拟本地推理消耗的CPU时间。
+    """
+
+    def __init__(
+        self,
+        model: str = "fake-llm",
+        latency: float = 0.0,
+        cpu_seconds: float = 0.0,
+        chunk_size: int = 8,
+        tool_calls: int = 0,
+        tool_call: Tuple[str, Dict[str, str]] = ("google_search", {"query": "hello"}),
+        plan_steps: int = 2,
+        responder: Optional[Callable[[str], str]] = None,
+    ):
+        self.model = model
+        self.latency = latency
+        self.cpu_seconds = cpu_seconds
+        self.chunk_size = chunk_size
+        self.tool_calls = tool_calls
+        self.tool_call = tool_call
+        self.plan_steps = plan_steps
+        self.responder = responder
+
+    def respond(self, prompt: str) -> str:
+        """根据提示词的类型生成完整响应。"""
+        if self.responder:
+            return self.responder(prompt)
+        if "Question:" in prompt and "History:" in prompt:
+            history = prompt.split("History:", 1)[1]
+            question = prompt.split("Question:", 1)[1].split("\n", 1)[0].strip()
+            if history.count("Observation:") < self.tool_calls:
+                name, args = self.tool_call
+                args_str = ", ".join(f'{key}="{value}"' for key, value in args.items())
+                return f"Thought: 我需要调用工具获取信息。\nAction: {name}[{args_str}]"
+            return f"Thought: 我已经获得了足够的信息。\nAction: Finish({question})"
+        if "规划专家" in prompt:
+            steps = [f"步骤{i + 1}" for i in range(self.plan_steps)]
+            return f"```python\n{steps!r}\n```"
+        if "执行专家" in prompt:
+            step = re.search(r"# 当前步骤:\s*\n(.*)", prompt)
+            return f"{step.group(1).strip() if step else ''}的结果"
+        if "待审查的代码" in prompt:
+            return "无需改进"
+        return "def solve(n):\n    \"\"\"返回 n 本身。\"\"\"\n    return n\n"
+
+    def stream_think(self, messages: List[Dict[str, str]], temperature: float = 0) -> Iterator[str]:
+        """按 chunk_size 逐块产出响应，模拟流式输出。"""
+        if self.latency:
+            time.sleep(self.latency)
+        if self.cpu_seconds:
+            deadline = time.process_time() + self.cpu_seconds
+            while time.process_time() < deadline:
+                pass
+        text = self.respond(messages[-1]["content"])
+        for i in range(0, len(text), self.chunk_size):
+            yield text[i:i + self.chunk_size]
+
+    def think(self, messages: List[Dict[str, str]], temperature: float = 0) -> str:
+        return "".join(self.stream_think(messages, temperature=temperature))
@@ -9,22 +9,26 @@ Description: Hello Agents LLM Client
 Copyright (c) 2025 by Tencent, All Rights Reserved. 
 '''
 import os
-from openai import OpenAI
-from dotenv import load_dotenv
-from typing import List, Dict
+from typing import Any, List, Dict, Iterator
 
-# 加载 .env 文件中的环境变量
-load_dotenv()
+from models.env import load_env
+from telemetry.event_sink import LLM_END, LLM_TOKEN, emit
+from telemetry.tracing import span
 
 class HelloAgentsLLM:
     """
     为本书 "Hello Agents" 定制的LLM客户端。
     它用于调用任何兼容OpenAI接口的服务，并默认使用流式响应。
     """
-    def __init__(self, model: str = None, apiKey: str = None, baseUrl: str = None, timeout: int = None):
+    def __init__(self, model: str = None, apiKey: str = None, baseUrl: str = None, timeout: int = None, generation_kwargs: Dict[str, Any] = None):
         """
-        初始化客户端。优先使用传入参数，如果未提供，则从环境变量加载。
+        初始化客户端。优先使用传入参数，如果未提供，则从环境变量（含 .env 文件）加载。
+        generation_kwargs 是每次请求都附带的生成参数（例如 max_tokens、top_p），原样传给 chat.completions.create。
+        openai 在这里才导入，仅导入本模块（例如作为类型注解）不会付出它的导入开销。
         """
+        load_env()
+        from openai import OpenAI
+
         self.model = model or os.getenv("LLM_MODEL_ID")
         apiKey = apiKey or os.getenv("LLM_API_KEY")
         baseUrl = baseUrl or os.getenv("LLM_BASE_URL")
@@ -33,34 +37,57 @@ class HelloAgentsLLM:
         if not all([self.model, apiKey, baseUrl]):
             raise ValueError("模型ID、API密钥和服务地址必须被提供或在.env文件中定义。")
 
+        self.generation_kwargs = dict(generation_kwargs or {})
         self.client = OpenAI(api_key=apiKey, base_url=baseUrl, timeout=timeout)
 
-    def think(self, messages: List[Dict[str, str]], temperature: float = 0) -> str:
+    def stream_think(self, messages: List[Dict[str, str]], temperature: float = 0) -> Iterator[str]:
         """
-        调用大语言模型进行思考，并返回其响应。
+        以流式方式调用大语言模型，逐块产出响应文本。调用出错时直接抛出异常。
+        追踪开启时，llm.request span 记录排队与建立连接的时间（queue_ms）、首个token的时间（ttft_ms）与总时长。
         """
-        print(f"🧠 正在调用 {self.model} 模型...")
-        try:
+        with span("llm.request", model=self.model) as request_span:
             response = self.client.chat.completions.create(
                 model=self.model,
                 messages=messages,
                 temperature=temperature,
                 stream=True,
+                **self.generation_kwargs,
             )
-            
-            # 处理流式响应
-            print("✅ 大语言模型响应成功:")
-            collected_content = []
-            for chunk in response:
-                content = chunk.choices[0].delta.content or ""
-                print(content, end="", flush=True)
-                collected_content.append(content)
-            print()  # 在流式输出结束后换行
-            return "".join(collected_content)
+            request_span.mark("queue")
+            emit("llm.response", "✅ 大语言模型响应成功:", model=self.model)
+            chunks = 0
+            try:
+                for chunk in response:
+                    if not chunk.choices:
+                        continue
+                    if not chunks:
+                        request_span.mark("ttft")
+                    chunks += 1
+                    yield chunk.choices[0].delta.content or ""
+            finally:
+                request_span.set(chunks=chunks)
+                # 生成器被提前关闭（例如运行被取消）时，立即断开连接，中止服务端的生成
+                response.close()
+
+    def think(self, messages: List[Dict[str, str]], temperature: float = 0) -> str:
+        """
+        调用大语言模型进行思考，并返回其响应。
+        """
+        emit("llm.start", f"🧠 正在调用 {self.model} 模型...", model=self.model)
+        with span("llm.think", model=self.model):
+            try:
+                # 处理流式响应
+                collected_content = []
+                for content in self.stream_think(messages, temperature=temperature):
+                    emit(LLM_TOKEN, content)
+                    collected_content.append(content)
+                response_text = "".join(collected_content)
+                emit(LLM_END, model=self.model, response=response_text)  # 在流式输出结束后换行
+                return response_text
 
-        except Exception as e:
-            print(f"❌ 调用LLM API时发生错误: {e}")
-            return None
+            except Exception as e:
+                emit("llm.error", f"❌ 调用LLM API时发生错误: {e}", model=self.model, error=str(e))
+                return None
 
 # --- 客户端使用示例 ---
 if __name__ == '__main__':
@@ -0,0 +1,262 @@
+'''
+Author: wenjinwang 314984354@qq.com
+Date: 2026-10-19 09:22:11
+LastEditors: wenjinwang 314984354@qq.com
+LastEditTime: 2026-10-19 09:22:11
+FilePath: /hello-agents/models/load_balancer.py
+Description: 在多个兼容OpenAI接口的LLM服务之间按实时延迟做负载均衡与故障转移
+
+配置（环境变量，JSON数组）:
+    LLM_ENDPOINTS='[{"base_url": "https://a/v1", "api_key": "k1", "model": "m", "weight": 2},
+                    {"base_url": "https://b/v1", "api_key": "k2", "model": "m"}]'
+'''
+import json
+import math
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from telemetry.event_sink import LLM_END, LLM_TOKEN, emit
+from telemetry.metrics import LLM_RETRIES
+from telemetry.tracing import span
+
+
+@dataclass
+class LLMTarget:
+    """一个LLM服务：地址、密钥、模型与权重（权重越大，被选为候选的概率越高）。"""
+    base_url: str
+    api_key: str
+    model: str
+    weight: float = 1.0
+
+
+class Endpoint:
+    """
+    一个服务的客户端与实时统计。
+    首个token时间（TTFT）与错误率都用指数加权移动平均（EWMA）统计，最近的请求权重更大。
+    一段时间没有被选中的服务，其代价随时间衰减，之后会重新得到请求、刷新统计，不会因为一次偶然的慢请求被长期冷落。
+    """
+
+    def __init__(self, client, weight: float = 1.0, name: Optional[str] = None):
+        self.client = client
+        self.weight = weight
+        self.name = name or getattr(client, "model", None) or "endpoint"
+        self.model = getattr(client, "model", None)
+        self.ewma_ttft: Optional[float] = None
+        self.ewma_error = 0.0
+        self.inflight = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.ejection_seconds = 0.0
+        self.probing = False
+        self.updated_at = 0.0
+
+    def cost(self, now: float, decay_seconds: float) -> float:
+        """
+        越小越好：预期等待时间 × (进行中的请求数 + 1)，按错误率加罚，按权重折算。
+        尚未被请求过的服务优先被尝试。
+        """
+        if self.ewma_ttft is None:
+            return 0.0
+        decay = math.exp(-(now - self.updated_at) / decay_seconds) if decay_seconds else 1.0
+        return self.ewma_ttft * decay * (self.inflight + 1) * (1 + 4 * self.ewma_error) / self.weight
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "model": self.model,
+            "weight": self.weight,
+            "ewma_ttft": self.ewma_ttft,
+            "ewma_error": round(self.ewma_error, 4),
+            "inflight": self.inflight,
+            "requests": self.requests,
+            "failures": self.failures,
+            "ejected": self.ejected_until > time.monotonic(),
+        }
+
+
+class LoadBalancedLLM:
+    """
+    接口与 HelloAgentsLLM 一致（stream_think / think），可直接交给三种智能体使用。
+
+    选择：每次请求在健康的服务中按权重随机抽取两个，选其中 cost() 较小的一个（power of two choices），
+    既能避开慢的服务，又不会让所有请求同时涌向同一个“最快”的服务。
+    摘除：连续失败 max_failures 次的服务被摘除 ejection_seconds 秒，再次被摘除时时长翻倍（不超过 max_ejection_seconds）。
+    探测：摘除到期后只放行一个探测请求，成功则恢复，失败则再次摘除。所有服务都被摘除时，选择最早到期的一个。
+    故障转移：在收到首个token之前失败的请求会换一个服务重试（最多 max_attempts 次），对调用方透明；
+    已经开始输出后失败的请求无法无缝切换，异常会抛给调用方。
+    """
+
+    def __init__(
+        self,
+        targets: Sequence[Any],
+        max_attempts: Optional[int] = None,
+        max_failures: int = 3,
+        ejection_seconds: float = 10.0,
+        max_ejection_seconds: float = 300.0,
+        alpha: float = 0.3,
+        decay_seconds: float = 30.0,
+        timeout: Optional[int] = None,
+    ):
+        """
+        targets 中的每一项可以是 LLMTarget、(base_url, api_key, model[, weight]) 元组、同名字段的字典，
+        也可以是 (客户端, 权重) 或已经创建好的 Endpoint，便于接入 FakeLLM 等自定义客户端。
+        """
+        self.endpoints = [self._endpoint(target, timeout) for target in targets]
+        if not self.endpoints:
+            raise ValueError("至少需要配置一个LLM服务。")
+        self.max_attempts = max_attempts or len(self.endpoints)
+        self.max_failures = max_failures
+        self.base_ejection_seconds = ejection_seconds
+        self.max_ejection_seconds = max_ejection_seconds
+        self.alpha = alpha
+        self.decay_seconds = decay_seconds
+        models = list(dict.fromkeys(endpoint.model for endpoint in self.endpoints if endpoint.model))
+        self.model = "+".join(models) or "load-balanced"
+        self._lock = threading.Lock()
+        self._random = random.Random()
+
+    @staticmethod
+    def _endpoint(target: Any, timeout: Optional[int]) -> Endpoint:
+        if isinstance(target, Endpoint):
+            return target
+        if isinstance(target, dict):
+            target = LLMTarget(**target)
+        elif isinstance(target, (tuple, list)) and len(target) == 2 and not isinstance(target[0], str):
+            return Endpoint(target[0], weight=target[1])
+        elif isinstance(target, (tuple, list)):
+            target = LLMTarget(*target)
+        if isinstance(target, LLMTarget):
+            from models.hello_agents_llm import HelloAgentsLLM
+            client = HelloAgentsLLM(model=target.model, apiKey=target.api_key, baseUrl=target.base_url, timeout=timeout)
+            return Endpoint(client, weight=target.weight, name=f"{target.model}@{target.base_url}")
+        return Endpoint(target)
+
+    @classmethod
+    def from_env(cls, **kwargs) -> Optional["LoadBalancedLLM"]:
+        """按环境变量 LLM_ENDPOINTS（JSON数组）创建；未配置时返回 None。"""
+        from models.env import load_env
+        load_env()
+        spec = os.getenv("LLM_ENDPOINTS")
+        if not spec:
+            return None
+        return cls([LLMTarget(**item) for item in json.loads(spec)], **kwargs)
+
+    def _pick(self, exclude: List[Endpoint]) -> Optional[Endpoint]:
+        now = time.monotonic()
+        with self._lock:
+            candidates = [e for e in self.endpoints if e not in exclude]
+            if not candidates:
+                return None
+            healthy = [e for e in candidates if e.ejected_until <= now and not e.probing]
+            if not healthy:
+                # 全部被摘除时，放行最早到期的一个，而不是直接失败
+                chosen = min(candidates, key=lambda e: e.ejected_until)
+            elif len(healthy) == 1:
+                chosen = healthy[0]
+            else:
+                first = self._random.choices(healthy, weights=[e.weight for e in healthy])[0]
+                rest = [e for e in healthy if e is not first]
+                second = self._random.choices(rest, weights=[e.weight for e in rest])[0]
+                chosen = first if first.cost(now, self.decay_seconds) <= second.cost(now, self.decay_seconds) else second
+            if chosen.ejected_until and chosen.ejected_until <= now:
+                # 摘除已到期：这次请求作为探测，完成之前不再分配其他请求
+                chosen.probing = True
+            chosen.inflight += 1
+            chosen.requests += 1
+            return chosen
+
+    def _record(self, endpoint: Endpoint, ttft: float, error: bool):
+        with self._lock:
+            endpoint.inflight -= 1
+            endpoint.updated_at = time.monotonic()
+            endpoint.ewma_error = (1 - self.alpha) * endpoint.ewma_error + self.alpha * (1.0 if error else 0.0)
+            endpoint.ewma_ttft = ttft if endpoint.ewma_ttft is None else (1 - self.alpha) * endpoint.ewma_ttft + self.alpha * ttft
+            was_probing, endpoint.probing = endpoint.probing, False
+            if not error:
+                endpoint.consecutive_failures = 0
+                if was_probing or endpoint.ejected_until:
+                    endpoint.ejected_until = 0.0
+                    endpoint.ejection_seconds = 0.0
+                    emit("llm.endpoint_restored", f"✅ LLM服务 {endpoint.name} 已恢复。", endpoint=endpoint.name)
+                return
+            endpoint.failures += 1
+            endpoint.consecutive_failures += 1
+            if was_probing or endpoint.consecutive_failures >= self.max_failures:
+                endpoint.ejection_seconds = min(
+                    self.max_ejection_seconds,
+                    endpoint.ejection_seconds * 2 if endpoint.ejection_seconds else self.base_ejection_seconds,
+                )
+                endpoint.ejected_until = time.monotonic() + endpoint.ejection_seconds
+                emit(
+                    "llm.endpoint_ejected", f"🚫 LLM服务 {endpoint.name} 连续失败，摘除 {endpoint.ejection_seconds:.0f} 秒。",
+                    endpoint=endpoint.name, seconds=endpoint.ejection_seconds,
+                )
+
+    def _release(self, endpoint: Endpoint):
+        """请求被调用方提前关闭（例如运行被取消）时，只归还占用，不计入统计。"""
+        with self._lock:
+            endpoint.inflight -= 1
+            endpoint.probing = False
+
+    def stream_think(self, messages: List[Dict[str, str]], temperature: float = 0) -> Iterator[str]:
+        tried: List[Endpoint] = []
+        last_error: Optional[Exception] = None
+        for attempt in range(self.max_attempts):
+            endpoint = self._pick(tried)
+            if endpoint is None:
+                break
+            tried.append(endpoint)
+            if attempt:
+                LLM_RETRIES.inc(model=endpoint.model or self.model)
+            started = time.perf_counter()
+            ttft = None
+            finished = False
+            with span("llm.balance", endpoint=endpoint.name, attempt=attempt + 1):
+                try:
+                    for chunk in endpoint.client.stream_think(messages, temperature=temperature):
+                        if ttft is None:
+                            ttft = time.perf_counter() - started
+                        yield chunk
+                    finished = True
+                except Exception as e:
+                    # 首个token之前失败时，以失败前等待的时间作为样本：超时的服务会显得很慢，
+                    # 立即报错的服务则会很快累计到 max_failures 次并被摘除
+                    self._record(endpoint, ttft if ttft is not None else time.perf_counter() - started, error=True)
+                    finished = True
+                    if ttft is not None:
+                        raise  # 已经输出了部分内容，无法透明地切换到其他服务
+                    last_error = e
+                    emit("llm.failover", f"⚠️ LLM服务 {endpoint.name} 调用失败，切换到其他服务: {e}", endpoint=endpoint.name, error=str(e))
+                    continue
+                finally:
+                    if not finished:
+                        self._release(endpoint)
+            self._record(endpoint, ttft if ttft is not None else time.perf_counter() - started, error=False)
+            return
+        raise last_error or RuntimeError("没有可用的LLM服务。")
+
+    def think(self, messages: List[Dict[str, str]], temperature: float = 0) -> Optional[str]:
+        """与 HelloAgentsLLM.think 一致：流式输出到事件通道，出错时返回 None。"""
+        emit("llm.start", f"🧠 正在调用 {self.model} 模型...", model=self.model)
+        with span("llm.think", model=self.model):
+            try:
+                collected_content = []
+                for content in self.stream_think(messages, temperature=temperature):
+                    emit(LLM_TOKEN, content)
+                    collected_content.append(content)
+                response_text = "".join(collected_content)
+                emit(LLM_END, model=self.model, response=response_text)
+                return response_text
+            except Exception as e:
+                emit("llm.error", f"❌ 调用LLM API时发生错误: {e}", model=self.model, error=str(e))
+                return None
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [endpoint.to_dict() for endpoint in self.endpoints]
@@ -8,7 +8,12 @@ Description: 兼容OpenAI接口的LLM服务的客户端
 
 Copyright (c) 2025 by Tencent, All Rights Reserved. 
 '''
-from openai import OpenAI
+import time
+from typing import Iterator
+
+from models.usage import estimate_tokens
+from telemetry.metrics import observe_llm_call
+from telemetry.tracing import span
 
 
 class OpenAICompatibleClient:
@@ -16,25 +21,68 @@ class OpenAICompatibleClient:
     一个用于调用任何兼容OpenAI接口的LLM服务的客户端。
     """
     def __init__(self, model: str, api_key: str, base_url: str):
+        from openai import OpenAI  # 首次创建客户端时才导入
+
         self.model = model
         self.client = OpenAI(api_key=api_key, base_url=base_url)
 
     def generate(self, prompt: str, system_prompt: str) -> str:
         """调用LLM API来生成回应。"""
         print("正在调用大语言模型...")
-        try:
-            messages = [
-                {'role': 'system', 'content': system_prompt},
-                {'role': 'user', 'content': prompt}
-            ]
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                stream=False
+        started = time.perf_counter()
+        with span("llm.generate", model=self.model) as generate_span:
+            try:
+                messages = [
+                    {'role': 'system', 'content': system_prompt},
+                    {'role': 'user', 'content': prompt}
+                ]
+                response = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    stream=False
+                )
+                answer = response.choices[0].message.content
+                print("大语言模型响应成功。")
+                observe_llm_call(self.model, time.perf_counter() - started, prompt_tokens=estimate_tokens(system_prompt) + estimate_tokens(prompt), completion_tokens=estimate_tokens(answer))
+                return answer
+            except Exception as e:
+                print(f"调用LLM API时发生错误: {e}")
+                generate_span.set(error=str(e))
+                observe_llm_call(self.model, time.perf_counter() - started, status="error")
+                return "错误：调用语言模型服务时出错。"
+
+    def generate_stream(self, prompt: str, system_prompt: str) -> Iterator[str]:
+        """以流式方式调用LLM API，逐块产出回应文本。调用出错时直接抛出异常。"""
+        messages = [
+            {'role': 'system', 'content': system_prompt},
+            {'role': 'user', 'content': prompt}
+        ]
+        started = time.perf_counter()
+        ttft = None
+        collected = []
+        with span("llm.generate", model=self.model, streaming=True) as generate_span:
+            try:
+                response = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    stream=True
+                )
+                generate_span.mark("queue")
+                for chunk in response:
+                    if not chunk.choices:
+                        continue
+                    if ttft is None:
+                        ttft = time.perf_counter() - started
+                        generate_span.mark("ttft")
+                    content = chunk.choices[0].delta.content or ""
+                    collected.append(content)
+                    yield content
+            except Exception:
+                observe_llm_call(self.model, time.perf_counter() - started, status="error")
+                raise
+            generate_span.set(chunks=len(collected))
+            observe_llm_call(
+                self.model, time.perf_counter() - started, ttft,
+                prompt_tokens=estimate_tokens(system_prompt) + estimate_tokens(prompt),
+                completion_tokens=estimate_tokens("".join(collected)),
             )
-            answer = response.choices[0].message.content
-            print("大语言模型响应成功。")
-            return answer
-        except Exception as e:
-            print(f"调用LLM API时发生错误: {e}")
-            return "错误：调用语言模型服务时出错。"
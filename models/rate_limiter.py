@@ -0,0 +1,76 @@
+'''
+Author: wenjinwang 314984354@qq.com
+Date: 2026-10-19 09:03:51
+LastEditors: wenjinwang 314984354@qq.com
+LastEditTime: 2026-10-19 09:03:51
+FilePath: /hello-agents/models/rate_limiter.py
+Description: LLM调用的限流：令牌桶 + 并发上限
+
+'''
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+
+
+class RateLimiter:
+    """
+    线程安全的令牌桶。每秒补充 rate 个令牌，最多积累 burst 个；acquire() 在令牌不足时阻塞等待。
+    """
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, requests_per_minute: float, burst: Optional[int] = None) -> "RateLimiter":
+        return cls(requests_per_minute / 60.0, burst)
+
+    def acquire(self, tokens: float = 1.0):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class RateLimitedLLM:
+    """
+    给任意LLM客户端加上请求速率与并发数限制，接口与被包装的客户端一致。
+    多个智能体或 run_many 的多个并发运行共享同一个实例时，限制在它们之间共享。
+    """
+
+    def __init__(self, llm_client, requests_per_minute: Optional[float] = None, max_concurrency: Optional[int] = None):
+        self.llm_client = llm_client
+        self.model = getattr(llm_client, "model", None)
+        self.limiter = RateLimiter.per_minute(requests_per_minute) if requests_per_minute else None
+        self._slots = threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+
+    def stream_think(self, messages: List[Dict[str, str]], temperature: float = 0) -> Iterator[str]:
+        if self.limiter:
+            self.limiter.acquire()
+        if self._slots:
+            self._slots.acquire()
+        try:
+            yield from self.llm_client.stream_think(messages, temperature=temperature)
+        finally:
+            if self._slots:
+                self._slots.release()
+
+    def think(self, messages: List[Dict[str, str]], temperature: float = 0) -> str:
+        if self.limiter:
+            self.limiter.acquire()
+        if self._slots:
+            self._slots.acquire()
+        try:
+            return self.llm_client.think(messages, temperature=temperature)
+        finally:
+            if self._slots:
+                self._slots.release()
@@ -0,0 +1,123 @@
+'''
+Author: wenjinwang 314984354@qq.com
+Date: 2026-10-19 09:31:57
+LastEditors: wenjinwang 314984354@qq.com
+LastEditTime: 2026-10-19 09:31:57
+FilePath: /hello-agents/models/response_cache.py
+Description: LLM响应缓存：相同的模型、消息与温度直接返回上一次的完整响应
+
+'''
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional
+
+from telemetry.event_sink import LLM_END, LLM_TOKEN, emit
+from telemetry.metrics import LLM_CACHE
+from telemetry.tracing import span
+
+
+class ResponseCache:
+    """
+    以 (模型, 消息列表, 温度) 的哈希为键的响应缓存，超过 max_entries 时淘汰最久未使用的条目。
+    与 PlanMemo 一样，提供 path 时从该JSON文件加载，并在 save() 时写回，使缓存可以跨进程复用。
+    """
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = 4096):
+        self.path = path
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, str]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries.update(json.load(f))
+
+    @staticmethod
+    def key(model: Optional[str], messages: List[Dict[str, str]], temperature: float) -> str:
+        payload = json.dumps([model, messages, temperature], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            response_text = self.entries.get(key)
+            if response_text is None:
+                self.stats["misses"] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return response_text
+
+    def put(self, key: str, response_text: str):
+        with self._lock:
+            self.entries[key] = response_text
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def save(self):
+        """将缓存写回磁盘（未设置 path 时不做任何事）。"""
+        if not self.path:
+            return
+        with self._lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+
+
+class CachedLLM:
+    """
+    接口与 HelloAgentsLLM 一致，在 llm_client 之前查询 ResponseCache。
+    命中时整段响应作为一个块产出；未命中时照常流式产出，完整结束后才写入缓存
+    （出错或被提前关闭的调用不会写入）。温度大于0的调用同样会被缓存，需要多样输出的调用方不应使用本类。
+    """
+
+    def __init__(self, llm_client, cache: Optional[ResponseCache] = None):
+        self.llm_client = llm_client
+        self.cache = cache or ResponseCache()
+        self.model = getattr(llm_client, "model", None)
+
+    def lookup(self, messages: List[Dict[str, str]], temperature: float = 0) -> Optional[str]:
+        """只查询缓存，不调用模型；命中时返回响应文本。"""
+        response_text = self.cache.get(self.cache.key(self.model, messages, temperature))
+        LLM_CACHE.inc(model=self.model or "unknown", result="hit" if response_text is not None else "miss")
+        return response_text
+
+    def stream_uncached(self, messages: List[Dict[str, str]], temperature: float = 0) -> Iterator[str]:
+        """跳过查询直接调用模型，完整结束后写入缓存；供已经调用过 lookup 的调用方使用。"""
+        collected = []
+        for chunk in self.llm_client.stream_think(messages, temperature=temperature):
+            collected.append(chunk)
+            yield chunk
+        self.cache.put(self.cache.key(self.model, messages, temperature), "".join(collected))
+
+    def stream_think(self, messages: List[Dict[str, str]], temperature: float = 0) -> Iterator[str]:
+        response_text = self.lookup(messages, temperature)
+        if response_text is None:
+            yield from self.stream_uncached(messages, temperature)
+            return
+        with span("llm.cache_hit", model=self.model):
+            emit("llm.cache_hit", "♻️ LLM响应命中缓存。", model=self.model)
+            yield response_text
+
+    def think(self, messages: List[Dict[str, str]], temperature: float = 0) -> Optional[str]:
+        """与 HelloAgentsLLM.think 一致：流式输出到事件通道，出错时返回 None。"""
+        emit("llm.start", f"🧠 正在调用 {self.model} 模型...", model=self.model)
+        with span("llm.think", model=self.model):
+            try:
+                collected_content = []
+                for content in self.stream_think(messages, temperature=temperature):
+                    emit(LLM_TOKEN, content)
+                    collected_content.append(content)
+                response_text = "".join(collected_content)
+                emit(LLM_END, model=self.model, response=response_text)
+                return response_text
+            except Exception as e:
+                emit("llm.error", f"❌ 调用LLM API时发生错误: {e}", model=self.model, error=str(e))
+                return None
+
+    def save(self):
+        self.cache.save()
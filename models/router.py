@@ -0,0 +1,241 @@
+'''
+Author: wenjinwang 314984354@qq.com
+Date: 2026-10-19 09:23:37
+LastEditors: wenjinwang 314984354@qq.com
+LastEditTime: 2026-10-19 09:48:12
+FilePath: /hello-agents/models/router.py
+Description: 按角色路由模型：规划、执行、评审、优化与ReAct步骤可以使用不同的模型与生成参数
+
+配置（环境变量，JSON对象，键为角色名或“智能体.角色”）:
+    LLM_ROLES='{"executor": {"model": "small-model", "temperature": 0, "extra": {"max_tokens": 256}},
+                "react": {"model": "small-model"},
+                "reflection.critic": {"model": "large-model", "base_url": "https://b/v1", "api_key": "k2"}}'
+'''
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from models.usage import estimate_tokens
+from telemetry.metrics import LLM_ROLE_LATENCY, LLM_ROLE_TOKENS
+
+# 各智能体使用的角色
+PLANNER = "planner"      # Plan-and-Solve 的规划与重新规划
+EXECUTOR = "executor"    # Plan-and-Solve 的逐步执行
+CRITIC = "critic"        # 反思智能体的评审
+REFINER = "refiner"      # 反思智能体的初始生成与优化
+STEP = "step"            # ReAct 的每一步
+
+
+@dataclass
+class RoleConfig:
+    """
+    一个角色使用的模型与生成参数。未设置的字段沿用默认客户端（model 与 base_url 都为空时直接使用默认客户端）。
+    temperature 不为 None 时覆盖调用方传入的温度。
+    extra 是该角色每次请求附带的其他生成参数（例如 {"max_tokens": 256}），传给 chat.completions.create；
+    它需要该角色有自己的客户端，因此必须与 model 或 base_url 一起设置。
+    """
+    model: Optional[str] = None
+    base_url: Optional[str] = None
+    api_key: Optional[str] = None
+    temperature: Optional[float] = None
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+
+class RoleStats:
+    """一个角色的调用次数、失败次数、耗时、首个token时间与估算的token用量。"""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.ttft_seconds = 0.0
+        self.ttft_samples = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        ok_calls = self.calls - self.errors
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "avg_latency_ms": round(self.seconds / ok_calls * 1000, 1) if ok_calls else None,
+            "avg_ttft_ms": round(self.ttft_seconds / self.ttft_samples * 1000, 1) if self.ttft_samples else None,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+        }
+
+
+class RoutedLLM:
+    """
+    ModelRouter.for_role 返回的客户端，接口与 HelloAgentsLLM 一致。
+    按角色的配置覆盖温度，并把每次调用记入该角色的统计。
+    """
+
+    def __init__(self, router: "ModelRouter", role: str, llm_client, temperature: Optional[float] = None):
+        self.router = router
+        self.role = role
+        self.llm_client = llm_client
+        self.model = getattr(llm_client, "model", None)
+        self.temperature = temperature
+
+    def with_validator(self, validator) -> "RoutedLLM":
+        """该角色的客户端是级联客户端时，让它按 validator 校验输出，见 models/cascade.py。"""
+        bind = getattr(self.llm_client, "with_validator", None)
+        if bind is None:
+            return self
+        return RoutedLLM(self.router, self.role, bind(validator), self.temperature)
+
+    def stream_think(self, messages: List[Dict[str, str]], temperature: float = 0) -> Iterator[str]:
+        if self.temperature is not None:
+            temperature = self.temperature
+        started = time.perf_counter()
+        ttft = None
+        collected = []
+        status = "error"
+        try:
+            for chunk in self.llm_client.stream_think(messages, temperature=temperature):
+                if ttft is None:
+                    ttft = time.perf_counter() - started
+                collected.append(chunk)
+                yield chunk
+            status = "ok"
+        except GeneratorExit:
+            status = "cancelled"
+            raise
+        finally:
+            self.router._record(self.role, self.model, messages, "".join(collected), time.perf_counter() - started, ttft, status)
+
+    def think(self, messages: List[Dict[str, str]], temperature: float = 0) -> Optional[str]:
+        if self.temperature is not None:
+            temperature = self.temperature
+        started = time.perf_counter()
+        response_text = self.llm_client.think(messages, temperature=temperature)
+        self.router._record(
+            self.role, self.model, messages, response_text, time.perf_counter() - started, None,
+            "ok" if response_text is not None else "error",
+        )
+        return response_text
+
+
+class ModelRouter:
+    """
+    按角色选择模型。for_role(role, agent) 依次查找 "agent.role"、"role"、"agent" 的配置，都没有时使用默认客户端。
+    配置相同（模型、地址、密钥）的角色共享同一个客户端，客户端在第一次使用时才创建。
+    用法:
+        router = ModelRouter(HelloAgentsLLM(), {"executor": RoleConfig(model="small-model"), "react": RoleConfig(model="small-model")})
+        agent = PlanAndSolveAgent(router)   # 规划使用默认模型，执行使用 small-model
+        router.stats()                      # 各角色的耗时与token用量
+    """
+
+    def __init__(
+        self,
+        default_client,
+        roles: Optional[Dict[str, Any]] = None,
+        client_factory: Optional[Callable[[RoleConfig], Any]] = None,
+    ):
+        """
+        roles 的值可以是 RoleConfig、同名字段的字典，也可以直接是一个客户端对象（例如 FakeLLM 或 LoadBalancedLLM）。
+        client_factory 按 RoleConfig 创建客户端，默认创建 HelloAgentsLLM（未设置的地址与密钥从环境变量读取）。
+        """
+        self.default_client = default_client
+        self.model = getattr(default_client, "model", None)
+        self.client_factory = client_factory or _create_client
+        self.roles: Dict[str, Any] = {}
+        for name, config in (roles or {}).items():
+            self.roles[name] = RoleConfig(**config) if isinstance(config, dict) else config
+        self._clients: Dict[Tuple, Any] = {}
+        self._routed: Dict[Tuple[str, Optional[str]], RoutedLLM] = {}
+        self._stats: Dict[str, RoleStats] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, default_client, **kwargs) -> Any:
+        """按环境变量 LLM_ROLES（JSON对象）创建；未配置时直接返回 default_client。"""
+        spec = os.getenv("LLM_ROLES")
+        if not spec:
+            return default_client
+        return cls(default_client, json.loads(spec), **kwargs)
+
+    def _config(self, role: str, agent: Optional[str]) -> Any:
+        keys = ([f"{agent}.{role}"] if agent else []) + [role] + ([agent] if agent else [])
+        for key in keys:
+            if key in self.roles:
+                return self.roles[key]
+        return None
+
+    def _client(self, config: RoleConfig):
+        if not config.model and not config.base_url:
+            if config.extra:
+                raise ValueError(f"角色配置的 extra 生成参数需要与 model 或 base_url 一起设置: {config.extra}")
+            return self.default_client
+        key = (config.model, config.base_url, config.api_key, json.dumps(config.extra, sort_keys=True))
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = self._clients[key] = self.client_factory(config)
+            return client
+
+    def for_role(self, role: str, agent: Optional[str] = None) -> RoutedLLM:
+        """返回该角色使用的客户端；同一个 (角色, 智能体) 每次返回同一个对象。"""
+        routed = self._routed.get((role, agent))
+        if routed is not None:
+            return routed
+        config = self._config(role, agent)
+        stats_name = f"{agent}.{role}" if agent else role
+        if config is None:
+            client, temperature = self.default_client, None
+        elif isinstance(config, RoleConfig):
+            client, temperature = self._client(config), config.temperature
+        else:
+            client, temperature = config, None
+        with self._lock:
+            routed = self._routed.setdefault((role, agent), RoutedLLM(self, stats_name, client, temperature))
+        return routed
+
+    def _record(self, role: str, model: Optional[str], messages, response_text: Optional[str], seconds: float, ttft: Optional[float], status: str):
+        prompt_tokens = sum(estimate_tokens(message.get("content")) for message in messages)
+        completion_tokens = estimate_tokens(response_text)
+        with self._lock:
+            stats = self._stats.setdefault(role, RoleStats())
+            stats.calls += 1
+            stats.prompt_tokens += prompt_tokens
+            stats.completion_tokens += completion_tokens
+            if status == "error":
+                stats.errors += 1
+            elif status == "ok":
+                stats.seconds += seconds
+                if ttft is not None:
+                    stats.ttft_seconds += ttft
+                    stats.ttft_samples += 1
+        if status == "ok":
+            LLM_ROLE_LATENCY.observe(seconds, role=role, model=model or "unknown")
+        LLM_ROLE_TOKENS.inc(prompt_tokens, role=role, kind="prompt")
+        LLM_ROLE_TOKENS.inc(completion_tokens, role=role, kind="completion")
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """各角色（"智能体.角色"）的统计，以及该角色使用的模型。"""
+        with self._lock:
+            models = {routed.role: routed.model for routed in self._routed.values()}
+            return {role: {"model": models.get(role), **stats.to_dict()} for role, stats in self._stats.items()}
+
+    def stream_think(self, messages: List[Dict[str, str]], temperature: float = 0) -> Iterator[str]:
+        """不区分角色的调用方（例如自定义的智能体）直接使用默认客户端。"""
+        return self.default_client.stream_think(messages, temperature=temperature)
+
+    def think(self, messages: List[Dict[str, str]], temperature: float = 0) -> Optional[str]:
+        return self.default_client.think(messages, temperature=temperature)
+
+
+def for_role(llm_client, role: str, agent: Optional[str] = None):
+    """llm_client 是 ModelRouter 时返回该角色的客户端，否则原样返回，供各智能体在构造时调用。"""
+    if isinstance(llm_client, ModelRouter):
+        return llm_client.for_role(role, agent)
+    return llm_client
+
+
+def _create_client(config: RoleConfig):
+    from models.hello_agents_llm import HelloAgentsLLM
+    return HelloAgentsLLM(model=config.model, apiKey=config.api_key, baseUrl=config.base_url, generation_kwargs=config.extra)
@@ -0,0 +1,110 @@
+'''
+Author: wenjinwang 314984354@qq.com
+Date: 2026-10-19 09:03:51
+LastEditors: wenjinwang 314984354@qq.com
+LastEditTime: 2026-10-19 09:16:59
+FilePath: /hello-agents/models/usage.py
+Description: LLM调用的token用量估算与统计
+
+'''
+import contextvars
+import re
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+# 中日韩字符大约每个字一个token，其余文本大约每4个字符一个token
+_CJK_PATTERN = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯＀-￯]")
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """粗略估算一段文本的token数，用于没有返回用量信息的流式接口。"""
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def truncate_to_tokens(text: str, max_tokens: int, suffix: str = "…") -> str:
+    """把文本截断到估算不超过 max_tokens 个token（含 suffix），未超出时原样返回。"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    budget = max_tokens - estimate_tokens(suffix)
+    if budget <= 0:
+        return ""
+    # 二分查找满足预算的最长前缀
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(text[:middle]) <= budget:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low] + suffix
+
+
+class TokenUsage:
+    """线程安全的token用量累加器。"""
+
+    def __init__(self):
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def add(self, prompt_tokens: int, completion_tokens: int):
+        with self._lock:
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.calls += 1
+
+    def merge(self, other: "TokenUsage"):
+        """把另一个累加器的用量并入本累加器。"""
+        with self._lock:
+            self.prompt_tokens += other.prompt_tokens
+            self.completion_tokens += other.completion_tokens
+            self.calls += other.calls
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def to_dict(self) -> Dict[str, int]:
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens,
+            "calls": self.calls,
+        }
+
+
+# 当前正在统计的用量；未设置时 record_usage 不做任何事
+_current_usage: contextvars.ContextVar[Optional[TokenUsage]] = contextvars.ContextVar("current_usage", default=None)
+
+
+@contextmanager
+def track_usage(usage: Optional[TokenUsage] = None) -> Iterator[TokenUsage]:
+    """
+    在 with 块内（以及通过 contextvars.copy_context 传递出去的线程中）统计LLM调用的token用量。
+    用法:
+        with track_usage() as usage:
+            agent.run(question)
+        print(usage.to_dict())
+    """
+    usage = usage or TokenUsage()
+    token = _current_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _current_usage.reset(token)
+
+
+def record_usage(messages: List[Dict[str, str]], completion: Optional[str]) -> Tuple[int, int]:
+    """把一次LLM调用的估算用量记入当前的统计，返回 (提示词token数, 输出token数)。"""
+    prompt_tokens = sum(estimate_tokens(message.get("content")) for message in messages)
+    completion_tokens = estimate_tokens(completion)
+    usage = _current_usage.get()
+    if usage is not None:
+        usage.add(prompt_tokens, completion_tokens)
+    return prompt_tokens, completion_tokens
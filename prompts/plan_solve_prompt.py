@@ -29,4 +29,23 @@ EXECUTOR_PROMPT_TEMPLATE = """
 {current_step}
 
 请仅输出针对“当前步骤”的回答:
-"""
\ No newline at end of file
+"""
+
+REPLANNER_PROMPT_TEMPLATE = """
+你是一个顶级的AI规划专家。之前制定的行动计划在执行过程中有一个步骤失败了。
+请保留已经完成的步骤及其结果，只为剩余的部分重新制定计划。
+你的输出必须是一个Python列表，其中每个元素都是一个描述子任务的字符串，且不要包含已经完成的步骤。
+
+问题: {question}
+
+# 已完成的步骤与结果:
+{history}
+
+# 执行失败的步骤:
+{failed_step}
+
+请严格按照以下格式输出剩余的计划,```python与```作为前后缀是必要的:
+```python
+["步骤1", "步骤2", "步骤3", ...]
+```
+"""
@@ -30,7 +30,10 @@ REFLECT_PROMPT_TEMPLATE = """
 {code}
 ```
 
-请分析该代码的时间复杂度，并思考是否存在一种<strong>算法上更优</strong>的解决方案来显著提升性能。
+# 实测性能数据:
+{measurements}
+
+请结合实测数据分析该代码的时间复杂度，并思考是否存在一种<strong>算法上更优</strong>的解决方案来显著提升性能。
 如果存在，请清晰地指出当前算法的不足，并提出具体的、可行的改进算法建议（例如，使用筛法替代试除法）。
 如果代码在算法层面已经达到最优，才能回答“无需改进”。
 
@@ -0,0 +1,144 @@
+'''
+Author: wenjinwang 314984354@qq.com
+Date: 2026-10-19 08:59:53
+LastEditors: wenjinwang 314984354@qq.com
+LastEditTime: 2026-10-19 09:48:44
+FilePath: /hello-agents/server/agent_factory.py
+Description: 按名称构建智能体，供HTTP服务与工作进程共享
+
+'''
+import os
+from typing import Any, Dict
+
+from agents.plan_solve_agent import PlanAndSolveAgent
+from agents.react_agent import ReActAgent
+from agents.reflection_agent import ReflectionAgent
+from agents.rule_engine import Rule, RuleEngine
+from models.cascade import CascadeLLM
+from models.env import load_env
+from models.hello_agents_llm import HelloAgentsLLM
+from models.load_balancer import LoadBalancedLLM
+from models.router import ModelRouter
+from tools import get_attraction, get_weather, google_search
+from tools.compression import ObservationCompressor
+from tools.refresher import CacheRefresher
+from tools.retrieval import ToolRetriever
+from tools.tool_exector import ToolExecutor, is_cacheable
+
+load_env()
+
+AGENT_NAMES = ("react", "plan_solve", "reflection")
+
+# 默认工具结果的缓存时间（秒），0 表示不缓存
+DEFAULT_TOOL_CACHE_TTL = float(os.getenv("TOOL_CACHE_TTL", 600))
+# 热门工具结果在过期前后台刷新，每分钟最多刷新的次数，0 表示不刷新
+DEFAULT_TOOL_REFRESH_PER_MINUTE = int(os.getenv("TOOL_REFRESH_PER_MINUTE", 30))
+# 工具结果超过该token数时，压缩为与问题最相关的句子，0 表示不压缩
+DEFAULT_OBSERVATION_MAX_TOKENS = int(os.getenv("OBSERVATION_MAX_TOKENS", 400))
+# 注册的工具多于该数量时，每一步只把最相关的这些工具放入提示词
+DEFAULT_TOOL_TOP_K = int(os.getenv("TOOL_TOP_K", 8))
+
+# 为 ReAct 智能体启用规则快速路径（命中规则的问题直接调用工具回答，不经过LLM），默认关闭
+DEFAULT_FAST_PATH = os.getenv("REACT_FAST_PATH", "0") != "0"
+
+# 默认注册到 ReAct 智能体的工具: (名称, 描述, 函数)
+DEFAULT_TOOLS = [
+    (
+        "get_weather",
+        "查询指定城市的实时天气。参数说明：\ncity: str，城市名称。",
+        get_weather,
+    ),
+    (
+        "get_attraction",
+        "根据城市和天气搜索推荐的旅游景点。参数说明：\ncity: str，城市名称。weather: str，天气状况。",
+        get_attraction,
+    ),
+    (
+        "google_search",
+        "一个网页搜索引擎。当你需要回答关于时事、事实以及在你的知识库中找不到的信息时，应使用此工具。参数说明：\nquery: str，搜索关键词。",
+        google_search,
+    ),
+]
+
+
+# 城市名中不能出现的时间词与疑问词：含有它们的问题（预报、“今天天气怎么样”等）交给LLM处理
+_NOT_CITY_ZH = "今天|明天|后天|昨天|现在|当前|目前|实时|下周|本周|这周|周末|未来|最近|一下|什么|哪|怎|如何|多少|是|的|这|那|我|你"
+_NOT_CITY_EN = (
+    "today|tonight|tomorrow|yesterday|now|next|this|last|week|weekend|month|"
+    "monday|tuesday|wednesday|thursday|friday|saturday|sunday|the|my|here|there|in|on|at|for|during"
+)
+_CITY_WORD_EN = rf"(?!(?:{_NOT_CITY_EN})\b)[a-z][a-z.'-]*"
+
+# ReAct 的快速路径规则，按顺序匹配；工具报错时仍交给LLM处理
+DEFAULT_RULES = [
+    Rule(
+        r"^\s*(?:请|帮我)?(?:查(?:一下|询)?)?"
+        rf"(?P<city>(?:(?!{_NOT_CITY_ZH})[\u4e00-\u9fff]){{2,10}}?)"
+        r"(?:今天|现在|当前|目前|实时)?的?(?:天气|气温)(?:怎么样|如何)?[?？。!！]?\s*$",
+        tool="get_weather",
+        tool_args={"city": "{city}"},
+        name="weather",
+        accept=is_cacheable,
+    ),
+    Rule(
+        r"^\s*(?:what(?:'s| is) the )?weather (?:like )?in "
+        rf"(?P<city>{_CITY_WORD_EN}(?: {_CITY_WORD_EN}){{0,2}})"
+        r"\s*(?:today|now)?\s*\??\s*$",
+        tool="get_weather",
+        tool_args={"city": "{city}"},
+        name="weather_en",
+        accept=is_cacheable,
+    ),
+]
+
+
+def create_rule_engine(tool_executor: ToolExecutor) -> RuleEngine:
+    """用默认规则创建规则引擎，规则中的工具通过 tool_executor 调用（共享其结果缓存）。"""
+    return RuleEngine(DEFAULT_RULES, tool_executor=tool_executor)
+
+
+def create_tool_executor() -> ToolExecutor:
+    """创建并注册默认工具的工具执行器；启用了缓存与提前刷新时，同时启动后台刷新线程（tool_executor.refresher）。"""
+    compressor = ObservationCompressor(DEFAULT_OBSERVATION_MAX_TOKENS) if DEFAULT_OBSERVATION_MAX_TOKENS > 0 else None
+    tool_executor = ToolExecutor(compressor=compressor, retriever=ToolRetriever(top_k=DEFAULT_TOOL_TOP_K))
+    for name, description, func in DEFAULT_TOOLS:
+        tool_executor.registerTool(name=name, description=description, func=func, cache_ttl=DEFAULT_TOOL_CACHE_TTL)
+    if DEFAULT_TOOL_CACHE_TTL > 0 and DEFAULT_TOOL_REFRESH_PER_MINUTE > 0:
+        tool_executor.refresher = CacheRefresher(tool_executor, max_per_minute=DEFAULT_TOOL_REFRESH_PER_MINUTE).start()
+    return tool_executor
+
+
+def create_llm_client():
+    """
+    配置了 LLM_ENDPOINTS 时，在多个服务之间负载均衡；否则使用单个服务（LLM_MODEL_ID 等环境变量）。
+    配置了 LLM_CASCADE_MODEL 时，先用该（小）模型，输出未通过校验时才升级到上述客户端。
+    配置了 LLM_ROLES 时，再按角色路由到各自的模型，未配置的角色使用上述默认客户端。
+    """
+    llm_client = LoadBalancedLLM.from_env() or HelloAgentsLLM()
+    cascade_model = os.getenv("LLM_CASCADE_MODEL")
+    if cascade_model:
+        llm_client = CascadeLLM([HelloAgentsLLM(model=cascade_model), llm_client])
+    return ModelRouter.from_env(llm_client)
+
+
+def create_agent(name: str, llm_client=None, tool_executor: ToolExecutor = None) -> Any:
+    """
+    按名称创建智能体。llm_client 与 tool_executor 可以在多个智能体之间共享。
+    """
+    if name not in AGENT_NAMES:
+        raise ValueError(f"未知的智能体 '{name}'，可选值: {', '.join(AGENT_NAMES)}")
+    llm_client = llm_client or create_llm_client()
+    if name == "react":
+        tool_executor = tool_executor or create_tool_executor()
+        rule_engine = create_rule_engine(tool_executor) if DEFAULT_FAST_PATH else None
+        return ReActAgent(llm_client, tool_executor, rule_engine=rule_engine)
+    if name == "plan_solve":
+        return PlanAndSolveAgent(llm_client)
+    return ReflectionAgent(llm_client)
+
+
+def create_agents(llm_client=None) -> Dict[str, Any]:
+    """创建全部智能体，它们共享同一个LLM客户端。"""
+    llm_client = llm_client or create_llm_client()
+    tool_executor = create_tool_executor()
+    return {name: create_agent(name, llm_client, tool_executor) for name in AGENT_NAMES}
@@ -0,0 +1,176 @@
+'''
+Author: wenjinwang 314984354@qq.com
+Date: 2026-10-19 08:59:53
+LastEditors: wenjinwang 314984354@qq.com
+LastEditTime: 2026-10-19 09:47:23
+FilePath: /hello-agents/server/api.py
+Description: 基于 FastAPI 的智能体HTTP服务，支持SSE流式输出
+
+启动方式: uvicorn server.api:app --host 0.0.0.0 --port 8000
+'''
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+
+from agents.events import AgentEvent, FINAL_ANSWER
+from agents.run_context import RunContext
+from models.env import load_env
+from server.agent_factory import AGENT_NAMES, create_agents
+from telemetry.event_sink import emit
+from telemetry.metrics import CONTENT_TYPE, REGISTRY
+
+load_env()
+
+# 单次运行的默认超时时间（秒）与同时运行的最大数量
+DEFAULT_RUN_TIMEOUT = float(os.getenv("API_RUN_TIMEOUT", 120))
+MAX_CONCURRENT_RUNS = int(os.getenv("API_MAX_CONCURRENT_RUNS", 64))
+
+
+class RunRequest(BaseModel):
+    input: str
+    stream: bool = True
+    timeout: Optional[float] = None
+
+
+class AgentService:
+    """持有共享的智能体实例；智能体是可重入的，因此所有请求共用同一组实例。"""
+
+    def __init__(self):
+        self.agents: Dict[str, Any] = {}
+        self.error: Optional[str] = None
+
+    def start(self):
+        try:
+            self.agents = create_agents()
+        except Exception as e:
+            self.error = str(e)
+            emit("server.init_failed", f"❌ 智能体初始化失败: {e}", error=str(e))
+
+    @property
+    def ready(self) -> bool:
+        return bool(self.agents)
+
+
+service = AgentService()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 智能体在线程池中同步运行，线程池的大小决定了同时运行的数量
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=MAX_CONCURRENT_RUNS))
+    service.start()
+    yield
+
+
+app = FastAPI(title="Hello Agents API", lifespan=lifespan)
+
+
+def _format_sse(event: AgentEvent) -> str:
+    payload = json.dumps(event.to_dict(), ensure_ascii=False, default=str)
+    return f"event: {event.type}\ndata: {payload}\n\n"
+
+
+async def _events_with_deadline(agent_name: str, context: RunContext, timeout: float) -> AsyncIterator[AgentEvent]:
+    """
+    以异步方式产出一次运行的事件，超过 timeout 时抛出 asyncio.TimeoutError。
+    无论正常结束、超时还是客户端断开，结束时都会取消 context，
+    使线程中的智能体在下一个事件边界停止，并中止正在进行的LLM流式调用。
+    """
+    agent = service.agents[agent_name]
+    deadline = time.monotonic() + timeout
+    events = agent.arun_events(context.question, context)
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            try:
+                event = await asyncio.wait_for(events.__anext__(), remaining)
+            except StopAsyncIteration:
+                return
+            yield event
+    finally:
+        context.cancel()
+        await events.aclose()
+
+
+@app.get("/healthz")
+async def healthz():
+    """存活检查：进程能够响应即可。"""
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz():
+    """就绪检查：智能体（及其LLM客户端）初始化成功后才可以接收流量。"""
+    if not service.ready:
+        return JSONResponse(status_code=503, content={"status": "not_ready", "error": service.error})
+    return {"status": "ready", "agents": list(service.agents)}
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus 文本格式的指标。"""
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
+@app.post("/v1/agents/{agent_name}/runs")
+async def create_run(agent_name: str, body: RunRequest, request: Request):
+    """
+    运行一个智能体。stream=true 时以 text/event-stream 返回事件流（event 字段为事件类型），
+    否则等待运行结束后返回最终答案。
+    """
+    if agent_name not in AGENT_NAMES:
+        raise HTTPException(status_code=404, detail=f"未知的智能体 '{agent_name}'")
+    if not service.ready:
+        raise HTTPException(status_code=503, detail=service.error or "服务尚未就绪")
+
+    context = RunContext(body.input)
+    timeout = body.timeout or DEFAULT_RUN_TIMEOUT
+
+    if body.stream:
+        async def event_stream():
+            try:
+                async for event in _events_with_deadline(agent_name, context, timeout):
+                    if await request.is_disconnected():
+                        break
+                    yield _format_sse(event)
+            except asyncio.TimeoutError:
+                yield _format_sse(AgentEvent("error", f"运行超时（{timeout} 秒），已取消。", context.step, {"timeout": True}))
+
+        return StreamingResponse(
+            event_stream(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Run-Id": context.run_id},
+        )
+
+    started = time.monotonic()
+    final_event = None
+    try:
+        async for event in _events_with_deadline(agent_name, context, timeout):
+            if event.type == FINAL_ANSWER:
+                final_event = event
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail=f"运行超时（{timeout} 秒），已取消。")
+
+    return JSONResponse(content=json.loads(json.dumps({
+        "run_id": context.run_id,
+        "agent": agent_name,
+        "output": final_event.content if final_event else None,
+        "data": final_event.data if final_event else {},
+        "elapsed": round(time.monotonic() - started, 3),
+    }, ensure_ascii=False, default=str)))
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("API_PORT", 8000)))
@@ -0,0 +1,337 @@
+'''
+Author: wenjinwang 314984354@qq.com
+Date: 2026-10-19 09:01:50
+LastEditors: wenjinwang 314984354@qq.com
+LastEditTime: 2026-10-19 09:46:20
+FilePath: /hello-agents/server/worker_pool.py
+Description: 多进程智能体工作池：本地任务队列 + 事件流回传
+
+'''
+import importlib
+import itertools
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+from agents.events import AgentEvent, ERROR, FINAL_ANSWER
+from telemetry.event_sink import emit
+
+
+# 工作进程发回的控制消息
+_READY = "__ready__"
+_FAILED = "__failed__"
+_DONE = "__done__"
+
+
+def _load_object(spec: str):
+    """按 'package.module:attr' 的形式加载对象。"""
+    module_name, _, attr = spec.partition(":")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+def _worker_main(worker_id: int, slot: int, current_jobs, job_queue, result_queue, llm_factory: Optional[str], llm_kwargs: Dict[str, Any], quiet: bool):
+    """
+    工作进程入口：只构建一次LLM客户端与全部智能体（常驻、预热），
+    然后不断从任务队列取任务，把事件逐个发回结果队列，直到收到 None。
+    正在运行的任务编号直接写入共享数组 current_jobs[slot]（0 表示空闲）：结果队列是异步发送的，
+    进程被杀死时尚未发出的消息会丢失，共享内存则让主进程总能知道它死时在运行哪个任务。
+    """
+    from server.agent_factory import create_agents
+    from telemetry.event_sink import NullSink, set_sink
+
+    if quiet:
+        set_sink(NullSink())
+        sys.stdout = open(os.devnull, "w")
+
+    try:
+        llm_client = _load_object(llm_factory)(**llm_kwargs) if llm_factory else None
+        agents = create_agents(llm_client)
+    except Exception as e:
+        result_queue.put((_FAILED, (worker_id, f"{type(e).__name__}: {e}")))
+        return
+    result_queue.put((_READY, worker_id))
+
+    while True:
+        job = job_queue.get()
+        if job is None:
+            break
+        job_id, agent_name, question = job
+        current_jobs[slot] = job_id
+        try:
+            for event in agents[agent_name].run_events(question):
+                result_queue.put((job_id, event))
+        except Exception as e:
+            result_queue.put((job_id, AgentEvent(ERROR, f"工作进程 {worker_id} 运行出错: {e}")))
+            result_queue.put((job_id, AgentEvent(FINAL_ANSWER, None, data={"error": str(e)})))
+        result_queue.put((job_id, _DONE))
+        current_jobs[slot] = 0
+
+
+class JobHandle:
+    """
+    一次提交的运行。可以迭代获取实时回传的事件，也可以调用 result() 等待最终答案。
+    """
+
+    def __init__(self, job_id: int, agent_name: str, question: str):
+        self.job_id = job_id
+        self.agent_name = agent_name
+        self.question = question
+        self._events: "queue.Queue" = queue.Queue()
+        self._final: Optional[AgentEvent] = None
+        self._finished = threading.Event()
+
+    def _put(self, item):
+        if isinstance(item, AgentEvent) and item.type == FINAL_ANSWER:
+            self._final = item
+        if item is _DONE:
+            self._finished.set()
+        self._events.put(item)
+
+    def __iter__(self) -> Iterator[AgentEvent]:
+        while True:
+            item = self._events.get()
+            if item is _DONE:
+                return
+            yield item
+
+    def result(self, timeout: Optional[float] = None) -> Any:
+        """等待运行结束并返回最终答案。"""
+        if not self._finished.wait(timeout):
+            raise TimeoutError(f"任务 {self.job_id} 在 {timeout} 秒内未完成")
+        return self._final.content if self._final else None
+
+    @property
+    def done(self) -> bool:
+        return self._finished.is_set()
+
+
+class AgentWorkerPool:
+    """
+    把 ReAct / Plan-and-Solve / Reflection 的运行分发到 N 个工作进程上。
+    这是供脚本与压测使用的库组件，HTTP服务与Web UI在进程内运行智能体，并不经过工作池。
+    - 每个工作进程常驻，只在启动时构建一次LLM客户端与智能体；
+    - 任务通过本地队列分发，事件通过结果队列实时回传给提交方；
+    - 工作进程在运行中意外退出（OOM、段错误等）时，它正在运行的任务以错误结束，并补充一个新的工作进程；
+    - shutdown(drain=True) 会先停止接收新任务，等队列中的任务全部完成后再退出。
+
+    用法:
+        with AgentWorkerPool(num_workers=4) as pool:
+            handle = pool.submit("react", "北京今天天气怎么样？")
+            for event in handle:
+                ...
+    """
+
+    def __init__(
+        self,
+        num_workers: Optional[int] = None,
+        llm_factory: Optional[str] = None,
+        llm_kwargs: Optional[Dict[str, Any]] = None,
+        quiet: bool = True,
+        ready_timeout: Optional[float] = 120.0,
+        monitor_interval: float = 1.0,
+    ):
+        """
+        参数:
+        - num_workers: 工作进程数，默认为CPU核数。
+        - llm_factory: 工作进程中构建LLM客户端的 'module:attr'，例如 'models.fake_llm:FakeLLM'；
+          默认按环境变量创建（配置了 LLM_ENDPOINTS 时为 LoadBalancedLLM，否则为 HelloAgentsLLM）。
+        - llm_kwargs: 传给 llm_factory 的参数，需要可以被 pickle。
+        - quiet: 是否丢弃工作进程的标准输出。
+        - ready_timeout: start() 等待所有工作进程完成预热的最长时间（秒），None 表示一直等待。
+        - monitor_interval: 分发线程检查工作进程是否存活的间隔（秒）。
+        """
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.llm_factory = llm_factory
+        self.llm_kwargs = llm_kwargs or {}
+        self.quiet = quiet
+        self.ready_timeout = ready_timeout
+        self.monitor_interval = monitor_interval
+        self._mp = multiprocessing.get_context("spawn")
+        self._job_queue = None
+        self._result_queue = None
+        self._workers = []
+        # 与 _workers 一一对应的工作进程编号；补充的工作进程使用新的编号，迟到的旧消息不会被误认
+        self._worker_ids: List[int] = []
+        self._next_worker_id = itertools.count()
+        self._ready_workers: Set[int] = set()
+        # 每个工作进程位置上正在运行的任务编号，由工作进程写入
+        self._current_jobs = None
+        self._closing = False
+        # 保护工作进程列表：关闭时不再补充新的工作进程
+        self._workers_lock = threading.Lock()
+        self._jobs: Dict[int, JobHandle] = {}
+        self._jobs_lock = threading.Lock()
+        self._job_ids = itertools.count(1)
+        self._ready = threading.Semaphore(0)
+        self._startup_errors: Dict[int, str] = {}
+        self._startup_failed = threading.Event()
+        self._dispatcher: Optional[threading.Thread] = None
+        self._accepting = False
+
+    def start(self, wait_ready: bool = True) -> "AgentWorkerPool":
+        """
+        启动工作进程与结果分发线程；wait_ready 为 True 时等待所有工作进程完成预热。
+        有工作进程在预热时出错、意外退出或超过 ready_timeout 仍未就绪时，关闭工作池并抛出 RuntimeError。
+        """
+        self._job_queue = self._mp.Queue()
+        self._result_queue = self._mp.Queue()
+        self._closing = False
+        self._current_jobs = self._mp.Array("q", self.num_workers, lock=False)
+        for slot in range(self.num_workers):
+            worker_id, worker = self._spawn(slot)
+            self._worker_ids.append(worker_id)
+            self._workers.append(worker)
+
+        self._dispatcher = threading.Thread(target=self._dispatch_results, daemon=True)
+        self._dispatcher.start()
+        if wait_ready:
+            try:
+                self._wait_ready()
+            except RuntimeError:
+                self.shutdown(drain=False)
+                raise
+        self._accepting = True
+        return self
+
+    def _spawn(self, slot: int):
+        """在第 slot 个位置上启动一个工作进程，返回 (编号, 进程)。"""
+        worker_id = next(self._next_worker_id)
+        self._current_jobs[slot] = 0
+        worker = self._mp.Process(
+            target=_worker_main,
+            args=(worker_id, slot, self._current_jobs, self._job_queue, self._result_queue, self.llm_factory, self.llm_kwargs, self.quiet),
+            daemon=True,
+        )
+        worker.start()
+        return worker_id, worker
+
+    def _wait_ready(self):
+        """等待所有工作进程发回就绪消息，期间检查工作进程是否已经失败或退出。"""
+        deadline = None if self.ready_timeout is None else time.monotonic() + self.ready_timeout
+        ready = 0
+        while ready < self.num_workers:
+            if self._ready.acquire(timeout=0.5):
+                ready += 1
+                continue
+            dead = [(worker_id, worker) for worker_id, worker in zip(self._worker_ids, self._workers) if not worker.is_alive()]
+            # 出错的工作进程先发回错误再退出，给分发线程一点时间取到它
+            if self._startup_errors or (dead and self._startup_failed.wait(1.0)):
+                worker_id, error = next(iter(self._startup_errors.items()))
+                raise RuntimeError(f"工作进程 {worker_id} 初始化失败: {error}")
+            if dead:
+                raise RuntimeError(f"工作进程 {dead[0][0]} 在就绪前退出，退出码 {dead[0][1].exitcode}")
+            if deadline is not None and time.monotonic() > deadline:
+                raise RuntimeError(f"工作进程在 {self.ready_timeout} 秒内未全部就绪（{ready}/{self.num_workers}）")
+
+    def submit(self, agent_name: str, question: str) -> JobHandle:
+        """提交一次运行，立即返回 JobHandle。"""
+        if not self._accepting:
+            raise RuntimeError("工作池未启动或正在关闭，不再接收新任务。")
+        handle = JobHandle(next(self._job_ids), agent_name, question)
+        with self._jobs_lock:
+            self._jobs[handle.job_id] = handle
+        self._job_queue.put((handle.job_id, agent_name, question))
+        return handle
+
+    def _dispatch_results(self):
+        """把工作进程回传的事件路由到对应的 JobHandle，并定期检查工作进程是否存活。"""
+        next_check = time.monotonic() + self.monitor_interval
+        while True:
+            try:
+                message = self._result_queue.get(timeout=self.monitor_interval)
+            except queue.Empty:
+                message = ()
+            if time.monotonic() >= next_check:
+                self._check_workers()
+                next_check = time.monotonic() + self.monitor_interval
+            if message is None:
+                break
+            if not message:
+                continue
+            key, item = message
+            if key == _READY:
+                self._ready_workers.add(item)
+                self._ready.release()
+                continue
+            if key == _FAILED:
+                worker_id, error = item
+                self._startup_errors[worker_id] = error
+                self._startup_failed.set()
+                continue
+            with self._jobs_lock:
+                handle = self._jobs.get(key)
+                if item == _DONE:
+                    self._jobs.pop(key, None)
+            if handle is not None:
+                handle._put(_DONE if item == _DONE else item)
+
+    def _check_workers(self):
+        """
+        找出已经就绪、随后意外退出的工作进程：以错误结束它正在运行的任务，并启动一个新的工作进程代替它。
+        未就绪就退出的工作进程不会被补充，避免初始化失败时反复重启。
+        """
+        with self._workers_lock:
+            if not self._closing:
+                self._replace_dead_workers()
+
+    def _replace_dead_workers(self):
+        for slot, (worker_id, worker) in enumerate(zip(list(self._worker_ids), list(self._workers))):
+            if worker.is_alive() or worker_id not in self._ready_workers:
+                continue
+            self._ready_workers.discard(worker_id)
+            job_id = self._current_jobs[slot] or None
+            if job_id is not None:
+                self._fail_job(job_id, f"工作进程 {worker_id} 在运行任务时意外退出，退出码 {worker.exitcode}。")
+            new_id, new_worker = self._spawn(slot)
+            self._worker_ids[slot], self._workers[slot] = new_id, new_worker
+            emit("worker.respawned", f"⚠️ 工作进程 {worker_id} 意外退出（退出码 {worker.exitcode}），已启动工作进程 {new_id} 代替。",
+                 worker_id=worker_id, exitcode=worker.exitcode, job_id=job_id, new_worker_id=new_id)
+
+    def _fail_job(self, job_id: int, message: str):
+        with self._jobs_lock:
+            handle = self._jobs.pop(job_id, None)
+        if handle is not None:
+            handle._put(AgentEvent(ERROR, message))
+            handle._put(AgentEvent(FINAL_ANSWER, None, data={"error": message}))
+            handle._put(_DONE)
+
+    def shutdown(self, drain: bool = True, timeout: Optional[float] = None):
+        """
+        关闭工作池。drain 为 True 时，队列中已提交的任务会全部完成后工作进程才退出；
+        否则立即终止工作进程，未完成的任务以错误结束。
+        """
+        self._accepting = False
+        with self._workers_lock:
+            self._closing = True
+        if drain:
+            # 哨兵排在所有已提交任务之后，每个工作进程取到一个哨兵后退出
+            for _ in self._workers:
+                self._job_queue.put(None)
+            for worker in self._workers:
+                worker.join(timeout)
+        for worker in self._workers:
+            if worker.is_alive():
+                worker.terminate()
+                worker.join()
+
+        self._result_queue.put(None)
+        self._dispatcher.join()
+        with self._jobs_lock:
+            pending, self._jobs = list(self._jobs.values()), {}
+        for handle in pending:
+            handle._put(AgentEvent(ERROR, "工作池已关闭，任务未完成。"))
+            handle._put(AgentEvent(FINAL_ANSWER, None, data={"error": "shutdown"}))
+            handle._put(_DONE)
+        self._workers = []
+        self._worker_ids = []
+        self._ready_workers.clear()
+
+    def __enter__(self) -> "AgentWorkerPool":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown(drain=exc_type is None)
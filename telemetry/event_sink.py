@@ -0,0 +1,168 @@
+'''
+Author: wenjinwang 314984354@qq.com
+Date: 2026-10-19 09:05:09
+LastEditors: wenjinwang 314984354@qq.com
+LastEditTime: 2026-10-19 09:47:23
+FilePath: /hello-agents/telemetry/event_sink.py
+Description: 结构化的运行日志事件：可替换的输出目标（丢弃 / 控制台 / 后台线程批量写入JSONL）
+
+'''
+import atexit
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, TextIO
+
+from models.env import load_env
+
+load_env()
+
+# 流式输出的增量文本与一次LLM输出的结束，控制台按原样拼接输出
+LLM_TOKEN = "llm.token"
+LLM_END = "llm.end"
+
+
+class EventSink:
+    """日志事件的输出目标。kind 为事件类型（如 'react.thought'），message 为给人看的文本，fields 为结构化字段。"""
+
+    def emit(self, kind: str, message: str = "", **fields: Any):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+
+class NullSink(EventSink):
+    """丢弃所有事件，用于压测与服务端。"""
+
+    def emit(self, kind: str, message: str = "", **fields: Any):
+        pass
+
+
+class ConsoleSink(EventSink):
+    """
+    把事件的 message 打印到控制台，效果与原来的 print 一致。
+    流式token不逐个 flush，而是在一次LLM输出结束时统一 flush，避免每个token一次系统调用。
+    """
+
+    def __init__(self, stream: Optional[TextIO] = None):
+        self.stream = stream
+        self._lock = threading.Lock()
+
+    def emit(self, kind: str, message: str = "", **fields: Any):
+        stream = self.stream or sys.stdout
+        with self._lock:
+            if kind == LLM_TOKEN:
+                stream.write(message)
+            elif kind == LLM_END:
+                stream.write("\n")
+                stream.flush()
+            else:
+                stream.write(f"{message}\n")
+
+    def flush(self):
+        (self.stream or sys.stdout).flush()
+
+
+class JsonlSink(EventSink):
+    """
+    把事件写入JSONL文件。emit 只把事件放入内存队列，由后台线程批量写入，不阻塞调用方。
+    include_tokens 为 False 时不记录逐token事件（一次LLM输出的全文见 llm.end 事件）。
+    """
+
+    def __init__(self, path: str, include_tokens: bool = False, flush_interval: float = 0.5, max_batch: int = 1024):
+        self.path = path
+        self.include_tokens = include_tokens
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._closed = threading.Event()
+        self._flushed = threading.Condition()
+        self._pending = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        self._writer = threading.Thread(target=self._write_loop, name="jsonl-event-sink", daemon=True)
+        self._writer.start()
+
+    def emit(self, kind: str, message: str = "", **fields: Any):
+        if kind == LLM_TOKEN and not self.include_tokens:
+            return
+        event = {"ts": time.time(), "kind": kind, "message": message, **fields}
+        with self._flushed:
+            self._pending += 1
+        self._queue.put(event)
+
+    def _write_loop(self):
+        while not (self._closed.is_set() and self._queue.empty()):
+            try:
+                batch: List[Dict[str, Any]] = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._file.write("".join(json.dumps(event, ensure_ascii=False, default=str) + "\n" for event in batch))
+            self._file.flush()
+            with self._flushed:
+                self._pending -= len(batch)
+                self._flushed.notify_all()
+
+    def flush(self, timeout: Optional[float] = None):
+        """等待已发出的事件全部写入文件。"""
+        with self._flushed:
+            self._flushed.wait_for(lambda: self._pending == 0, timeout)
+
+    def close(self):
+        if self._closed.is_set():
+            return
+        self.flush()
+        self._closed.set()
+        self._writer.join()
+        self._file.close()
+
+
+def create_sink(spec: Optional[str]) -> EventSink:
+    """
+    按配置创建输出目标: 'console'（默认）、'null'、'jsonl:<路径>'（可加 '+tokens' 后缀以记录逐token事件）。
+    """
+    spec = (spec or "console").strip()
+    if spec == "null":
+        return NullSink()
+    if spec.startswith("jsonl:"):
+        path = spec[len("jsonl:"):]
+        include_tokens = path.endswith("+tokens")
+        return JsonlSink(path[:-len("+tokens")] if include_tokens else path, include_tokens=include_tokens)
+    if spec == "console":
+        return ConsoleSink()
+    raise ValueError(f"未知的事件输出目标 '{spec}'，可选值: console、null、jsonl:<路径>")
+
+
+_sink: EventSink = create_sink(os.getenv("HELLO_AGENTS_EVENT_SINK"))
+
+
+def get_sink() -> EventSink:
+    return _sink
+
+
+def set_sink(sink: EventSink) -> EventSink:
+    """替换全局的输出目标，返回原来的输出目标（调用方负责关闭它）。"""
+    global _sink
+    previous, _sink = _sink, sink
+    return previous
+
+
+def emit(kind: str, message: str = "", **fields: Any):
+    """向全局输出目标发出一个事件。"""
+    _sink.emit(kind, message, **fields)
+
+
+atexit.register(lambda: _sink.close())
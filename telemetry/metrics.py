@@ -0,0 +1,363 @@
+'''
+Author: wenjinwang 314984354@qq.com
+Date: 2026-10-19 09:09:13
+LastEditors: wenjinwang 314984354@qq.com
+LastEditTime: 2026-10-19 09:34:52
+FilePath: /hello-agents/telemetry/metrics.py
+Description: Prometheus 风格的指标：计数器、直方图、仪表盘，以及文本格式的 /metrics 端点
+
+计数器与直方图按线程分片累加：热路径上只写本线程的分片，不加锁；只有导出时才合并所有分片。
+'''
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+# 默认的延迟分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# 直方图额外导出的估算分位数
+DEFAULT_QUANTILES = (0.5, 0.95, 0.99)
+
+LabelKey = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    """指标的公共部分：名称、说明与标签。"""
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, object]) -> LabelKey:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+
+class _Sharded(_Metric):
+    """
+    按线程分片的指标。每个线程第一次写入时登记自己的分片，之后的写入都不加锁。
+    线程退出后，它的分片会在下一次导出时并入 _retired。
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._local = threading.local()
+        self._shards: List[Tuple[threading.Thread, dict]] = []
+        self._retired: dict = {}
+        self._lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+            return shard
+
+    def _merge(self, into: dict, shard: dict):
+        raise NotImplementedError
+
+    def _collect(self) -> dict:
+        """合并所有分片，返回 {标签值: 累计值}。"""
+        with self._lock:
+            alive = []
+            for thread, shard in self._shards:
+                if thread.is_alive():
+                    alive.append((thread, shard))
+                else:
+                    self._merge(self._retired, shard)
+            self._shards = alive
+            total: dict = {}
+            self._merge(total, self._retired)
+            for _, shard in alive:
+                self._merge(total, shard)
+        return total
+
+
+class Counter(_Sharded):
+    """只增不减的计数器。"""
+    type_name = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: object):
+        shard = self._shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0.0) + amount
+
+    def _merge(self, into: dict, shard: dict):
+        for key, value in list(shard.items()):
+            into[key] = into.get(key, 0.0) + value
+
+    def value(self, **labels: object) -> float:
+        return self._collect().get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for key, value in sorted(self._collect().items()):
+            lines.append(f"{self.name}_total{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Sharded):
+    """
+    分桶直方图，导出 _bucket / _sum / _count；
+    另外导出一个 <name>_quantile 仪表盘族，给出按分桶线性插值估算的 p50 / p95 / p99，方便直接查看。
+    """
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS, quantiles: Sequence[float] = DEFAULT_QUANTILES):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.quantiles = tuple(quantiles)
+
+    def observe(self, value: float, **labels: object):
+        shard = self._shard()
+        key = self._key(labels)
+        state = shard.get(key)
+        if state is None:
+            # 各分桶的计数（最后一个为 +Inf），以及总和
+            state = shard[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        state[bisect.bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    @contextmanager
+    def time(self, **labels: object) -> Iterator[None]:
+        """记录 with 块的耗时（秒）。"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _merge(self, into: dict, shard: dict):
+        for key, state in list(shard.items()):
+            merged = into.get(key)
+            if merged is None:
+                into[key] = list(state)
+            else:
+                for i, value in enumerate(state):
+                    merged[i] += value
+
+    def quantile(self, q: float, **labels: object) -> Optional[float]:
+        state = self._collect().get(self._key(labels))
+        return self._estimate(state, q) if state else None
+
+    def _estimate(self, state: list, q: float) -> float:
+        counts = state[:-1]
+        count = sum(counts)
+        if not count:
+            return 0.0
+        rank = q * count
+        cumulative = 0
+        for i, bucket_count in enumerate(counts):
+            if cumulative + bucket_count >= rank and bucket_count:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.buckets[-1]
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        collected = sorted(self._collect().items())
+        for key, state in collected:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), state[:-1]):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(state[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        if self.quantiles and collected:
+            lines.append(f"# HELP {self.name}_quantile {self.documentation}（按分桶估算的分位数）")
+            lines.append(f"# TYPE {self.name}_quantile gauge")
+            for key, state in collected:
+                for q in self.quantiles:
+                    label = f'quantile="{q}"'
+                    lines.append(f"{self.name}_quantile{_format_labels(self.labelnames, key, label)} {_format_value(round(self._estimate(state, q), 6))}")
+        return lines
+
+
+class Gauge(_Metric):
+    """可增可减的仪表盘。更新频率低，直接加锁；也可以用 set_function 在导出时再取值。"""
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelKey, float] = {}
+        self._functions: Dict[LabelKey, Callable[[], float]] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels: object):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: object):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: object):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], float], **labels: object):
+        with self._lock:
+            self._functions[self._key(labels)] = function
+
+    def value(self, **labels: object) -> float:
+        key = self._key(labels)
+        with self._lock:
+            function = self._functions.get(key)
+            return function() if function else self._values.get(key, 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+            functions = dict(self._functions)
+        for key, function in functions.items():
+            values[key] = function()
+        lines = super().render()
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标的注册表；同名指标只会创建一次。"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), **kwargs) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, **kwargs)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def render(self) -> str:
+        """以 Prometheus 文本格式（0.0.4）导出所有指标。"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# --- 内置指标 ---
+LLM_REQUESTS = REGISTRY.counter("hello_agents_llm_requests", "LLM调用次数", ("model", "status"))
+LLM_LATENCY = REGISTRY.histogram("hello_agents_llm_latency_seconds", "LLM调用的总耗时（秒）", ("model",))
+LLM_TTFT = REGISTRY.histogram("hello_agents_llm_ttft_seconds", "LLM调用的首个token时间（秒）", ("model",))
+LLM_TOKENS = REGISTRY.counter("hello_agents_llm_tokens", "LLM的token用量（估算）", ("model", "kind"))
+LLM_TOKENS_PER_SECOND = REGISTRY.histogram(
+    "hello_agents_llm_tokens_per_second", "LLM的输出速度（token/秒，估算）", ("model",),
+    buckets=(1, 5, 10, 20, 40, 80, 160, 320, 640),
+)
+LLM_ROLE_LATENCY = REGISTRY.histogram("hello_agents_llm_role_latency_seconds", "各角色LLM调用的总耗时（秒）", ("role", "model"))
+LLM_ROLE_TOKENS = REGISTRY.counter("hello_agents_llm_role_tokens", "各角色的token用量（估算）", ("role", "kind"))
+LLM_CASCADE = REGISTRY.counter("hello_agents_llm_cascade", "级联调用中各层模型的结果（accepted / rejected / errors）", ("model", "result"))
+LLM_CACHE = REGISTRY.counter("hello_agents_llm_cache", "LLM响应缓存的命中情况", ("model", "result"))
+LLM_RETRIES = REGISTRY.counter("hello_agents_llm_retries", "LLM调用的重试次数", ("model",))
+TOOL_CALLS = REGISTRY.counter("hello_agents_tool_calls", "工具调用次数", ("tool", "status"))
+TOOL_LATENCY = REGISTRY.histogram("hello_agents_tool_latency_seconds", "工具调用的耗时（秒）", ("tool",))
+TOOL_CACHE = REGISTRY.counter("hello_agents_tool_cache", "工具结果缓存的命中情况", ("tool", "result"))
+TOOL_REFRESHES = REGISTRY.counter("hello_agents_tool_refreshes", "热门工具结果在过期前的后台刷新次数", ("tool", "status"))
+AGENT_RUNS = REGISTRY.counter("hello_agents_agent_runs", "智能体运行次数", ("agent", "status"))
+AGENT_RUN_LATENCY = REGISTRY.histogram("hello_agents_agent_run_latency_seconds", "智能体单次运行的耗时（秒）", ("agent",))
+ACTIVE_RUNS = REGISTRY.gauge("hello_agents_active_runs", "正在进行的智能体运行数", ("agent",))
+ACTIVE_SESSIONS = REGISTRY.gauge("hello_agents_active_sessions", "Web UI 的活跃会话数", ("app",))
+
+
+def observe_llm_call(model: Optional[str], seconds: float, ttft: Optional[float] = None, prompt_tokens: int = 0, completion_tokens: int = 0, status: str = "ok"):
+    """记录一次LLM调用的结果；status 为 ok / error / cancelled。"""
+    model = model or "unknown"
+    LLM_REQUESTS.inc(model=model, status=status)
+    if status != "ok":
+        return
+    LLM_LATENCY.observe(seconds, model=model)
+    LLM_TOKENS.inc(prompt_tokens, model=model, kind="prompt")
+    LLM_TOKENS.inc(completion_tokens, model=model, kind="completion")
+    if ttft is not None:
+        LLM_TTFT.observe(ttft, model=model)
+        generation = seconds - ttft
+        if generation > 0 and completion_tokens:
+            LLM_TOKENS_PER_SECOND.observe(completion_tokens / generation, model=model)
+
+
+@contextmanager
+def track_run(agent: str) -> Iterator[None]:
+    """记录一次智能体运行的耗时、状态与并发数。生成器被提前关闭时记为 cancelled。"""
+    ACTIVE_RUNS.inc(agent=agent)
+    started = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except GeneratorExit:
+        status = "cancelled"
+        raise
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        ACTIVE_RUNS.dec(agent=agent)
+        AGENT_RUNS.inc(agent=agent, status=status)
+        AGENT_RUN_LATENCY.observe(time.perf_counter() - started, agent=agent)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int = 9100, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """在后台线程中启动只提供 /metrics 的HTTP服务，用于与 Gradio 应用并行运行。"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
@@ -0,0 +1,200 @@
+'''
+Author: wenjinwang 314984354@qq.com
+Date: 2026-10-19 09:11:24
+LastEditors: wenjinwang 314984354@qq.com
+LastEditTime: 2026-10-19 09:47:23
+FilePath: /hello-agents/telemetry/profiling.py
+Description: 按次运行的性能剖析（cProfile + tracemalloc），以及跨运行的汇总命令行
+
+开启方式（二选一）:
+- 环境变量: HELLO_AGENTS_PROFILE_DIR=profiles [HELLO_AGENTS_PROFILE_EVERY=100] [HELLO_AGENTS_PROFILE_MEMORY=0]
+- 参数: agent.run(question, profile=True)，此时即使未设置采样也会剖析本次运行
+每次被剖析的运行会写入 <目录>/<run_id>/ 下的 cprofile.prof、tracemalloc.snapshot、memory_growth.json 与 meta.json。
+汇总: python -m telemetry.profiling summarize profiles --top 20
+'''
+import argparse
+import cProfile
+import glob
+import io
+import itertools
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from models.env import load_env
+from telemetry.event_sink import emit
+
+load_env()
+
+PROFILE_DIR = os.getenv("HELLO_AGENTS_PROFILE_DIR") or None
+# 每 N 次运行剖析一次，用于在生产环境中采样
+PROFILE_EVERY = max(1, int(os.getenv("HELLO_AGENTS_PROFILE_EVERY", 1)))
+PROFILE_MEMORY = os.getenv("HELLO_AGENTS_PROFILE_MEMORY", "1") != "0"
+DEFAULT_PROFILE_DIR = "profiles"
+
+_run_counter = itertools.count()
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+_tracemalloc_owned = False
+# tracemalloc 快照中忽略的内部帧
+_SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+]
+
+
+def _should_profile(profile: Optional[bool]) -> bool:
+    """profile 参数优先；未指定时按环境变量采样。"""
+    if profile is not None:
+        return profile
+    if not PROFILE_DIR:
+        return False
+    return next(_run_counter) % PROFILE_EVERY == 0
+
+
+def _start_tracemalloc():
+    global _tracemalloc_users, _tracemalloc_owned
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+            _tracemalloc_owned = True
+        _tracemalloc_users += 1
+
+
+def _stop_tracemalloc():
+    global _tracemalloc_users, _tracemalloc_owned
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and _tracemalloc_owned:
+            tracemalloc.stop()
+            _tracemalloc_owned = False
+
+
+@contextmanager
+def profile_run(agent: str, run_id: str, profile: Optional[bool] = None, output_dir: Optional[str] = None) -> Iterator[None]:
+    """
+    剖析 with 块内的一次运行。未被选中时不做任何事。
+    cProfile 只记录当前线程；并发的运行各自使用独立的 Profile，
+    在同一时间只允许一个剖析器的 Python 版本上，后来的运行会跳过CPU剖析，只保留内存快照。
+    """
+    if not _should_profile(profile):
+        yield
+        return
+
+    run_dir = os.path.join(output_dir or PROFILE_DIR or DEFAULT_PROFILE_DIR, run_id)
+    os.makedirs(run_dir, exist_ok=True)
+    profiler: Optional[cProfile.Profile] = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        profiler = None
+    start_snapshot = None
+    if PROFILE_MEMORY:
+        _start_tracemalloc()
+        start_snapshot = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+    started_at = time.time()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        if profiler is not None:
+            profiler.disable()
+        meta: Dict[str, Any] = {
+            "run_id": run_id,
+            "agent": agent,
+            "started_at": started_at,
+            "elapsed": round(elapsed, 6),
+            "cpu_profile": profiler is not None,
+        }
+        end_snapshot = None
+        if start_snapshot is not None:
+            # 先于 dump_stats 拍快照，避免把剖析器自身整理统计数据的分配算进本次运行
+            end_snapshot = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+            meta["traced_memory"], meta["peak_memory"] = tracemalloc.get_traced_memory()
+            _stop_tracemalloc()
+        if profiler is not None:
+            profiler.dump_stats(os.path.join(run_dir, "cprofile.prof"))
+        if end_snapshot is not None:
+            end_snapshot.dump(os.path.join(run_dir, "tracemalloc.snapshot"))
+            growth = [
+                {"site": str(stat.traceback[0]), "size_diff": stat.size_diff, "count_diff": stat.count_diff}
+                for stat in end_snapshot.compare_to(start_snapshot, "lineno")[:50]
+            ]
+            with open(os.path.join(run_dir, "memory_growth.json"), "w", encoding="utf-8") as f:
+                json.dump(growth, f, ensure_ascii=False, indent=2)
+        with open(os.path.join(run_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        emit("profile.saved", f"🔬 运行 {run_id} 的剖析结果已保存到 {run_dir}", run_id=run_id, path=run_dir, elapsed=elapsed)
+
+
+def summarize(profile_dir: str, top: int = 20, sort: str = "cumulative") -> str:
+    """汇总目录下所有运行的剖析结果：最耗时的函数、最大的内存分配位置与每次运行的内存增长。"""
+    run_dirs = sorted(path for path in glob.glob(os.path.join(profile_dir, "*")) if os.path.isdir(path))
+    lines = [f"共 {len(run_dirs)} 次运行: {profile_dir}", ""]
+
+    metas = []
+    for run_dir in run_dirs:
+        meta_path = os.path.join(run_dir, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                metas.append(json.load(f))
+    if metas:
+        lines.append("== 运行 ==")
+        for meta in sorted(metas, key=lambda m: m["elapsed"], reverse=True):
+            peak = f"  峰值内存 {meta['peak_memory'] / 1024:.1f} KiB" if "peak_memory" in meta else ""
+            lines.append(f"{meta['run_id']}  {meta['agent']:<12} 耗时 {meta['elapsed']:.3f}s{peak}")
+        lines.append("")
+
+    profiles = [path for path in (os.path.join(d, "cprofile.prof") for d in run_dirs) if os.path.exists(path)]
+    if profiles:
+        stream = io.StringIO()
+        stats = pstats.Stats(*profiles, stream=stream)
+        stats.strip_dirs().sort_stats(sort).print_stats(top)
+        lines.append(f"== 最耗时的函数（按 {sort} 排序，合并 {len(profiles)} 次运行）==")
+        lines.append(stream.getvalue().strip())
+        lines.append("")
+
+    snapshots = [path for path in (os.path.join(d, "tracemalloc.snapshot") for d in run_dirs) if os.path.exists(path)]
+    if snapshots:
+        sites: Dict[str, List[int]] = {}
+        for path in snapshots:
+            for stat in tracemalloc.Snapshot.load(path).statistics("lineno"):
+                site = sites.setdefault(str(stat.traceback[0]), [0, 0])
+                site[0] += stat.size
+                site[1] += stat.count
+        lines.append(f"== 运行结束时占用内存最多的分配位置（合并 {len(snapshots)} 次运行）==")
+        for site, (size, count) in sorted(sites.items(), key=lambda item: item[1][0], reverse=True)[:top]:
+            lines.append(f"{size / 1024:10.1f} KiB  {count:8d} 块  {site}")
+        lines.append("")
+
+    growth_files = [path for path in (os.path.join(d, "memory_growth.json") for d in run_dirs) if os.path.exists(path)]
+    if growth_files:
+        growth: Dict[str, int] = {}
+        for path in growth_files:
+            with open(path, "r", encoding="utf-8") as f:
+                for item in json.load(f):
+                    growth[item["site"]] = growth.get(item["site"], 0) + item["size_diff"]
+        lines.append("== 运行期间内存增长最多的分配位置（跨运行累计）==")
+        for site, size in sorted(growth.items(), key=lambda item: item[1], reverse=True)[:top]:
+            lines.append(f"{size / 1024:+10.1f} KiB  {site}")
+
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="汇总智能体运行的剖析结果")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    summarize_parser = subparsers.add_parser("summarize", help="汇总一个剖析目录")
+    summarize_parser.add_argument("profile_dir", nargs="?", default=PROFILE_DIR or DEFAULT_PROFILE_DIR)
+    summarize_parser.add_argument("--top", type=int, default=20)
+    summarize_parser.add_argument("--sort", default="cumulative", help="pstats 的排序键，例如 cumulative、tottime")
+    args = parser.parse_args()
+    print(summarize(args.profile_dir, top=args.top, sort=args.sort))
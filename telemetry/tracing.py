@@ -0,0 +1,247 @@
+'''
+Author: wenjinwang 314984354@qq.com
+Date: 2026-10-19 09:07:14
+LastEditors: wenjinwang 314984354@qq.com
+LastEditTime: 2026-10-19 09:47:23
+FilePath: /hello-agents/telemetry/tracing.py
+Description: 轻量的span追踪：嵌套的 run/step/call，导出为JSONL或Chrome trace-event格式
+
+用法:
+    HELLO_AGENTS_TRACE=jsonl:traces/spans.jsonl,chrome:traces/trace.json python examples/...
+    python -m telemetry.tracing chrome traces/spans.jsonl traces/trace.json   # JSONL 转为 Chrome 格式
+Chrome 格式的文件可以在 chrome://tracing 或 https://ui.perfetto.dev 中以火焰图的形式查看。
+'''
+import atexit
+import contextvars
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from models.env import load_env
+from telemetry.event_sink import JsonlSink
+
+
+class Span:
+    """
+    一段计时区间。trace_id 为所属运行的 run_id，parent_id 为外层span的 span_id。
+    用作上下文管理器时，进入时成为当前span，退出时结束并导出。
+    """
+    __slots__ = ("name", "span_id", "parent_id", "trace_id", "start_ns", "end_ns", "thread_id", "attrs", "_parent")
+
+    def __init__(self, name: str, parent: Optional["Span"], trace_id: Optional[str], attrs: Dict[str, Any]):
+        self.name = name
+        self.span_id = next(_span_ids)
+        self._parent = parent
+        self.parent_id = parent.span_id if parent else None
+        self.trace_id = trace_id or (parent.trace_id if parent else None)
+        self.attrs = attrs
+        self.thread_id = threading.get_ident()
+        self.start_ns = time.perf_counter_ns()
+        self.end_ns = None
+
+    def set(self, **attrs: Any):
+        """添加或更新span的属性。"""
+        self.attrs.update(attrs)
+
+    def mark(self, name: str):
+        """记录从span开始到现在经过的毫秒数，例如 mark("ttft") 记录首个token的时间。"""
+        self.attrs[f"{name}_ms"] = (time.perf_counter_ns() - self.start_ns) / 1e6
+
+    def end(self):
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.perf_counter_ns()
+        for exporter in _exporters:
+            exporter.export(self)
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.perf_counter_ns()) - self.start_ns) / 1e6
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "thread_id": self.thread_id,
+            "start_us": (self.start_ns - _epoch_ns) / 1e3,
+            "duration_ms": self.duration_ms,
+            "attrs": self.attrs,
+        }
+
+    def __enter__(self) -> "Span":
+        _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and exc_type is not GeneratorExit:
+            self.attrs["error"] = f"{exc_type.__name__}: {exc}"
+        self.end()
+        # 不使用 ContextVar.reset：span 可能跨越生成器的 yield，退出时所在的上下文未必与进入时相同
+        _current_span.set(self._parent)
+        return False
+
+
+class _NoopSpan:
+    """追踪关闭时使用的空span，所有操作都不做任何事。"""
+    __slots__ = ()
+
+    def set(self, **attrs: Any):
+        pass
+
+    def mark(self, name: str):
+        pass
+
+    def end(self):
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+_span_ids = itertools.count(1)
+_epoch_ns = time.perf_counter_ns()
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+_exporters: List[Any] = []
+_enabled = False
+
+
+def span(name: str, trace_id: Optional[str] = None, **attrs: Any):
+    """
+    创建一个span（作为上下文管理器使用），它嵌套在当前span之下。
+    trace_id 通常只在运行的根span上传入（run_id），子span自动继承。追踪关闭时返回 NOOP_SPAN。
+    """
+    if not _enabled:
+        return NOOP_SPAN
+    parent = _current_span.get()
+    if parent is not None and parent.end_ns is not None:
+        # 生成器在其他线程中被回收时，当前线程可能残留一个已结束的span
+        parent = None
+    return Span(name, parent, trace_id, attrs)
+
+
+def current_span():
+    """返回当前的span，追踪关闭或不在任何span中时返回 NOOP_SPAN。"""
+    return (_current_span.get() if _enabled else None) or NOOP_SPAN
+
+
+class JsonlSpanExporter:
+    """每个结束的span写为一行JSON，由后台线程批量写入。"""
+
+    def __init__(self, path: str):
+        self._sink = JsonlSink(path)
+
+    def export(self, span: Span):
+        self._sink.emit("span", **span.to_dict())
+
+    def close(self):
+        self._sink.close()
+
+
+def to_chrome_event(record: Dict[str, Any]) -> Dict[str, Any]:
+    """把一个span记录转换为 Chrome trace-event 的完整事件（ph="X"）。"""
+    return {
+        "name": record["name"],
+        "cat": record["name"].split(".", 1)[0],
+        "ph": "X",
+        "ts": record["start_us"],
+        "dur": record["duration_ms"] * 1e3,
+        "pid": os.getpid(),
+        "tid": record["thread_id"],
+        "args": {
+            "trace_id": record["trace_id"],
+            "span_id": record["span_id"],
+            "parent_id": record["parent_id"],
+            **record["attrs"],
+        },
+    }
+
+
+class ChromeTraceExporter:
+    """
+    把span以 Chrome trace-event 的数组格式（JSON Array Format）逐个追加写入文件，不在内存中累积。
+    close() 时补上结尾的 "]"；进程意外退出时文件缺少结尾，chrome://tracing 与 Perfetto 仍然可以打开。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, "w", encoding="utf-8")
+        self._file.write("[")
+        self._first = True
+
+    def export(self, span: Span):
+        line = json.dumps(to_chrome_event(span.to_dict()), ensure_ascii=False, default=str)
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(("\n" if self._first else ",\n") + line)
+            self._first = False
+
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write("\n]\n")
+            self._file.close()
+
+
+def _write_chrome_trace(path: str, events: List[Dict[str, Any]]):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, ensure_ascii=False, default=str)
+
+
+def configure_tracing(exporters: Optional[List[Any]] = None):
+    """
+    设置span导出器并开启追踪；传入空列表或 None 时关闭追踪。原有的导出器会被关闭。
+    """
+    global _enabled
+    previous = list(_exporters)
+    _exporters[:] = exporters or []
+    _enabled = bool(_exporters)
+    for exporter in previous:
+        exporter.close()
+
+
+def create_exporters(spec: Optional[str]) -> List[Any]:
+    """按配置创建导出器，多个配置用逗号分隔: 'jsonl:<路径>'、'chrome:<路径>'。"""
+    exporters = []
+    for item in filter(None, (part.strip() for part in (spec or "").split(","))):
+        kind, _, path = item.partition(":")
+        if kind == "jsonl":
+            exporters.append(JsonlSpanExporter(path))
+        elif kind == "chrome":
+            exporters.append(ChromeTraceExporter(path))
+        else:
+            raise ValueError(f"未知的追踪导出器 '{item}'，可选值: jsonl:<路径>、chrome:<路径>")
+    return exporters
+
+
+load_env()
+configure_tracing(create_exporters(os.getenv("HELLO_AGENTS_TRACE")))
+atexit.register(configure_tracing, None)
+
+
+def jsonl_to_chrome(jsonl_path: str, output_path: str):
+    """把 JsonlSpanExporter 写出的文件转换为 Chrome trace-event 格式。"""
+    with open(jsonl_path, "r", encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    _write_chrome_trace(output_path, [to_chrome_event(record) for record in records if record.get("kind") == "span"])
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] != "chrome":
+        print("用法: python -m telemetry.tracing chrome <spans.jsonl> <trace.json>")
+        sys.exit(1)
+    jsonl_to_chrome(sys.argv[2], sys.argv[3])
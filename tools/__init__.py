@@ -8,8 +8,38 @@ Description:
 
 Copyright (c) 2025 by Tencent, All Rights Reserved. 
 '''
-from .get_attraction import get_attraction
-from .get_weather import get_weather
-from .google_search import google_search
+import importlib
 
-__all__ = ["get_weather", "get_attraction", "google_search"]
\ No newline at end of file
+# 工具名 -> 所在的子模块。工具在第一次被访问时才导入，
+# 因此 `import tools.tool_exector` 等不会连带导入各个工具及其第三方依赖
+_LAZY_TOOLS = {
+    "get_weather": ".get_weather",
+    "get_attraction": ".get_attraction",
+    "google_search": ".google_search",
+}
+
+__all__ = ["get_weather", "get_attraction", "google_search", "tool_error", "is_tool_error"]
+
+# 工具出错时不抛出异常，而是返回以该前缀开头的字符串，交给LLM决定下一步；
+# 执行器据此判断结果能否缓存，规则快速路径据此判断能否直接作答
+ERROR_PREFIX = "错误："
+
+
+def tool_error(message: str) -> str:
+    """工具出错时返回的结果。"""
+    return f"{ERROR_PREFIX}{message}"
+
+
+def is_tool_error(result) -> bool:
+    """工具的结果是否表示出错。"""
+    return isinstance(result, str) and result.startswith(ERROR_PREFIX)
+
+
+
+def __getattr__(name):
+    if name not in _LAZY_TOOLS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    tool = getattr(importlib.import_module(_LAZY_TOOLS[name], __name__), name)
+    # 导入子模块时包属性会被设为同名的子模块，这里改回工具函数本身
+    globals()[name] = tool
+    return tool
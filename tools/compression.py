@@ -0,0 +1,135 @@
+'''
+Author: wenjinwang 314984354@qq.com
+Date: 2026-10-19 09:18:34
+LastEditors: wenjinwang 314984354@qq.com
+LastEditTime: 2026-10-19 09:18:34
+FilePath: /hello-agents/tools/compression.py
+Description: 面向问题的工具观察结果抽取式压缩（本地BM25打分，支持中文）
+
+'''
+import math
+import re
+from collections import Counter
+from typing import List, Tuple
+
+from models.usage import estimate_tokens, truncate_to_tokens
+
+
+# 句子：到句末标点、英文句点加空白、或行尾为止
+_SENTENCE_PATTERN = re.compile(r"[^\S\n]*(.+?(?:[。！？!?；;]+|\.(?=\s)|$))", re.M)
+_WORD_PATTERN = re.compile(r"[A-Za-z0-9]+(?:[.'][A-Za-z0-9]+)*")
+_CJK_RUN_PATTERN = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯]+")
+# 行首的列表项标题，例如 "- 故宫博物院:"、"1. 天坛："
+_LABEL_PATTERN = re.compile(r"[^\S\n]*(?:[-*•][^\S\n]*|\d+[.)、][^\S\n]*)?[^:：。！？\n]{1,40}[:：]")
+
+
+def segment(text: str) -> List[str]:
+    """
+    不依赖分词词典的切分：英文与数字按单词（小写），中日韩文本切为单字与相邻两字（bigram）。
+    bigram 能近似匹配中文词语，单字保证短查询也能命中。
+    """
+    terms = [word.lower() for word in _WORD_PATTERN.findall(text)]
+    for run in _CJK_RUN_PATTERN.findall(text):
+        terms.extend(run)
+        terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return terms
+
+
+def split_sentences(text: str) -> List[Tuple[int, int]]:
+    """返回每个句子在原文中的 (起始, 结束) 位置。"""
+    return [match.span(1) for match in _SENTENCE_PATTERN.finditer(text) if match.group(1).strip()]
+
+
+def _line_labels(text: str, spans: List[Tuple[int, int]]) -> List[str]:
+    """
+    列表项形式的行（例如 Tavily 结果的“- 标题: 内容”）中，非行首的句子会丢失它属于哪一项，
+    为这些句子找出所在行的标题，拼接时补在句子前面。
+    """
+    labels = []
+    for start, _ in spans:
+        line_start = text.rfind("\n", 0, start) + 1
+        match = _LABEL_PATTERN.match(text, line_start)
+        labels.append(match.group(0).strip() + " " if match and match.end() <= start else "")
+    return labels
+
+
+class ObservationCompressor:
+    """
+    把超过 max_tokens 的观察结果压缩为与问题最相关的若干句子。
+    句子按 BM25 对问题打分，在 max_tokens 的预算内从高到低选取，再按原文顺序拼接，
+    不相邻的句子之间以“…”分隔，列表项中的句子会带上所在项的标题。
+    与问题没有任何共同词语时，退化为保留开头部分。
+    """
+
+    def __init__(self, max_tokens: int = 300, k1: float = 1.5, b: float = 0.75):
+        self.max_tokens = max_tokens
+        self.k1 = k1
+        self.b = b
+
+    def score(self, sentences: List[str], query: str) -> List[float]:
+        """BM25：句子作为文档，逆文档频率在本条观察结果的句子之间统计。"""
+        query_terms = set(segment(query))
+        documents = [Counter(segment(sentence)) for sentence in sentences]
+        lengths = [sum(document.values()) for document in documents]
+        average_length = sum(lengths) / len(lengths) if lengths else 0
+        document_frequency = Counter(term for document in documents for term in query_terms & document.keys())
+        idf = {
+            term: math.log(1 + (len(documents) - count + 0.5) / (count + 0.5))
+            for term, count in document_frequency.items()
+        }
+
+        scores = []
+        for document, length in zip(documents, lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / average_length) if average_length else self.k1
+            scores.append(sum(
+                idf[term] * document[term] * (self.k1 + 1) / (document[term] + norm)
+                for term in idf if term in document
+            ))
+        return scores
+
+    def compress(self, text: str, query: str) -> str:
+        if not isinstance(text, str) or not query or estimate_tokens(text) <= self.max_tokens:
+            return text
+        spans = split_sentences(text)
+        sentences = [text[start:end] for start, end in spans]
+        labels = _line_labels(text, spans)
+        # 句子连同所属项的标题一起打分，标题命中问题时整项的句子都会更靠前
+        scores = self.score([label + sentence for label, sentence in zip(labels, sentences)], query)
+        if not any(scores):
+            return truncate_to_tokens(text, self.max_tokens)
+
+        # 分数相同时优先靠前的句子；重复的句子只保留一次
+        ranked = sorted(range(len(sentences)), key=lambda i: (-scores[i], i))
+        selected, seen, used = [], set(), 0
+        for i in ranked:
+            if scores[i] <= 0:
+                break
+            if sentences[i] in seen:
+                continue
+            cost = estimate_tokens(labels[i] + sentences[i]) + 1
+            if used + cost > self.max_tokens:
+                if not selected:
+                    # 最相关的一句本身就超出预算时截断它，预算随之用完
+                    sentences[i] = truncate_to_tokens(labels[i] + sentences[i], self.max_tokens - 1)
+                    labels[i] = ""
+                    selected.append(i)
+                    break
+                continue
+            selected.append(i)
+            seen.add(sentences[i])
+            used += cost
+
+        parts, previous = [], None
+        for i in sorted(selected):
+            if previous is not None and i == previous + 1:
+                # 相邻的句子保留原文中的分隔（例如换行），同一行内无需重复标题
+                separator = text[spans[previous][1]:spans[i][0]]
+                parts.append(separator)
+                label = labels[i] if "\n" in separator else ""
+            else:
+                if previous is not None:
+                    parts.append(" … ")
+                label = labels[i]
+            parts.append(label + sentences[i])
+            previous = i
+        return "".join(parts)
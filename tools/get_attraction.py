@@ -9,7 +9,8 @@ Description:
 Copyright (c) 2025 by Tencent, All Rights Reserved. 
 '''
 import os
-from tavily import TavilyClient
+
+from tools import tool_error
 
 
 def get_attraction(city: str, weather: str) -> str:
@@ -19,9 +20,10 @@ def get_attraction(city: str, weather: str) -> str:
     # 1. 从环境变量中读取API密钥
     api_key = os.environ.get("TAVILY_API_KEY")
     if not api_key:
-        return "错误：未配置TAVILY_API_KEY环境变量。"
+        return tool_error("未配置TAVILY_API_KEY环境变量。")
 
-    # 2. 初始化Tavily客户端
+    # 2. 初始化Tavily客户端（首次调用时才导入）
+    from tavily import TavilyClient
     tavily = TavilyClient(api_key=api_key)
     
     # 3. 构造一个精确的查询
@@ -47,4 +49,4 @@ def get_attraction(city: str, weather: str) -> str:
         return "根据搜索，为您找到以下信息：\n" + "\n".join(formatted_results)
 
     except Exception as e:
-        return f"错误：执行Tavily搜索时出现问题 - {e}"
+        return tool_error(f"执行Tavily搜索时出现问题 - {e}")
@@ -8,14 +8,17 @@ Description:
 
 Copyright (c) 2025 by Tencent, All Rights Reserved. 
 '''
-import requests
 import json
 
+from tools import tool_error
+
 
 def get_weather(city: str) -> str:
     """
     通过调用 wttr.in API 查询真实的天气信息。
     """
+    import requests  # 首次调用时才导入
+
     # API端点，我们请求JSON格式的数据
     url = f"https://wttr.in/{city}?format=j1"
     
@@ -37,7 +40,7 @@ def get_weather(city: str) -> str:
         
     except requests.exceptions.RequestException as e:
         # 处理网络错误
-        return f"错误：查询天气时遇到网络问题 - {e}"
+        return tool_error(f"查询天气时遇到网络问题 - {e}")
     except (KeyError, IndexError) as e:
         # 处理数据解析错误
-        return f"错误：解析天气数据失败，可能是城市名称无效 - {e}"
+        return tool_error(f"解析天气数据失败，可能是城市名称无效 - {e}")
@@ -9,7 +9,10 @@ Description:
 Copyright (c) 2025 by Tencent, All Rights Reserved. 
 '''
 import os
-from serpapi import SerpApiClient
+
+from tools import tool_error
+
+from telemetry.event_sink import emit
 
 
 def google_search(query: str) -> str:
@@ -17,11 +20,11 @@ def google_search(query: str) -> str:
     一个基于SerpApi的实战网页搜索引擎工具。
     它会智能地解析搜索结果，优先返回直接答案或知识图谱信息。
     """
-    print(f"🔍 正在执行 [SerpApi] 网页搜索: {query}")
+    emit("tool.google_search", f"🔍 正在执行 [SerpApi] 网页搜索: {query}", query=query)
     try:
         api_key = os.getenv("SERPAPI_API_KEY")
         if not api_key:
-            return "错误:SERPAPI_API_KEY 未在 .env 文件中配置。"
+            return tool_error("SERPAPI_API_KEY 未在 .env 文件中配置。")
 
         params = {
             "engine": "google",
@@ -31,6 +34,8 @@ def google_search(query: str) -> str:
             "hl": "zh-cn", # 语言代码
         }
         
+        from serpapi import SerpApiClient  # 首次调用时才导入
+
         client = SerpApiClient(params)
         results = client.get_dict()
         
@@ -52,4 +57,4 @@ def google_search(query: str) -> str:
         return f"对不起，没有找到关于 '{query}' 的信息。"
 
     except Exception as e:
-        return f"搜索时发生错误: {e}"
+        return tool_error(f"网页搜索失败 - {e}")
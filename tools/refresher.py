@@ -0,0 +1,121 @@
+'''
+Author: wenjinwang 314984354@qq.com
+Date: 2026-10-19 09:34:52
+LastEditors: wenjinwang 314984354@qq.com
+LastEditTime: 2026-10-19 09:34:52
+FilePath: /hello-agents/tools/refresher.py
+Description: 提前刷新：在后台把热门的工具结果在过期前重新获取，热门问题不会遇到未命中缓存的工具调用
+
+'''
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Deque, Dict, Optional
+
+from telemetry.event_sink import emit
+from telemetry.metrics import TOOL_REFRESHES
+from tools.tool_exector import REFRESH_SKIPPED
+
+
+class CacheRefresher:
+    """
+    每隔 interval 秒检查一次 ToolExecutor 的缓存：自写入以来至少被访问 min_accesses 次的条目中，
+    取访问最多的 top_n 个，把距离过期不足 lead 秒的条目重新获取（lead 为该工具TTL的 refresh_ahead 倍，至少两个检查间隔）。
+    刷新后访问次数清零，不再被访问的条目在下一个TTL内不会再被刷新，因此只有持续热门的条目会一直保持新鲜。
+    每分钟最多刷新 max_per_minute 次（滑动窗口），超出预算的条目留待下次检查，避免给上游API造成压力；
+    ToolExecutor.refreshEntry 没有实际调用工具（同一参数的调用正在进行、条目已被淘汰）时记为跳过，不占用预算。
+    用法:
+        refresher = CacheRefresher(tool_executor).start()
+        ...
+        refresher.stop()
+    """
+
+    def __init__(
+        self,
+        tool_executor,
+        top_n: int = 20,
+        min_accesses: int = 2,
+        refresh_ahead: float = 0.1,
+        max_per_minute: int = 30,
+        interval: float = 5.0,
+        max_workers: int = 4,
+    ):
+        self.tool_executor = tool_executor
+        self.top_n = top_n
+        self.min_accesses = min_accesses
+        self.refresh_ahead = refresh_ahead
+        self.max_per_minute = max_per_minute
+        self.interval = interval
+        self.max_workers = max_workers
+        self.stats = {"refreshed": 0, "failed": 0, "skipped": 0}
+        self._recent: Deque[float] = deque()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> "CacheRefresher":
+        """启动后台的守护线程；重复调用不会启动第二个线程。"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._loop, name="tool-cache-refresher", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                emit("tool.refresher_error", f"⚠️ 工具缓存的后台刷新出错: {e}", error=str(e))
+
+    def _take_budget(self, now: float) -> bool:
+        while self._recent and now - self._recent[0] >= 60:
+            self._recent.popleft()
+        if len(self._recent) >= self.max_per_minute:
+            return False
+        self._recent.append(now)
+        return True
+
+    def run_once(self) -> Dict[str, int]:
+        """检查一次并刷新到期的热门条目，返回本次刷新成功、失败与跳过（预算不足或无需调用工具）的数量。"""
+        now = time.monotonic()
+        due = []
+        for key, expires_at, _ in self.tool_executor.getHotEntries(self.min_accesses)[:self.top_n]:
+            tool = self.tool_executor.tools.get(key[0])
+            ttl = tool.get("cache_ttl") if tool else None
+            if ttl and expires_at - now <= max(ttl * self.refresh_ahead, 2 * self.interval):
+                due.append(key)
+
+        result = {"refreshed": 0, "failed": 0, "skipped": 0}
+        allowed = []
+        for key in due:
+            if self._take_budget(now):
+                allowed.append(key)
+            else:
+                result["skipped"] += 1
+                TOOL_REFRESHES.inc(tool=key[0], status="skipped")
+        if allowed:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(allowed))) as pool:
+                for key, status in zip(allowed, pool.map(self.tool_executor.refreshEntry, allowed)):
+                    result[status] += 1
+                    if status == REFRESH_SKIPPED:
+                        # 没有调用工具，归还本次占用的预算
+                        self._recent.remove(now)
+                        TOOL_REFRESHES.inc(tool=key[0], status="skipped")
+        if due:
+            emit(
+                "tool.refreshed",
+                f"🔄 提前刷新了 {result['refreshed']} 个热门工具结果（失败 {result['failed']}，跳过 {result['skipped']}）",
+                **result,
+            )
+        with self._lock:
+            for name, count in result.items():
+                self.stats[name] += count
+        return result
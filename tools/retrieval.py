@@ -0,0 +1,99 @@
+'''
+Author: wenjinwang 314984354@qq.com
+Date: 2026-10-19 09:19:30
+LastEditors: wenjinwang 314984354@qq.com
+LastEditTime: 2026-10-19 09:19:30
+FilePath: /hello-agents/tools/retrieval.py
+Description: 按相关性预选工具：对工具名称与描述建立增量的BM25倒排索引
+
+'''
+import heapq
+import math
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set
+
+from tools.compression import segment
+
+
+class ToolRetriever:
+    """
+    为已注册的工具维护一个倒排索引（词 -> {工具: 词频}），每次注册/移除只更新该工具的条目。
+    select(query) 用 BM25 返回与问题最相关的 top_k 个工具，always_include 中的工具总是包含在内，
+    且不占用 top_k 的名额；相关的工具不足 top_k 个时按注册顺序补足。工具数量不超过 top_k 时直接返回全部工具。
+    """
+
+    def __init__(self, top_k: int = 8, always_include: Iterable[str] = (), k1: float = 1.2, b: float = 0.75):
+        self.top_k = top_k
+        self.always_include: Set[str] = set(always_include)
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._lengths: Dict[str, int] = {}
+        self._terms: Dict[str, List[str]] = {}
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    def add(self, name: str, description: str, always_include: bool = False):
+        """索引一个工具；同名工具已存在时先移除旧的条目。名称中的单词（例如 get_weather 中的 weather）也会被索引。"""
+        terms = Counter(segment(f"{name.replace('_', ' ')} {description}"))
+        with self._lock:
+            self._remove(name)
+            for term, count in terms.items():
+                self._postings.setdefault(term, {})[name] = count
+            self._terms[name] = list(terms)
+            self._lengths[name] = sum(terms.values())
+            self._total_length += self._lengths[name]
+            if always_include:
+                self.always_include.add(name)
+
+    def remove(self, name: str):
+        with self._lock:
+            self._remove(name)
+            self.always_include.discard(name)
+
+    def _remove(self, name: str):
+        length = self._lengths.pop(name, None)
+        if length is None:
+            return
+        self._total_length -= length
+        for term in self._terms.pop(name):
+            postings = self._postings[term]
+            del postings[name]
+            if not postings:
+                del self._postings[term]
+
+    def scores(self, query: str) -> Dict[str, float]:
+        """只遍历问题中出现的词的倒排表，开销与问题长度成正比，与工具数量基本无关。"""
+        with self._lock:
+            count = len(self._lengths)
+            if not count:
+                return {}
+            average_length = self._total_length / count
+            scores: Dict[str, float] = {}
+            for term in set(segment(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for name, frequency in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[name] / average_length)
+                    scores[name] = scores.get(name, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+            return scores
+
+    def select(self, query: Optional[str]) -> Optional[Set[str]]:
+        """返回应放入提示词的工具名称集合；不需要筛选（没有问题或工具不多）时返回 None，表示使用全部工具。"""
+        if not query or len(self._lengths) <= self.top_k + len(self.always_include):
+            return None
+        scores = self.scores(query)
+        candidates = ((score, name) for name, score in scores.items() if name not in self.always_include)
+        selected = {name for _, name in heapq.nlargest(self.top_k, candidates)}
+        for name in list(self._lengths):
+            if len(selected) >= self.top_k:
+                break
+            if name not in self.always_include:
+                selected.add(name)
+        return selected | self.always_include
+
+    def __len__(self) -> int:
+        return len(self._lengths)
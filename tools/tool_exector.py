@@ -8,38 +8,220 @@ Description:
 
 Copyright (c) 2025 by Tencent, All Rights Reserved. 
 '''
-from typing import Dict, Any
+import functools
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+from models.usage import estimate_tokens
+from telemetry.event_sink import emit
+from telemetry.metrics import TOOL_CACHE, TOOL_CALLS, TOOL_LATENCY, TOOL_REFRESHES
+from telemetry.tracing import span
+from tools import is_tool_error
+
+# refreshEntry 的返回值
+REFRESHED = "refreshed"
+REFRESH_FAILED = "failed"
+REFRESH_SKIPPED = "skipped"
+
+
+def is_cacheable(result: Any) -> bool:
+    """默认的缓存判定：工具出错时返回 tools.tool_error(...)（以“错误：”开头），这样的结果不缓存。"""
+    return not is_tool_error(result)
 
 
 class ToolExecutor:
     """
     一个工具执行器，负责管理和执行工具。
+    注册时指定 cache_ttl 的工具，其结果会按参数缓存 cache_ttl 秒，缓存在所有使用该执行器的运行之间共享；
+    只有通过 cacheable（结果 -> bool，默认为 is_cacheable）判定的结果才会被缓存。
+    传入 compressor（例如 tools.compression.ObservationCompressor）后，通过 getTool(name, query=问题)
+    取得的工具会把过长的结果压缩为与问题最相关的句子；缓存中保存的始终是未压缩的原始结果。
+    传入 retriever（例如 tools.retrieval.ToolRetriever）后，getAvailableTools(query) 只列出与问题相关的工具。
+    缓存的每个条目记录自写入以来被访问的次数，tools.refresher.CacheRefresher 据此在热门条目过期前提前刷新。
     """
-    def __init__(self):
+    def __init__(self, max_cache_entries: int = 1024, compressor=None, retriever=None, cacheable: Callable[[Any], bool] = is_cacheable):
         self.tools: Dict[str, Dict[str, Any]] = {}
+        self.max_cache_entries = max_cache_entries
+        self.cacheable = cacheable
+        self.compressor = compressor
+        self.retriever = retriever
+        self.cache_stats = {"hits": 0, "misses": 0}
+        self._cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._inflight: Dict[tuple, threading.Event] = {}
+        # 缓存条目自写入（或上一次刷新）以来被访问的次数
+        self._access_counts: Dict[tuple, int] = {}
+        # 后台刷新热门条目的 CacheRefresher，由创建方启动并设置
+        self.refresher = None
 
-    def registerTool(self, name: str, description: str, func: callable):
+    def registerTool(self, name: str, description: str, func: callable, cache_ttl: Optional[float] = None, always_include: bool = False):
         """
-        向工具箱中注册一个新工具。
+        向工具箱中注册一个新工具。always_include 的工具在设置了 retriever 时也总会出现在工具列表中。
         """
         if name in self.tools:
-            print(f"警告:工具 '{name}' 已存在，将被覆盖。")
-        self.tools[name] = {"description": description, "func": func}
-        print(f"工具 '{name}' 已注册。")
+            emit("tool.overwrite", f"警告:工具 '{name}' 已存在，将被覆盖。", tool=name)
+        self.tools[name] = {"description": description, "func": func, "cache_ttl": cache_ttl}
+        if self.retriever is not None:
+            self.retriever.add(name, description, always_include=always_include)
+        emit("tool.register", f"工具 '{name}' 已注册。", tool=name, cache_ttl=cache_ttl)
+
+    def getTool(self, name: str, query: Optional[str] = None) -> callable:
+        """
+        根据名称获取一个工具的执行函数。返回的函数经由 execute 调用工具，因此带有缓存与追踪。
+        提供 query 且设置了 compressor 时，工具的结果会针对 query 进行压缩。
+        """
+        if name not in self.tools:
+            return None
+        if query and self.compressor is not None:
+            return functools.partial(self._execute_compressed, name, query)
+        return functools.partial(self.execute, name)
+
+    def _execute_compressed(self, name: str, question: str, /, *args, **kwargs) -> Any:
+        # name 与 question 只能按位置传入，工具自身的参数（例如 query）不会与它们冲突
+        observation = self.execute(name, *args, **kwargs)
+        with span("tool.compress", tool=name) as compress_span:
+            compressed = self.compressor.compress(observation, question)
+            if compressed is not observation:
+                before, after = estimate_tokens(observation), estimate_tokens(compressed)
+                compress_span.set(tokens_before=before, tokens_after=after)
+                emit("tool.compressed", f"🗜️ 工具 '{name}' 的结果已压缩: {before} -> {after} tokens", tool=name, tokens_before=before, tokens_after=after)
+        return compressed
+
+    def execute(self, name: str, *args, **kwargs) -> Any:
+        """
+        执行一个工具。启用了缓存的工具在缓存未过期时直接返回缓存的结果；工具抛出的异常与未通过 cacheable 判定的结果不会被缓存。
+        """
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            with span("tool.call", tool=name) as tool_span:
+                return self._execute(name, tool_span, *args, **kwargs)
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            TOOL_CALLS.inc(tool=name, status=status)
+            TOOL_LATENCY.observe(time.perf_counter() - started, tool=name)
+
+    def _execute(self, name: str, tool_span, *args, **kwargs) -> Any:
+        tool = self.tools[name]
+        ttl = tool.get("cache_ttl")
+        if not ttl:
+            return tool["func"](*args, **kwargs)
+
+        key = (name, args, tuple(sorted(kwargs.items())))
+        while True:
+            with self._cache_lock:
+                entry = self._cache.get(key)
+                if entry and entry[0] > time.monotonic():
+                    self._cache.move_to_end(key)
+                    self._access_counts[key] = self._access_counts.get(key, 0) + 1
+                    self.cache_stats["hits"] += 1
+                    tool_span.set(cache="hit")
+                    TOOL_CACHE.inc(tool=name, result="hit")
+                    return entry[1]
+                # 同一参数已有调用在进行中时等待它完成，避免并发运行重复调用同一个工具
+                inflight = self._inflight.get(key)
+                if inflight is None:
+                    self.cache_stats["misses"] += 1
+                    inflight = self._inflight[key] = threading.Event()
+                    break
+            tool_span.set(cache="wait")
+            inflight.wait()
+
+        tool_span.set(cache="miss")
+        TOOL_CACHE.inc(tool=name, result="miss")
+        try:
+            result = tool["func"](*args, **kwargs)
+            if self.cacheable(result):
+                self._store(key, ttl, result)
+            else:
+                tool_span.set(cacheable=False)
+            return result
+        finally:
+            with self._cache_lock:
+                del self._inflight[key]
+            inflight.set()
+
+    def _store(self, key: tuple, ttl: float, result: Any):
+        with self._cache_lock:
+            self._cache[key] = (time.monotonic() + ttl, result)
+            self._cache.move_to_end(key)
+            self._access_counts[key] = 0
+            while len(self._cache) > self.max_cache_entries:
+                evicted, _ = self._cache.popitem(last=False)
+                self._access_counts.pop(evicted, None)
+
+    def getHotEntries(self, min_accesses: int = 1) -> List[Tuple[tuple, float, int]]:
+        """
+        返回自写入以来至少被访问 min_accesses 次的缓存条目 [(键, 过期时间, 访问次数)]，按访问次数从多到少排列。
+        过期时间与 time.monotonic() 可比。
+        """
+        with self._cache_lock:
+            entries = [
+                (key, entry[0], self._access_counts.get(key, 0))
+                for key, entry in self._cache.items()
+                if self._access_counts.get(key, 0) >= min_accesses
+            ]
+        entries.sort(key=lambda item: item[2], reverse=True)
+        return entries
+
+    def refreshEntry(self, key: tuple) -> str:
+        """
+        重新调用工具并更新一个缓存条目，访问次数清零；刷新期间旧结果仍然有效，
+        旧结果已过期时，同一参数的调用会等待刷新完成而不是重复调用工具。
+        返回 REFRESHED；调用出错或结果未通过 cacheable 判定（例如工具返回“错误：…”）时返回 REFRESH_FAILED，
+        此时保留旧结果直到过期；已有相同参数的调用在进行中、条目已不在缓存中或工具已不存在时不调用工具，返回 REFRESH_SKIPPED。
+        """
+        name, args, kwargs = key
+        tool = self.tools.get(name)
+        if tool is None or not tool.get("cache_ttl"):
+            return REFRESH_SKIPPED
+        with self._cache_lock:
+            if key in self._inflight or key not in self._cache:
+                return REFRESH_SKIPPED
+            inflight = self._inflight[key] = threading.Event()
+        status = "ok"
+        try:
+            with span("tool.refresh", tool=name) as refresh_span:
+                result = tool["func"](*args, **dict(kwargs))
+                if not self.cacheable(result):
+                    status = "failed"
+                    refresh_span.set(cacheable=False)
+                    emit("tool.refresh_failed", f"⚠️ 工具 '{name}' 的缓存刷新未得到可用结果，保留旧结果: {result}", tool=name, error=str(result))
+                    return REFRESH_FAILED
+                self._store(key, tool["cache_ttl"], result)
+            return REFRESHED
+        except Exception as e:
+            status = "error"
+            emit("tool.refresh_failed", f"⚠️ 工具 '{name}' 的缓存刷新失败: {e}", tool=name, error=str(e))
+            return REFRESH_FAILED
+        finally:
+            with self._cache_lock:
+                del self._inflight[key]
+            inflight.set()
+            TOOL_REFRESHES.inc(tool=name, status=status)
 
-    def getTool(self, name: str) -> callable:
+    def clearCache(self):
         """
-        根据名称获取一个工具的执行函数。
+        清空所有工具的结果缓存。
         """
-        return self.tools.get(name, {}).get("func")
+        with self._cache_lock:
+            self._cache.clear()
+            self._access_counts.clear()
 
-    def getAvailableTools(self) -> str:
+    def getAvailableTools(self, query: Optional[str] = None) -> str:
         """
-        获取所有可用工具的格式化描述字符串。
+        获取可用工具的格式化描述字符串。设置了 retriever 且提供 query 时，只包含与 query 相关的工具，
+        按注册顺序排列；否则包含所有工具。
         """
+        selected = self.retriever.select(query) if self.retriever is not None else None
         return "\n".join([
             f"- {name}: {info['description']}" 
             for name, info in self.tools.items()
+            if selected is None or name in selected
         ])
 
 
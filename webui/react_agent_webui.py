@@ -6,33 +6,30 @@ Description: Gradio Web UI for Travel Agent with Thought-Action-Observation Loop
 import os
 import re
 import gradio as gr
-from dotenv import load_dotenv
-from typing import List, Dict, Any, Tuple
-
-from huggingface_hub.inference._mcp.agent import Agent
+from typing import List, Dict, Any, Tuple, Iterator
 
+from agents.events import TOKEN, THOUGHT, ACTION, OBSERVATION, FINAL_ANSWER, ERROR
 from agents.react_agent import ReActAgent
+from models.env import load_env
 from models.hello_agents_llm import HelloAgentsLLM
+from models.load_balancer import LoadBalancedLLM
 from tools import (
     get_attraction,
     get_weather,
     google_search,
 )
 from tools.tool_exector import ToolExecutor
+from telemetry.metrics import start_metrics_server
+from webui.session_pool import SessionPool, CONCURRENCY_LIMIT, METRICS_PORT
 
-load_dotenv()
+load_env()
 
 
 
 
-def format_thinking_process(thinking_process: List[Dict[str, Any]]) -> str:
-    """Format thinking process for display"""
-    if not thinking_process:
-        return "暂无思考过程"
-    
-    formatted = []
-    for step in thinking_process:
-        formatted.append(f"""
+def format_step(step: Dict[str, Any]) -> str:
+    """Format a single thought-action-observation step for display"""
+    return f"""
 **第 {step['iteration']} 轮思考**
 
 🤔 **思考过程：**
@@ -45,30 +42,74 @@ def format_thinking_process(thinking_process: List[Dict[str, Any]]) -> str:
 {step['observation']}
 
 ---
-""")
+"""
+
+
+def format_thinking_process(thinking_process: List[Dict[str, Any]]) -> str:
+    """Format thinking process for display"""
+    if not thinking_process:
+        return "暂无思考过程"
     
-    return "\n".join(formatted)
+    return "\n".join(format_step(step) for step in thinking_process)
+
 
-def chat_interface(message: str, history: List[List[str]]) -> Tuple[str, List[List[str]], str]:
+def chat_interface(message: str, history: List[List[str]], request: gr.Request = None) -> Iterator[Tuple[str, List[List[str]], str]]:
     """
-    Gradio chat interface function
-    
-    Returns:
+    Gradio chat interface function, streams agent events as they arrive.
+
+    Each browser session gets its own agent and run context from the session pool,
+    so concurrent chats never share history.
+
+    Completed steps are appended to the thinking panel once; token deltas of the
+    current step are appended to a live tail that is dropped when the step completes.
+
+    Yields:
         Tuple of (response, updated_history, thinking_process_display)
     """
     if not message.strip():
-        return "", history, "请输入您的查询内容。"
-    
-    # Process the query
-    final_answer, thinking_process = agent.run(message)
-    
-    # Format thinking process for display
-    thinking_display = format_thinking_process(thinking_process)
-    
-    # Update chat history
-    history.append([message, final_answer])
-    
-    return "", history, thinking_display
+        yield "", history, "请输入您的查询内容。"
+        return
+
+    history = history + [[message, "⏳ 正在思考..."]]
+    completed = ""   # formatted markdown of completed steps, append-only
+    live = ""        # raw token deltas of the step in progress
+    current = {}     # thought / action of the step in progress
+    yield "", history, "⏳ 等待模型响应..."
+
+    session = sessions.get(request.session_hash if request else None)
+    context = session.new_context(message)
+    for event in session.agent.run_events(message, context):
+        if event.type == TOKEN:
+            if not live:
+                live = f"\n**第 {event.step} 轮思考（生成中）**\n\n"
+            live += event.content
+        elif event.type in (THOUGHT, ACTION):
+            current[event.type] = event.content
+            continue
+        elif event.type == OBSERVATION:
+            completed += format_step({
+                "iteration": event.step,
+                "thought": event.data["thought"],
+                "action": event.data["action"],
+                "observation": event.content,
+            }) + "\n"
+            live, current = "", {}
+        elif event.type == ERROR:
+            completed += f"\n⚠️ {event.content}\n\n"
+            live = ""
+        elif event.type == FINAL_ANSWER:
+            if ACTION in current:
+                completed += format_step({
+                    "iteration": event.step,
+                    "thought": current.get(THOUGHT),
+                    "action": current[ACTION],
+                    "observation": "任务完成",
+                }) + "\n"
+            history[-1] = [message, event.content]
+            live = ""
+        else:
+            continue
+        yield "", history, (completed + live) or "暂无思考过程"
 
 
 def create_interface():
@@ -143,10 +184,11 @@ def create_interface():
                 )
         
         # Event handlers
-        def submit_message(message, history):
-            return chat_interface(message, history)
+        def submit_message(message, history, request: gr.Request):
+            yield from chat_interface(message, history, request)
         
-        def clear_chat():
+        def clear_chat(request: gr.Request):
+            sessions.reset(request.session_hash)
             return [], "等待您的查询..."
         
         # Bind events
@@ -186,15 +228,15 @@ def create_interface():
         **注意事项：**
         - 请确保已正确配置环境变量 `LLM_API_KEY` 和 `LLM_BASE_URL`
         - 景点推荐使用 Tavily Search API，知识库检索使用 SerpApi API
-        - 右侧面板会实时显示智能体的思考过程，包括每一轮的思考、行动和观察结果
+        - 右侧面板会实时流式显示智能体的思考过程，包括每一轮的思考、行动和观察结果
         """)
     
     return demo
 
 
 def create_agent():
-    # Initialize agent
-    llm_client = HelloAgentsLLM()
+    # Initialize agent (load-balanced across endpoints when LLM_ENDPOINTS is set)
+    llm_client = LoadBalancedLLM.from_env() or HelloAgentsLLM()
     tool_executor = ToolExecutor()
 
     tool_executor.registerTool(
@@ -216,10 +258,19 @@ def create_agent():
 
     return agent
 
+
+def create_session_pool():
+    # Every session gets its own lightweight agent sharing one LLM client and tool executor
+    shared_agent = create_agent()
+    return SessionPool(lambda: ReActAgent(shared_agent.llm_client, shared_agent.tool_executor, shared_agent.max_steps, rule_engine=shared_agent.rule_engine), name="react_agent_webui")
+
 if __name__ == "__main__":
     # Create and launch the interface
-    agent = create_agent()
+    sessions = create_session_pool()
     demo = create_interface()
+    demo.queue(default_concurrency_limit=CONCURRENCY_LIMIT)
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT)
     demo.launch(
         server_name="0.0.0.0",
         server_port=7860,
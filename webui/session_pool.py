@@ -0,0 +1,95 @@
+'''
+Author: wenjinwang 314984354@qq.com
+Date: 2026-10-19 08:58:48
+LastEditors: wenjinwang 314984354@qq.com
+LastEditTime: 2026-10-19 09:47:23
+FilePath: /hello-agents/webui/session_pool.py
+Description: Session-scoped agent / run-context pool for the Gradio web UIs
+
+'''
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+from agents.run_context import RunContext
+from models.env import load_env
+from telemetry.metrics import ACTIVE_SESSIONS
+
+load_env()
+
+# Gradio queue concurrency, i.e. how many chats one process serves at the same time
+CONCURRENCY_LIMIT = int(os.getenv("GRADIO_CONCURRENCY_LIMIT", 16))
+# Port of the /metrics endpoint served next to the Gradio app, 0 disables it
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9100))
+
+
+class Session:
+    """State owned by one browser session: its agent and the context of its current run"""
+
+    def __init__(self, session_id: str, agent: Any):
+        self.session_id = session_id
+        self.agent = agent
+        self.context: Optional[RunContext] = None
+        self.last_used = time.time()
+
+    def new_context(self, question: str) -> RunContext:
+        """Start a new run, cancelling the previous one of this session if it is still going"""
+        if self.context is not None:
+            self.context.cancel()
+        self.context = RunContext(question, run_id=f"{self.session_id[:8]}-{int(time.time() * 1000)}")
+        return self.context
+
+
+class SessionPool:
+    """
+    Maps Gradio session hashes to Session objects.
+
+    Sessions are created lazily with agent_factory, kept in LRU order, and evicted
+    when idle for longer than ttl_seconds or when more than max_sessions exist.
+    Agents are reentrant, so the factory can hand out one shared instance or a
+    lightweight per-session one built on shared clients.
+    """
+
+    def __init__(self, agent_factory: Callable[[], Any], max_sessions: int = 1024, ttl_seconds: float = 1800, name: str = "webui"):
+        self.agent_factory = agent_factory
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        ACTIVE_SESSIONS.set_function(lambda: len(self), app=name)
+
+    def get(self, session_id: Optional[str]) -> Session:
+        """Return the session for session_id, creating it if needed"""
+        session_id = session_id or "anonymous"
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = Session(session_id, self.agent_factory())
+                self._sessions[session_id] = session
+            else:
+                self._sessions.move_to_end(session_id)
+            session.last_used = time.time()
+            self._evict_locked()
+            return session
+
+    def reset(self, session_id: Optional[str]):
+        """Drop a session, cancelling its run in progress"""
+        with self._lock:
+            session = self._sessions.pop(session_id or "anonymous", None)
+        if session is not None and session.context is not None:
+            session.context.cancel()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _evict_locked(self):
+        deadline = time.time() - self.ttl_seconds
+        while self._sessions:
+            oldest_id, oldest = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.max_sessions and oldest.last_used >= deadline:
+                break
+            del self._sessions[oldest_id]
+            if oldest.context is not None:
+                oldest.context.cancel()
@@ -6,14 +6,17 @@ Description: Gradio Web UI for Travel Agent with Thought-Action-Observation Loop
 import os
 import re
 import gradio as gr
-from dotenv import load_dotenv
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Iterator
 
+from agents.events import AgentEvent, TOKEN, OBSERVATION, FINAL_ANSWER
+from models.env import load_env
 from models.openai_client import OpenAICompatibleClient
 from prompts.travel_prompt import AGENT_SYSTEM_PROMPT
 from tools.available_tools import available_tools
+from telemetry.metrics import start_metrics_server
+from webui.session_pool import SessionPool, CONCURRENCY_LIMIT, METRICS_PORT
 
-load_dotenv()
+load_env()
 
 class TravelAgent:
     """Travel Agent with Thought-Action-Observation Loop"""
@@ -37,18 +40,42 @@ class TravelAgent:
         Returns:
             Tuple of (final_answer, thinking_process)
         """
+        final_answer = None
+        thinking_process = []
+        for event in self.process_query_events(user_query, max_iterations):
+            if event.type == OBSERVATION:
+                thinking_process.append(event.data)
+            elif event.type == FINAL_ANSWER:
+                final_answer = event.content
+        return final_answer, thinking_process
+
+    def process_query_events(self, user_query: str, max_iterations: int = 5) -> Iterator[AgentEvent]:
+        """
+        Event-stream version of process_query.
+
+        Yields token deltas while the LLM is generating, one observation event per
+        finished iteration (its data is the thinking-process record), and always
+        ends with a final_answer event.
+        """
         if not user_query.strip():
-            return "请输入您的查询内容。", []
+            yield AgentEvent(FINAL_ANSWER, "请输入您的查询内容。")
+            return
         
         prompt_history = [f"用户请求: {user_query}"]
-        thinking_process = []
         
         for i in range(max_iterations):
             # Build full prompt
             full_prompt = "\n".join(prompt_history)
             
-            # Call LLM for thinking
-            llm_output = self.llm.generate(full_prompt, system_prompt=AGENT_SYSTEM_PROMPT)
+            # Call LLM for thinking, streaming token deltas
+            collected = []
+            try:
+                for content in self.llm.generate_stream(full_prompt, system_prompt=AGENT_SYSTEM_PROMPT):
+                    collected.append(content)
+                    yield AgentEvent(TOKEN, content, i + 1)
+                llm_output = "".join(collected)
+            except Exception as e:
+                llm_output = f"错误：调用语言模型服务时出错 - {e}"
             
             # Parse thought and action
             thought_match = re.search(r"Thought: (.*?)(?=Action:|$)", llm_output, re.DOTALL)
@@ -57,13 +84,9 @@ class TravelAgent:
             thought = thought_match.group(1).strip() if thought_match else "未找到思考内容"
             
             if not action_match:
-                thinking_process.append({
-                    "iteration": i + 1,
-                    "thought": thought,
-                    "action": "解析错误：未找到Action",
-                    "observation": "模型输出格式错误"
-                })
-                return "解析错误：模型输出中未找到 Action。", thinking_process
+                yield self._step_event(i + 1, thought, "解析错误：未找到Action", "模型输出格式错误")
+                yield AgentEvent(FINAL_ANSWER, "解析错误：模型输出中未找到 Action。", i + 1)
+                return
             
             action_str = action_match.group(1).strip()
             
@@ -71,16 +94,11 @@ class TravelAgent:
             if action_str.startswith("finish"):
                 final_answer_match = re.search(r'finish\(answer="(.*)"\)', action_str)
                 if final_answer_match:
-                    final_answer = final_answer_match.group(1)
-                    thinking_process.append({
-                        "iteration": i + 1,
-                        "thought": thought,
-                        "action": action_str,
-                        "observation": "任务完成"
-                    })
-                    return final_answer, thinking_process
+                    yield self._step_event(i + 1, thought, action_str, "任务完成")
+                    yield AgentEvent(FINAL_ANSWER, final_answer_match.group(1), i + 1)
                 else:
-                    return "解析错误：无法提取最终答案。", thinking_process
+                    yield AgentEvent(FINAL_ANSWER, "解析错误：无法提取最终答案。", i + 1)
+                return
             
             # Parse and execute tool
             try:
@@ -97,28 +115,32 @@ class TravelAgent:
                 observation = f"错误：解析或执行工具时出错 - {e}"
             
             # Record thinking process
-            thinking_process.append({
-                "iteration": i + 1,
-                "thought": thought,
-                "action": action_str,
-                "observation": observation
-            })
+            yield self._step_event(i + 1, thought, action_str, observation)
             
             # Add to prompt history
             prompt_history.append(llm_output)
             observation_str = f"Observation: {observation}"
             prompt_history.append(observation_str)
         
-        return "达到最大迭代次数，任务未完成。", thinking_process
+        yield AgentEvent(FINAL_ANSWER, "达到最大迭代次数，任务未完成。", max_iterations)
 
-def format_thinking_process(thinking_process: List[Dict[str, Any]]) -> str:
-    """Format thinking process for display"""
-    if not thinking_process:
-        return "暂无思考过程"
-    
-    formatted = []
-    for step in thinking_process:
-        formatted.append(f"""
+    @staticmethod
+    def _step_event(iteration: int, thought: str, action: str, observation: str) -> AgentEvent:
+        """Build the observation event carrying one thinking-process record"""
+        return AgentEvent(OBSERVATION, observation, iteration, {
+            "iteration": iteration,
+            "thought": thought,
+            "action": action,
+            "observation": observation
+        })
+
+# Per-session TravelAgent instances
+sessions = SessionPool(TravelAgent, name="travel_agent_webui")
+
+
+def format_step(step: Dict[str, Any]) -> str:
+    """Format a single thought-action-observation step for display"""
+    return f"""
 **第 {step['iteration']} 轮思考**
 
 🤔 **思考过程：**
@@ -131,33 +153,52 @@ def format_thinking_process(thinking_process: List[Dict[str, Any]]) -> str:
 {step['observation']}
 
 ---
-""")
+"""
+
+
+def format_thinking_process(thinking_process: List[Dict[str, Any]]) -> str:
+    """Format thinking process for display"""
+    if not thinking_process:
+        return "暂无思考过程"
     
-    return "\n".join(formatted)
+    return "\n".join(format_step(step) for step in thinking_process)
 
-def chat_interface(message: str, history: List[List[str]]) -> Tuple[str, List[List[str]], str]:
+def chat_interface(message: str, history: List[List[str]], request: gr.Request = None) -> Iterator[Tuple[str, List[List[str]], str]]:
     """
-    Gradio chat interface function
-    
-    Returns:
+    Gradio chat interface function, streams agent events as they arrive.
+
+    Each browser session reuses its own TravelAgent (and LLM client) from the session pool.
+
+    Completed iterations are appended to the thinking panel once; token deltas of the
+    current iteration are appended to a live tail that is dropped when it completes.
+
+    Yields:
         Tuple of (response, updated_history, thinking_process_display)
     """
     if not message.strip():
-        return "", history, "请输入您的查询内容。"
-    
-    # Initialize agent
-    agent = TravelAgent()
+        yield "", history, "请输入您的查询内容。"
+        return
     
-    # Process the query
-    final_answer, thinking_process = agent.process_query(message)
+    # Reuse the agent of this session
+    agent = sessions.get(request.session_hash if request else None).agent
     
-    # Format thinking process for display
-    thinking_display = format_thinking_process(thinking_process)
-    
-    # Update chat history
-    history.append([message, final_answer])
-    
-    return "", history, thinking_display
+    history = history + [[message, "⏳ 正在思考..."]]
+    completed = ""   # formatted markdown of completed iterations, append-only
+    live = ""        # raw token deltas of the iteration in progress
+    yield "", history, "⏳ 等待模型响应..."
+
+    for event in agent.process_query_events(message):
+        if event.type == TOKEN:
+            if not live:
+                live = f"\n**第 {event.step} 轮思考（生成中）**\n\n"
+            live += event.content
+        elif event.type == OBSERVATION:
+            completed += format_step(event.data) + "\n"
+            live = ""
+        elif event.type == FINAL_ANSWER:
+            history[-1] = [message, event.content]
+            live = ""
+        yield "", history, (completed + live) or "暂无思考过程"
 
 def create_interface():
     """Create and configure Gradio interface"""
@@ -227,10 +268,11 @@ def create_interface():
                 )
         
         # Event handlers
-        def submit_message(message, history):
-            return chat_interface(message, history)
+        def submit_message(message, history, request: gr.Request):
+            yield from chat_interface(message, history, request)
         
-        def clear_chat():
+        def clear_chat(request: gr.Request):
+            sessions.reset(request.session_hash)
             return [], "等待您的查询..."
         
         # Bind events
@@ -269,7 +311,7 @@ def create_interface():
         **注意事项：**
         - 请确保已正确配置环境变量 `OPENAI_API_KEY` 和 `TAVILY_API_KEY`
         - 天气查询使用 wttr.in API，景点推荐使用 Tavily Search API
-        - 右侧面板会实时显示智能体的思考过程，包括每一轮的思考、行动和观察结果
+        - 右侧面板会实时流式显示智能体的思考过程，包括每一轮的思考、行动和观察结果
         """)
     
     return demo
@@ -277,6 +319,9 @@ def create_interface():
 if __name__ == "__main__":
     # Create and launch the interface
     demo = create_interface()
+    demo.queue(default_concurrency_limit=CONCURRENCY_LIMIT)
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT)
     demo.launch(
         server_name="0.0.0.0",
         server_port=7860,